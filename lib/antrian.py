@@ -0,0 +1,126 @@
+# lib/antrian.py
+# Antrian kerja in-process (asyncio) untuk efek samping setelah tulis data:
+# akumulator statistik, detektor anomali, proyeksi stok, panen otomatis, dst.
+# Request cukup menunggu tulis utama lalu redirect; sisanya dikerjakan di sini.
+#
+# - Terbatas: tiap worker antrian punya asyncio.Queue(maxsize). Kalau penuh,
+#   pemanggil menunggu sampai ada slot (back-pressure, urutan tetap terjaga).
+#   Kalau antrian belum dijalankan (misal dari CLI), tugas dijalankan langsung.
+# - Urutan: tugas dengan `kunci` sama (misal kolam_id) selalu masuk worker yang
+#   sama, jadi urutannya terjaga (penting untuk state bergulir per kolam).
+# - Retry: tugas yang melempar error dicoba ulang dengan backoff eksponensial;
+#   setelah habis dicatat ke dead-letter log (JSONL) untuk diperiksa/diulang.
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger("antrian")
+
+ANTRIAN_DIR = os.getenv("ANTRIAN_DIR", "data/antrian")
+ANTRIAN_WORKERS = int(os.getenv("ANTRIAN_WORKERS", "4"))
+ANTRIAN_MAKS = int(os.getenv("ANTRIAN_MAKS", "1000"))
+MAKS_COBA = int(os.getenv("ANTRIAN_MAKS_COBA", "3"))
+BACKOFF_DETIK = 0.5
+
+DEAD_LETTER_PATH = os.path.join(ANTRIAN_DIR, "dead_letter.jsonl")
+
+_queues: list[asyncio.Queue] = []
+_tasks: list[asyncio.Task] = []
+
+
+def _nama(fungsi) -> str:
+    return f"{fungsi.__module__}.{fungsi.__qualname__}"
+
+
+def _catat_dead_letter(fungsi, args, kwargs, error: Exception):
+    logger.error(f"[ANTRIAN] Tugas {_nama(fungsi)} gagal permanen: {error}")
+    entry = {
+        "waktu": datetime.now(timezone.utc).isoformat(),
+        "tugas": _nama(fungsi),
+        "args": args,
+        "kwargs": kwargs,
+        "error": str(error),
+    }
+    try:
+        os.makedirs(ANTRIAN_DIR, exist_ok=True)
+        with open(DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str, ensure_ascii=False))
+            f.write("\n")
+    except OSError as e:
+        logger.error(f"[ANTRIAN] Gagal tulis dead-letter: {e}")
+
+
+async def _jalankan(fungsi, args, kwargs):
+    """Jalankan satu tugas dengan retry; tidak pernah melempar error"""
+    for coba in range(1, MAKS_COBA + 1):
+        try:
+            await fungsi(*args, **kwargs)
+            return
+        except Exception as e:
+            if coba == MAKS_COBA:
+                _catat_dead_letter(fungsi, args, kwargs, e)
+                return
+            logger.warning(
+                f"[ANTRIAN] Tugas {_nama(fungsi)} gagal (coba {coba}/{MAKS_COBA}): {e}"
+            )
+            await asyncio.sleep(BACKOFF_DETIK * 2 ** (coba - 1))
+
+
+async def _worker(queue: asyncio.Queue):
+    while True:
+        fungsi, args, kwargs = await queue.get()
+        try:
+            await _jalankan(fungsi, args, kwargs)
+        finally:
+            queue.task_done()
+
+
+async def kirim(fungsi, *args, kunci=None, **kwargs):
+    """
+    Jadwalkan `await fungsi(*args, **kwargs)` di antrian.
+    `kunci` menentukan worker (tugas berkunci sama diproses berurutan).
+    """
+    if _queues:
+        idx = hash(kunci) % len(_queues) if kunci is not None else None
+        queue = _queues[idx] if idx is not None else min(_queues, key=asyncio.Queue.qsize)
+        if queue.full():
+            logger.warning(f"[ANTRIAN] Antrian penuh, {_nama(fungsi)} menunggu slot")
+        await queue.put((fungsi, args, kwargs))
+        return
+    await _jalankan(fungsi, args, kwargs)
+
+
+def start(workers: int = ANTRIAN_WORKERS, maxsize: int = ANTRIAN_MAKS):
+    """Mulai worker antrian (dipanggil dari lifespan FastAPI)"""
+    if _tasks:
+        return
+    for _ in range(workers):
+        queue = asyncio.Queue(maxsize=maxsize)
+        _queues.append(queue)
+        _tasks.append(asyncio.create_task(_worker(queue)))
+    logger.info(f"[ANTRIAN] {workers} worker antrian dimulai (maks {maxsize} tugas/worker)")
+
+
+async def stop(timeout: float = 10.0):
+    """Selesaikan tugas tersisa (maks `timeout` detik), lalu hentikan worker"""
+    try:
+        await asyncio.wait_for(asyncio.gather(*(q.join() for q in _queues)), timeout)
+    except asyncio.TimeoutError:
+        # Tugas yang belum sempat dikerjakan tidak dibuang diam-diam
+        for queue in _queues:
+            while not queue.empty():
+                fungsi, args, kwargs = queue.get_nowait()
+                _catat_dead_letter(fungsi, args, kwargs, RuntimeError("antrian dihentikan"))
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queues.clear()
+
+
+def kedalaman() -> int:
+    """Jumlah tugas yang sedang menunggu di semua worker"""
+    return sum(q.qsize() for q in _queues)
@@ -0,0 +1,422 @@
+# lib/antrian_tulis.py
+# Antrian tulis tahan-putus (write-ahead) di depan create / update / delete
+# services. Kalau Supabase tidak terjangkau (sinyal kolam putus, upstream
+# down), input form tidak hilang: dicatat dulu di file SQLite lokal, lalu
+# diulang berurutan saat upstream kembali.
+#
+# Alur `tulis(fungsi, user_id=..., **kwargs)`:
+# 1. Entry dicatat (fsync) ke SQLite sebelum menyentuh DB. Kalau user masih
+#    punya entry yang menunggu replay ('antri', atau 'jalan' yang lease-nya
+#    habis), entry baru ikut antri di belakangnya (urutan per user terjaga:
+#    edit tidak mendahului create yang masih tertunda). Tulis lain yang sedang
+#    berjalan (double-tab) tidak menahan entry baru.
+# 2. Kalau tidak, fungsi langsung dijalankan (maks TULIS_TIMEOUT detik).
+#    Berhasil -> entry dihapus, hasil fungsi dikembalikan.
+# 3. Gagal / timeout: kalau upstream sehat, kegagalannya permanen (row tidak
+#    ada, validasi DB) -> entry ditandai 'gagal' untuk diperiksa. Kalau upstream
+#    tidak terjangkau, entry tetap antri dan pemanggil menerima TERTUNDA.
+#
+# Worker leader (file lock, seperti lib.jadwal) mengulang entry tertunda tiap
+# TULIS_INTERVAL detik, entry tertua per user lebih dulu. Tiap entry membawa
+# idem_key yang diteruskan ke fungsi yang menerimanya (insert_sekali), jadi
+# tulis yang sebenarnya sudah masuk sebelum koneksi putus tidak jadi ganda.
+# Entry 'jalan' punya lease: kalau proses mati di tengah jalan, entry diambil
+# alih replayer setelah lease habis. Entry 'gagal' disimpan TULIS_SIMPAN_HARI
+# hari untuk diperiksa, lalu dibersihkan replayer.
+#
+# Satu koneksi SQLite per proses, dipakai bergantian (lock) oleh thread
+# asyncio.to_thread.
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import sqlite3
+import threading
+import asyncio
+import inspect
+import logging
+import importlib
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+
+from lib.supabase_client import get_db
+
+logger = logging.getLogger("antrian_tulis")
+
+TULIS_DIR = os.getenv("TULIS_DIR", "data/tulis")
+TULIS_DB_PATH = os.path.join(TULIS_DIR, "antrian.sqlite3")
+# Maks tunggu tulis langsung sebelum request dijawab "tertunda" (tulis tetap jalan)
+TULIS_TIMEOUT = float(os.getenv("TULIS_TIMEOUT", "8"))
+# Jeda antar putaran replay (detik)
+TULIS_INTERVAL = float(os.getenv("TULIS_INTERVAL", "5"))
+# Lama entry 'jalan' dianggap dipegang prosesnya (detik)
+TULIS_LEASE = float(os.getenv("TULIS_LEASE", "60"))
+# Entry 'gagal' disimpan sekian hari untuk diperiksa, lalu dihapus
+TULIS_SIMPAN_HARI = int(os.getenv("TULIS_SIMPAN_HARI", "30"))
+# Jeda antar pembersihan entry 'gagal' oleh replayer (detik)
+TULIS_SAPU_INTERVAL = 3600.0
+# Cek kesehatan upstream: timeout & lama hasil cek dipakai ulang (detik)
+SEHAT_TIMEOUT = 3.0
+SEHAT_CACHE = 5.0
+
+_SKEMA = """
+CREATE TABLE IF NOT EXISTS tulis (
+    seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+    idem_key     TEXT NOT NULL UNIQUE,
+    user_id      INTEGER NOT NULL,
+    fungsi       TEXT NOT NULL,
+    kwargs       TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    jalan_sampai REAL,
+    percobaan    INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    dibuat       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tulis_user_idx ON tulis (user_id, status, seq);
+"""
+
+
+class _Tertunda:
+    """Penanda hasil tulis yang belum sampai ke upstream (masih di antrian)"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "TERTUNDA"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+TERTUNDA = _Tertunda()
+
+_con: sqlite3.Connection | None = None
+_con_pid: int | None = None
+_con_lock = threading.Lock()
+_sapu_berikutnya = 0.0
+_sehat: tuple[float, bool] = (0.0, True)
+_task: asyncio.Task | None = None
+_lock_fd = None
+
+
+# ============================================================
+# PENYIMPANAN (SQLITE)
+# ============================================================
+@contextmanager
+def _koneksi():
+    """
+    Koneksi SQLite bersama proses ini, dibuka sekali (dibuka ulang setelah fork).
+    Dipegang eksklusif selama blok `with`; transaksi yang terputus di-rollback.
+    """
+    global _con, _con_pid
+    with _con_lock:
+        if _con is None or _con_pid != os.getpid():
+            os.makedirs(TULIS_DIR, exist_ok=True)
+            con = sqlite3.connect(
+                TULIS_DB_PATH, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            con.row_factory = sqlite3.Row
+            # Entry harus sudah di disk sebelum request dijawab
+            con.execute("PRAGMA synchronous = FULL")
+            con.execute("PRAGMA journal_mode = WAL")
+            con.executescript(_SKEMA)
+            _con, _con_pid = con, os.getpid()
+        try:
+            yield _con
+        except BaseException:
+            if _con.in_transaction:
+                _con.execute("ROLLBACK")
+            raise
+
+
+def _nama(fungsi) -> str:
+    return f"{fungsi.__module__}:{fungsi.__qualname__}"
+
+
+def _resolve(nama: str):
+    modul, _, qualname = nama.partition(":")
+    obj = importlib.import_module(modul)
+    for bagian in qualname.split("."):
+        obj = getattr(obj, bagian)
+    return obj
+
+
+def _catat(idem_key: str, user_id: int, fungsi: str, kwargs: str) -> tuple[int, bool]:
+    """
+    Simpan entry baru. (seq, langsung): langsung = False kalau user masih punya
+    entry yang menunggu replay (entry baru antri di belakangnya) atau idem_key
+    sudah ada.
+    """
+    with _koneksi() as con:
+        con.execute("BEGIN IMMEDIATE")
+        lama = con.execute(
+            "SELECT seq FROM tulis WHERE idem_key = ?", (idem_key,)
+        ).fetchone()
+        if lama:
+            con.execute("COMMIT")
+            return lama["seq"], False
+        tertunda = con.execute(
+            "SELECT 1 FROM tulis WHERE user_id = ?"
+            " AND (status = 'antri' OR (status = 'jalan' AND jalan_sampai < ?)) LIMIT 1",
+            (user_id, time.time()),
+        ).fetchone()
+        status = "antri" if tertunda else "jalan"
+        cur = con.execute(
+            "INSERT INTO tulis"
+            " (idem_key, user_id, fungsi, kwargs, status, jalan_sampai, dibuat)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                idem_key,
+                user_id,
+                fungsi,
+                kwargs,
+                status,
+                None if tertunda else time.time() + TULIS_LEASE,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+        con.execute("COMMIT")
+        return cur.lastrowid, not tertunda
+
+
+def _selesai(seq: int):
+    with _koneksi() as con:
+        con.execute("DELETE FROM tulis WHERE seq = ?", (seq,))
+
+
+def _tandai(seq: int, status: str, error: str | None):
+    with _koneksi() as con:
+        con.execute(
+            "UPDATE tulis SET status = ?, jalan_sampai = NULL, error = ?,"
+            " percobaan = percobaan + 1 WHERE seq = ?",
+            (status, error, seq),
+        )
+
+
+def _ambil_siap() -> list[sqlite3.Row]:
+    """
+    Entry tertua tiap user yang siap diulang ('antri', atau 'jalan' dengan lease
+    habis), langsung diklaim sebagai 'jalan'. Entry yang masih dipegang proses
+    lain menahan antrian user-nya.
+    """
+    if not os.path.exists(TULIS_DB_PATH):
+        return []
+    with _koneksi() as con:
+        con.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        rows = con.execute(
+            """
+            SELECT t.* FROM tulis t
+            JOIN (
+                SELECT user_id, MIN(seq) AS seq FROM tulis
+                WHERE status != 'gagal' GROUP BY user_id
+            ) tertua ON tertua.seq = t.seq
+            WHERE t.status = 'antri' OR t.jalan_sampai < ?
+            ORDER BY t.seq
+            """,
+            (now,),
+        ).fetchall()
+        con.executemany(
+            "UPDATE tulis SET status = 'jalan', jalan_sampai = ? WHERE seq = ?",
+            [(now + TULIS_LEASE, r["seq"]) for r in rows],
+        )
+        con.execute("COMMIT")
+        return rows
+
+
+def _lepas(seqs: list[int]):
+    """Kembalikan entry yang sudah diklaim tapi belum dijalankan ke antrian"""
+    with _koneksi() as con:
+        con.executemany(
+            "UPDATE tulis SET status = 'antri', jalan_sampai = NULL WHERE seq = ?",
+            [(s,) for s in seqs],
+        )
+
+
+def _sapu_gagal() -> int:
+    """Hapus entry 'gagal' yang lebih tua dari TULIS_SIMPAN_HARI hari"""
+    if not os.path.exists(TULIS_DB_PATH):
+        return 0
+    batas = datetime.now(timezone.utc) - timedelta(days=TULIS_SIMPAN_HARI)
+    with _koneksi() as con:
+        cur = con.execute(
+            "DELETE FROM tulis WHERE status = 'gagal' AND dibuat < ?", (batas.isoformat(),)
+        )
+        return cur.rowcount
+
+
+def kedalaman(user_id: int | None = None) -> dict:
+    """Jumlah entry per status ('antri', 'jalan', 'gagal'), opsional per user"""
+    hasil = {"antri": 0, "jalan": 0, "gagal": 0}
+    if not os.path.exists(TULIS_DB_PATH):
+        return hasil
+    sql = "SELECT status, COUNT(*) AS n FROM tulis"
+    args = ()
+    if user_id is not None:
+        sql += " WHERE user_id = ?"
+        args = (user_id,)
+    with _koneksi() as con:
+        for row in con.execute(sql + " GROUP BY status", args):
+            hasil[row["status"]] = row["n"]
+    return hasil
+
+
+# ============================================================
+# EKSEKUSI
+# ============================================================
+async def upstream_sehat() -> bool:
+    """Supabase terjangkau? (query ringan, hasil dipakai ulang SEHAT_CACHE detik)"""
+    global _sehat
+    waktu, sehat = _sehat
+    if time.monotonic() - waktu < SEHAT_CACHE:
+        return sehat
+    db = get_db()
+    try:
+        await asyncio.wait_for(
+            asyncio.to_thread(lambda: db.table("Users").select("id").limit(1).execute()),
+            SEHAT_TIMEOUT,
+        )
+        sehat = True
+    except Exception as e:
+        logger.warning(f"[TULIS] Upstream tidak terjangkau: {e}")
+        sehat = False
+    _sehat = (time.monotonic(), sehat)
+    return sehat
+
+
+async def _jalankan(seq: int, fungsi, kwargs: dict, idem_key: str):
+    """Jalankan satu entry & perbarui statusnya. Hasil fungsi, atau TERTUNDA"""
+    if "idem_key" in inspect.signature(fungsi).parameters:
+        kwargs = {**kwargs, "idem_key": idem_key}
+    error = None
+    try:
+        hasil = await fungsi(**kwargs)
+    except Exception as e:
+        hasil, error = None, str(e)
+        logger.error(f"[TULIS] {_nama(fungsi)} seq={seq} error: {e}")
+
+    if hasil:
+        await asyncio.to_thread(_selesai, seq)
+        return hasil
+
+    if await upstream_sehat():
+        # Upstream menjawab tapi tulis tetap gagal: mengulang tidak akan menolong
+        await asyncio.to_thread(_tandai, seq, "gagal", error or "hasil kosong")
+        logger.error(f"[TULIS] {_nama(fungsi)} seq={seq} gagal permanen")
+        return hasil
+
+    await asyncio.to_thread(_tandai, seq, "antri", error or "upstream tidak terjangkau")
+    logger.warning(f"[TULIS] {_nama(fungsi)} seq={seq} ditunda sampai upstream kembali")
+    return TERTUNDA
+
+
+async def tulis(fungsi, *, user_id: int, idem_key: str | None = None, **kwargs):
+    """
+    `await fungsi(user_id=user_id, **kwargs)` lewat antrian tulis. kwargs harus
+    bisa di-JSON-kan (nilai form). Hasilnya hasil fungsi (row / list / bool /
+    None kalau gagal permanen), atau TERTUNDA kalau tulis masih menunggu upstream.
+    `idem_key` (opsional) mengenali tulis yang sama kalau dikirim ulang.
+    """
+    idem_key = idem_key or uuid.uuid4().hex
+    kwargs = {"user_id": user_id, **kwargs}
+    seq, langsung = await asyncio.to_thread(
+        _catat, idem_key, user_id, _nama(fungsi), json.dumps(kwargs)
+    )
+    if not langsung:
+        logger.info(f"[TULIS] {_nama(fungsi)} user_id={user_id} masuk antrian (seq={seq})")
+        return TERTUNDA
+
+    # Tidak di-cancel saat timeout: tulis yang sudah terkirim dibiarkan selesai
+    # di background dan menyelesaikan entry-nya sendiri
+    task = asyncio.ensure_future(_jalankan(seq, fungsi, kwargs, idem_key))
+    selesai, _ = await asyncio.wait({task}, timeout=TULIS_TIMEOUT)
+    if not selesai:
+        logger.warning(f"[TULIS] {_nama(fungsi)} seq={seq} lewat {TULIS_TIMEOUT}s")
+        return TERTUNDA
+    return task.result()
+
+
+# ============================================================
+# REPLAY (HANYA WORKER LEADER)
+# ============================================================
+def _coba_jadi_leader() -> bool:
+    global _lock_fd
+    if _lock_fd is not None:
+        return True
+    os.makedirs(TULIS_DIR, exist_ok=True)
+    fd = os.open(os.path.join(TULIS_DIR, "replay.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _lock_fd = fd
+    logger.info(f"[TULIS] pid={os.getpid()} menjadi replayer antrian tulis")
+    return True
+
+
+async def replay() -> int:
+    """
+    Ulang entry tertunda sampai habis atau upstream putus lagi.
+    Jumlah entry yang berhasil ditulis.
+    """
+    jumlah = 0
+    while True:
+        rows = await asyncio.to_thread(_ambil_siap)
+        if not rows:
+            return jumlah
+        for i, row in enumerate(rows):
+            try:
+                fungsi = _resolve(row["fungsi"])
+            except (ImportError, AttributeError) as e:
+                await asyncio.to_thread(_tandai, row["seq"], "gagal", f"fungsi: {e}")
+                continue
+            hasil = await _jalankan(
+                row["seq"], fungsi, json.loads(row["kwargs"]), row["idem_key"]
+            )
+            if hasil is TERTUNDA:
+                await asyncio.to_thread(_lepas, [r["seq"] for r in rows[i + 1 :]])
+                return jumlah
+            jumlah += bool(hasil)
+
+
+async def _loop():
+    global _sapu_berikutnya
+    while True:
+        try:
+            if _coba_jadi_leader():
+                jumlah = await replay()
+                if jumlah:
+                    logger.info(f"[TULIS] {jumlah} tulis tertunda berhasil diulang")
+                if time.monotonic() >= _sapu_berikutnya:
+                    _sapu_berikutnya = time.monotonic() + TULIS_SAPU_INTERVAL
+                    dihapus = await asyncio.to_thread(_sapu_gagal)
+                    if dihapus:
+                        logger.info(f"[TULIS] {dihapus} entry gagal lama dibersihkan")
+        except Exception as e:
+            logger.error(f"[TULIS] Putaran replay gagal: {e}")
+        await asyncio.sleep(TULIS_INTERVAL)
+
+
+def start():
+    """Mulai loop replay (dipanggil dari lifespan FastAPI)"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _task, _lock_fd
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    if _lock_fd is not None:
+        fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+        os.close(_lock_fd)
+        _lock_fd = None
@@ -0,0 +1,68 @@
+# lib/cache.py
+# Cache in-process sederhana (TTL + batas ukuran) untuk hasil agregasi per user.
+# Key selalu tuple yang diawali user_id, supaya bisa di-invalidate per user.
+
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("cache")
+
+_registry: list["TTLCache"] = []
+
+
+class TTLCache:
+    """
+    Cache LRU dengan masa berlaku (detik).
+    Catatan: tiap worker gunicorn punya cache sendiri, jadi TTL
+    tetap jadi batas atas data basi di worker lain.
+    `per_user=False`: cache tidak ikut dikosongkan invalidate_user (isinya
+    bukan hasil baca data, misal catatan form yang sudah diproses).
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, per_user: bool = True):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        if per_user:
+            _registry.append(self)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def invalidate_user(self, user_id: int):
+        for key in [k for k in self._data if k and k[0] == user_id]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+
+def invalidate_user(user_id: int):
+    """
+    Hapus semua entry cache milik user di semua cache terdaftar.
+    Dipanggil services setiap kali ada tulis data yang berhasil.
+    """
+    for cache in _registry:
+        cache.invalidate_user(user_id)
+    logger.debug(f"Cache user_id={user_id} di-invalidate")
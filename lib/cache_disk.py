@@ -0,0 +1,52 @@
+# lib/cache_disk.py
+# Cache hasil hitung di disk, dibaca semua worker gunicorn (bukan hanya worker
+# yang menghitung, seperti TTLCache). Dipakai untuk hasil batch malam: entry
+# berlaku selama `kunci` sama (versi data user + tanggal), jadi hasil batch
+# tetap terpakai sampai data user berubah atau batch berikutnya menimpanya.
+#
+# Satu file pickle per (nama cache, user). Tulis ke file sementara lalu rename,
+# pembaca tidak pernah melihat file setengah jadi.
+
+import os
+import pickle
+import logging
+
+logger = logging.getLogger("cache_disk")
+
+CACHE_DIR = os.getenv("CACHE_DISK_DIR", "data/cache")
+
+
+class DiskCache:
+    """
+    Cache satu entry per user: (kunci, nilai). `get` mengembalikan nilai hanya
+    jika kunci tersimpan sama dengan kunci yang diminta.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(CACHE_DIR, self.name, f"{user_id}.pkl")
+
+    def get(self, user_id: int, kunci):
+        path = self._path(user_id)
+        try:
+            with open(path, "rb") as f:
+                kunci_tersimpan, nilai = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[CACHE_DISK] {path} tidak bisa dibaca: {e}")
+            return None
+        return nilai if kunci_tersimpan == kunci else None
+
+    def set(self, user_id: int, kunci, nilai):
+        path = self._path(user_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump((kunci, nilai), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"[CACHE_DISK] Gagal tulis {path}: {e}")
@@ -0,0 +1,85 @@
+# lib/idem.py
+# Kunci idempotensi untuk form POST dashboard: double-click dan kiriman ulang
+# dari HP (sinyal putus, refresh) tidak membuat tulis ganda.
+#
+# Tiap form POST membawa input tersembunyi `idem_key` (token acak per form per
+# halaman, diisi script di templates/dashboard/base.html). Handler yang
+# dibungkus `sekali` mengingat redirect hasilnya per (idem_key, user_id) di
+# TTLCache terbatas. Kiriman berikutnya dengan token sama langsung dijawab
+# redirect yang sama tanpa menyentuh DB; kiriman yang datang saat kiriman
+# pertama masih diproses menunggu hasilnya.
+#
+# Cache per worker. Kiriman ulang yang jatuh di worker lain tetap tertahan
+# idem_key yang diteruskan ke antrian tulis (unik di SQLite) dan ke kolom
+# idem_key di DB (insert_sekali).
+
+import os
+import re
+import asyncio
+import logging
+import functools
+
+from fastapi import Request
+from fastapi.responses import RedirectResponse
+
+from lib.cache import TTLCache
+
+logger = logging.getLogger("idem")
+
+IDEM_TTL = int(os.getenv("IDEM_TTL", str(24 * 3600)))
+IDEM_MAKS = int(os.getenv("IDEM_MAKS", "10000"))
+
+_POLA = re.compile(r"[A-Za-z0-9_-]{8,64}")
+
+# (idem_key, user_id) -> URL redirect hasil kiriman pertama
+_hasil = TTLCache("idem_form", ttl=IDEM_TTL, maxsize=IDEM_MAKS, per_user=False)
+# Kiriman yang sedang diproses di worker ini
+_jalan: dict[tuple, asyncio.Future] = {}
+
+
+async def kunci_form(request: Request) -> str | None:
+    """idem_key dari form (None kalau tidak ada / formatnya tidak valid)"""
+    kunci = (await request.form()).get("idem_key")
+    if isinstance(kunci, str) and _POLA.fullmatch(kunci):
+        return kunci
+    return None
+
+
+def sekali(handler):
+    """
+    Decorator handler POST (di bawah @router.post) yang menerima `request`.
+    Hanya respons redirect yang diingat; respons lain diproses ulang.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        request: Request = kwargs["request"]
+        user_id = request.cookies.get("user_id")
+        kunci = await kunci_form(request) if user_id else None
+        if not kunci:
+            return await handler(*args, **kwargs)
+
+        key = (kunci, user_id)
+        lokasi = _hasil.get(key)
+        if lokasi is None and key in _jalan:
+            lokasi = await asyncio.shield(_jalan[key])
+        if lokasi is not None:
+            logger.info(
+                f"[IDEM] Kiriman ulang {request.url.path} user_id={user_id} dilewati"
+            )
+            return RedirectResponse(lokasi, status_code=303)
+
+        selesai = asyncio.get_running_loop().create_future()
+        _jalan[key] = selesai
+        try:
+            response = await handler(*args, **kwargs)
+            if isinstance(response, RedirectResponse):
+                lokasi = response.headers.get("location")
+                if lokasi:
+                    _hasil.set(key, lokasi)
+            return response
+        finally:
+            _jalan.pop(key, None)
+            selesai.set_result(lokasi)
+
+    return wrapper
@@ -0,0 +1,205 @@
+# lib/jadwal.py
+# Penjadwal job harian in-process (asyncio), dijalankan dari lifespan FastAPI.
+#
+# Gunicorn menjalankan beberapa worker; supaya tiap job hanya jalan sekali,
+# worker berebut file lock (fcntl.flock, non-blocking). Pemegang lock = leader
+# dan satu-satunya yang menjalankan job. Lock otomatis lepas kalau proses mati,
+# jadi worker lain mengambil alih di percobaan berikutnya.
+#
+# State (waktu jalan terakhir + metrik durasi per job) disimpan di file JSON,
+# dipakai untuk catch-up job yang terlewat (server mati saat jadwal) dan
+# bisa dibaca worker mana pun.
+
+import os
+import json
+import time
+import fcntl
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from lib.tanggal import WIB
+
+logger = logging.getLogger("jadwal")
+
+JADWAL_DIR = os.getenv("JADWAL_DIR", "data/jadwal")
+# Interval cek (detik): percobaan jadi leader & cek job jatuh tempo
+INTERVAL_CEK = 60
+
+
+def _sekarang() -> datetime:
+    return datetime.now(WIB)
+
+
+def baca_state(direktori: str = JADWAL_DIR) -> dict:
+    """State & metrik semua job (bisa dibaca dari worker mana pun)"""
+    path = os.path.join(direktori, "state.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"[JADWAL] State rusak, mulai dari kosong: {e}")
+        return {}
+
+
+class Job:
+    """Job harian pada jam:menit WIB, digeser jitter acak (stabil per hari)"""
+
+    __slots__ = ("nama", "fungsi", "jam", "menit", "jitter")
+
+    def __init__(self, nama: str, fungsi, jam: int, menit: int = 0, jitter: int = 300):
+        self.nama = nama
+        self.fungsi = fungsi
+        self.jam = jam
+        self.menit = menit
+        self.jitter = jitter
+
+    def slot(self, hari) -> datetime:
+        """Waktu jalan pada tanggal `hari` (jitter di-seed nama+tanggal, jadi
+        sama di semua worker & setelah restart)"""
+        dasar = datetime(hari.year, hari.month, hari.day, self.jam, self.menit, tzinfo=WIB)
+        geser = random.Random(f"{self.nama}:{hari.isoformat()}").uniform(0, self.jitter)
+        return dasar + timedelta(seconds=geser)
+
+    def slot_terakhir(self, now: datetime) -> datetime:
+        """Slot terbaru yang sudah lewat"""
+        slot = self.slot(now.date())
+        return slot if slot <= now else self.slot(now.date() - timedelta(days=1))
+
+    def slot_berikutnya(self, now: datetime) -> datetime:
+        slot = self.slot(now.date())
+        return slot if slot > now else self.slot(now.date() + timedelta(days=1))
+
+
+class Penjadwal:
+    def __init__(self, direktori: str = JADWAL_DIR):
+        self.jobs: dict[str, Job] = {}
+        self.direktori = direktori
+        self.lock_path = os.path.join(direktori, "leader.lock")
+        self.state_path = os.path.join(direktori, "state.json")
+        self._lock_fd = None
+        self._task: asyncio.Task | None = None
+
+    def tambah(self, nama: str, fungsi, jam: int, menit: int = 0, jitter: int = 300):
+        self.jobs[nama] = Job(nama, fungsi, jam, menit, jitter)
+
+    # ------------------------------------------------------------
+    # Leader election (file lock)
+    # ------------------------------------------------------------
+    def _coba_jadi_leader(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        logger.info(f"[JADWAL] pid={os.getpid()} menjadi leader")
+        return True
+
+    def _lepas_leader(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ------------------------------------------------------------
+    # State & metrik
+    # ------------------------------------------------------------
+    def _tulis_state(self, state: dict):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_path)
+
+    @staticmethod
+    def _metrik_baru() -> dict:
+        return {
+            "jumlah_jalan": 0,
+            "jumlah_gagal": 0,
+            "durasi_total_ms": 0.0,
+            "durasi_maks_ms": 0.0,
+        }
+
+    async def _jalankan_job(self, job: Job, state: dict):
+        metrik = state.setdefault(job.nama, self._metrik_baru())
+        mulai = time.perf_counter()
+        error = None
+        try:
+            await job.fungsi()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"[JADWAL] Job {job.nama} gagal: {e}")
+        durasi = round((time.perf_counter() - mulai) * 1000, 2)
+
+        metrik["jumlah_jalan"] += 1
+        metrik["jumlah_gagal"] += error is not None
+        metrik["durasi_total_ms"] = round(metrik["durasi_total_ms"] + durasi, 2)
+        metrik["durasi_maks_ms"] = max(metrik["durasi_maks_ms"], durasi)
+        metrik["durasi_terakhir_ms"] = durasi
+        metrik["durasi_rata_ms"] = round(metrik["durasi_total_ms"] / metrik["jumlah_jalan"], 2)
+        metrik["terakhir"] = _sekarang().isoformat()
+        metrik["error_terakhir"] = error
+        self._tulis_state(state)
+        logger.info(f"[JADWAL] Job {job.nama} selesai dalam {durasi} ms")
+
+    # ------------------------------------------------------------
+    # Loop utama
+    # ------------------------------------------------------------
+    async def _loop(self):
+        while True:
+            try:
+                jeda = await self._putaran()
+            except Exception as e:
+                logger.error(f"[JADWAL] Putaran penjadwal gagal: {e}")
+                jeda = INTERVAL_CEK
+            await asyncio.sleep(jeda)
+
+    async def _putaran(self) -> float:
+        """Satu putaran: jalankan job jatuh tempo, kembalikan jeda sampai cek berikutnya"""
+        if not self._coba_jadi_leader():
+            return INTERVAL_CEK
+
+        state = baca_state(self.direktori)
+        now = _sekarang()
+        for job in self.jobs.values():
+            if job.nama not in state:
+                # Job baru: mulai dihitung dari sekarang, tidak langsung dijalankan
+                state[job.nama] = {**self._metrik_baru(), "terakhir": now.isoformat()}
+                self._tulis_state(state)
+                continue
+            # Belum jalan sejak slot terakhir -> jalankan (termasuk catch-up slot
+            # yang terlewat saat server mati; beberapa slot digabung jadi satu)
+            terakhir = datetime.fromisoformat(state[job.nama]["terakhir"])
+            if terakhir < job.slot_terakhir(now):
+                await self._jalankan_job(job, state)
+
+        now = _sekarang()
+        berikutnya = min(
+            (job.slot_berikutnya(now) for job in self.jobs.values()),
+            default=now + timedelta(seconds=INTERVAL_CEK),
+        )
+        return min(max((berikutnya - now).total_seconds(), 1), INTERVAL_CEK)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"[JADWAL] Penjadwal dimulai: {', '.join(self.jobs)}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._lepas_leader()
@@ -0,0 +1,31 @@
+# lib/money.py
+# Representasi uang bersama: integer rupiah.
+# Semua perhitungan biaya/laba memakai int, format hanya di layer tampilan.
+
+import logging
+
+logger = logging.getLogger("money")
+
+
+def rupiah(value) -> int:
+    """
+    Konversi nilai uang mentah dari database/form ke integer rupiah.
+    Dibulatkan half-up (bukan banker's rounding) supaya total konsisten
+    di semua halaman. None / string kosong / nilai rusak dianggap 0.
+    """
+    if value is None or value == "":
+        return 0
+    if isinstance(value, int):
+        return value
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Nilai uang tidak valid: {value!r}, dianggap 0")
+        return 0
+    return int(v + 0.5) if v >= 0 else -int(-v + 0.5)
+
+
+def fmt(x: float | int) -> str:
+    """Format angka ribuan tanpa desimal"""
+    return "{:,}".format(int(x)).replace(",", ".")
+
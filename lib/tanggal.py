@@ -0,0 +1,65 @@
+# lib/tanggal.py
+# Helper tanggal terpusat: parse sekali (dengan memo), jam WIB per request,
+# dan hitungan umur/hari aktif sebagai aritmetika integer ordinal.
+
+import logging
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+logger = logging.getLogger("tanggal")
+
+WIB = timezone(timedelta(hours=7))
+
+
+@lru_cache(maxsize=8192)
+def parse_date(value: str) -> date | None:
+    """
+    '2025-01-31' / '2025-01-31T07:00:00+00:00' -> date.
+    Di-memo: tanggal yang sama (sangat sering berulang antar row) cukup di-parse sekali.
+    """
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        logger.warning(f"Format tanggal tidak valid: {value!r}")
+        return None
+
+
+def to_date(value) -> date | None:
+    """Normalisasi str / datetime / date / None ke `date`"""
+    # str paling sering (dari PostgREST), cek duluan
+    if type(value) is str:
+        return parse_date(value) if value else None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def today_wib() -> date:
+    """Tanggal hari ini menurut WIB (UTC+7), bukan jam server"""
+    return datetime.now(WIB).date()
+
+
+def request_today(request) -> date:
+    """
+    Satu jam "hari ini WIB" per request, disimpan di request.state
+    supaya semua row dalam satu request memakai tanggal yang sama.
+    """
+    today = getattr(request.state, "today_wib", None)
+    if today is None:
+        today = today_wib()
+        request.state.today_wib = today
+    return today
+
+
+def selisih_hari(start: date | None, end: date | None) -> int:
+    """Jumlah hari dari start ke end (integer ordinal), 0 jika salah satu kosong"""
+    if start is None or end is None:
+        return 0
+    return end.toordinal() - start.toordinal()
+
+
+def umur_hari(start: date | None, today: date) -> int:
+    """Umur dalam hari sejak start, minimal 0"""
+    return max(selisih_hari(start, today), 0)
@@ -0,0 +1,32 @@
+# lib/timing.py
+# Helper ukur durasi per tahap (stage) untuk logging performa
+
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("timing")
+
+
+@contextmanager
+def stage(name: str, timings: dict | None = None):
+    """
+    Ukur durasi satu tahap dalam milidetik.
+    Hasil disimpan ke `timings[name]` (kalau diberikan) dan dicatat di log debug.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if timings is not None:
+            timings[name] = round(elapsed_ms, 2)
+        logger.debug(f"[STAGE] {name}: {elapsed_ms:.2f} ms")
+
+
+def format_timings(timings: dict) -> str:
+    """Ringkas dict timings jadi satu baris log"""
+    return " | ".join(
+        f"{k}={v}ms" if isinstance(v, (int, float)) else f"{k}={v}"
+        for k, v in timings.items()
+    )
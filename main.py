@@ -1,7 +1,9 @@
 # main.py
 # File utama menjalankan FastAPI + Template
 
+import os
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -22,13 +24,56 @@ from routes.prediksi import router as prediksi_router
 from routes.ringkasan import router as ringkasan_router
 # from routes.perhitungan_pakan import router as perhitungan_pakan_router
 from routes.panen import router as panen_router
+from routes.arsip import router as arsip_router
+from routes.statistik import router as statistik_router
+from routes.catat_harian import router as catat_harian_router
+from routes.impor import router as impor_router
+from routes.ekspor import router as ekspor_router
+from routes.snapshot import router as snapshot_router
+from routes.analisis import router as analisis_router
+from routes.sinkron import router as sinkron_router
+
+from lib import antrian, antrian_tulis
+from lib.jadwal import Penjadwal
+from services.batch_malam import jalankan_batch
+from services.arsip import jalankan_arsip
+from services.snapshot import jalankan_snapshot
+from services.sinkron import bersihkan_terhapus
+from services.siklus import bekukan_tertunda
 
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("main_app")
 
-app = FastAPI(title="Kolam Lele Dashboard")
+# =============================
+# Penjadwal job harian (hanya worker leader yang menjalankan job)
+# =============================
+penjadwal = Penjadwal()
+penjadwal.tambah("batch_malam", jalankan_batch, jam=1, menit=0, jitter=600)
+# Sebelum arsip, supaya siklus hasil backfill sudah punya ringkasan
+penjadwal.tambah("bekukan_siklus", bekukan_tertunda, jam=2, menit=0, jitter=600)
+penjadwal.tambah("arsip_siklus", jalankan_arsip, jam=2, menit=30, jitter=600)
+# Setelah arsip, supaya row yang baru diarsipkan ikut dari file arsip
+penjadwal.tambah("snapshot", jalankan_snapshot, jam=3, menit=30, jitter=600)
+penjadwal.tambah("bersihkan_terhapus", bersihkan_terhapus, jam=4, menit=0, jitter=600)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Antrian efek samping setelah tulis data (statistik, anomali, panen otomatis)
+    antrian.start()
+    # Replay tulis yang tertunda saat Supabase tidak terjangkau (worker leader saja)
+    antrian_tulis.start()
+    if os.getenv("JADWAL_AKTIF", "1") == "1":
+        penjadwal.start()
+    yield
+    await penjadwal.stop()
+    await antrian_tulis.stop()
+    await antrian.stop()
+
+
+app = FastAPI(title="Kolam Lele Dashboard", lifespan=lifespan)
 logger.info("Inisialisasi aplikasi FastAPI...")
 
 # =============================
@@ -66,6 +111,14 @@ app.include_router(prediksi_router)
 app.include_router(ringkasan_router)
 # app.include_router(perhitungan_pakan_router)
 app.include_router(panen_router)
+app.include_router(arsip_router)
+app.include_router(statistik_router)
+app.include_router(catat_harian_router)
+app.include_router(impor_router)
+app.include_router(ekspor_router)
+app.include_router(snapshot_router)
+app.include_router(analisis_router)
+app.include_router(sinkron_router)
 
 # Handler untuk 404
 @app.exception_handler(StarletteHTTPException)
@@ -0,0 +1,58 @@
+-- migrations/001_siklus.sql
+-- Siklus budidaya: dimulai saat tebar bibit, ditutup saat panen.
+-- Semua row anak (Bibit, Kematian, PemberianPakan, PakanStok, Pengeluaran, Panen)
+-- diberi siklus_id supaya query halaman aktif cukup membaca siklus berjalan.
+
+CREATE TABLE IF NOT EXISTS "Siklus" (
+    id              BIGSERIAL PRIMARY KEY,
+    user_id         BIGINT NOT NULL REFERENCES "Users"(id) ON DELETE CASCADE,
+    kolam_id        BIGINT NOT NULL REFERENCES "Kolam"(id) ON DELETE CASCADE,
+    tanggal_mulai   DATE NOT NULL DEFAULT CURRENT_DATE,
+    tanggal_selesai DATE,
+    status          TEXT NOT NULL DEFAULT 'aktif' CHECK (status IN ('aktif', 'selesai')),
+    ringkasan       JSONB,          -- ringkasan beku, diisi saat siklus ditutup
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Maksimal satu siklus aktif per kolam
+CREATE UNIQUE INDEX IF NOT EXISTS siklus_satu_aktif_per_kolam
+    ON "Siklus"(kolam_id) WHERE status = 'aktif';
+CREATE INDEX IF NOT EXISTS siklus_user_idx ON "Siklus"(user_id, id DESC);
+
+ALTER TABLE "Bibit"          ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+ALTER TABLE "Kematian"       ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+ALTER TABLE "PemberianPakan" ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+ALTER TABLE "PakanStok"      ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+ALTER TABLE "Pengeluaran"    ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+ALTER TABLE "Panen"          ADD COLUMN IF NOT EXISTS siklus_id BIGINT REFERENCES "Siklus"(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS bibit_siklus_idx          ON "Bibit"(siklus_id);
+CREATE INDEX IF NOT EXISTS kematian_siklus_idx       ON "Kematian"(siklus_id);
+CREATE INDEX IF NOT EXISTS pemberian_pakan_siklus_idx ON "PemberianPakan"(siklus_id);
+CREATE INDEX IF NOT EXISTS pakan_stok_siklus_idx     ON "PakanStok"(siklus_id);
+CREATE INDEX IF NOT EXISTS pengeluaran_siklus_idx    ON "Pengeluaran"(siklus_id);
+CREATE INDEX IF NOT EXISTS panen_siklus_idx          ON "Panen"(siklus_id);
+
+-- ------------------------------------------------------------
+-- Backfill: satu siklus per kolam untuk data lama.
+-- Kolam 'sudah' panen -> siklus selesai (ringkasan diisi oleh aplikasi
+-- saat pertama kali dibaca), selain itu -> siklus aktif.
+-- ------------------------------------------------------------
+INSERT INTO "Siklus" (user_id, kolam_id, tanggal_mulai, tanggal_selesai, status)
+SELECT
+    k.user_id,
+    k.id,
+    COALESCE((SELECT MIN(b.tanggal_tebar) FROM "Bibit" b WHERE b.kolam_id = k.id),
+             k.tanggal_mulai, CURRENT_DATE),
+    CASE WHEN k.status_panen = 'sudah'
+         THEN (SELECT MAX(p.tanggal_panen) FROM "Panen" p WHERE p.kolam_id = k.id) END,
+    CASE WHEN k.status_panen = 'sudah' THEN 'selesai' ELSE 'aktif' END
+FROM "Kolam" k
+WHERE NOT EXISTS (SELECT 1 FROM "Siklus" s WHERE s.kolam_id = k.id);
+
+UPDATE "Bibit" t          SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
+UPDATE "Kematian" t       SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
+UPDATE "PemberianPakan" t SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
+UPDATE "PakanStok" t      SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
+UPDATE "Pengeluaran" t    SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
+UPDATE "Panen" t          SET siklus_id = s.id FROM "Siklus" s WHERE t.siklus_id IS NULL AND s.kolam_id = t.kolam_id;
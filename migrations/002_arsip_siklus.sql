@@ -0,0 +1,9 @@
+-- migrations/002_arsip_siklus.sql
+-- Tandai siklus yang detailnya sudah dipindah ke arsip (cold store).
+-- Ringkasan beku tetap di Siklus.ringkasan; row detail dihapus dari tabel live.
+
+ALTER TABLE "Siklus" ADD COLUMN IF NOT EXISTS diarsipkan_pada TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS siklus_siap_arsip_idx
+    ON "Siklus"(tanggal_selesai)
+    WHERE status = 'selesai' AND diarsipkan_pada IS NULL;
@@ -0,0 +1,37 @@
+-- migrations/003_anomali_kematian.sql
+-- Statistik bergulir (EWMA) kematian harian per kolam + catatan anomali.
+-- Satu row state per kolam (O(1)), diperbarui setiap kali Kematian ditulis.
+
+CREATE TABLE IF NOT EXISTS "StatKematian" (
+    kolam_id            BIGINT PRIMARY KEY REFERENCES "Kolam"(id) ON DELETE CASCADE,
+    user_id             BIGINT NOT NULL,
+    siklus_id           BIGINT,
+    ewma_mean           DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ewma_var            DOUBLE PRECISION NOT NULL DEFAULT 0,
+    jumlah_hari         INTEGER NOT NULL DEFAULT 0,
+    tanggal_terakhir    DATE,
+    mati_hari_terakhir  INTEGER NOT NULL DEFAULT 0,
+    laju_hari_terakhir  DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_mati          INTEGER NOT NULL DEFAULT 0,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS "AnomaliKematian" (
+    id          BIGSERIAL PRIMARY KEY,
+    user_id     BIGINT NOT NULL,
+    kolam_id    BIGINT NOT NULL REFERENCES "Kolam"(id) ON DELETE CASCADE,
+    siklus_id   BIGINT,
+    tanggal     DATE NOT NULL,
+    jumlah      INTEGER NOT NULL,
+    ekor_hidup  INTEGER NOT NULL,
+    laju        DOUBLE PRECISION NOT NULL,
+    ewma_mean   DOUBLE PRECISION NOT NULL,
+    skor_z      DOUBLE PRECISION NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Satu flag per kolam per hari (insert berikutnya di hari yang sama meng-update skor)
+CREATE UNIQUE INDEX IF NOT EXISTS anomali_kematian_kolam_tanggal
+    ON "AnomaliKematian"(kolam_id, tanggal);
+CREATE INDEX IF NOT EXISTS anomali_kematian_user_tanggal
+    ON "AnomaliKematian"(user_id, tanggal DESC);
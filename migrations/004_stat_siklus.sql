@@ -0,0 +1,70 @@
+-- migrations/004_stat_siklus.sql
+-- Akumulator per siklus untuk metrik performa kolam (FCR, survival, biaya/kg,
+-- estimasi biomassa). Diperbarui saat data ditulis, dibaca langsung saat view.
+
+CREATE TABLE IF NOT EXISTS "StatSiklus" (
+    siklus_id          BIGINT PRIMARY KEY REFERENCES "Siklus"(id) ON DELETE CASCADE,
+    user_id            BIGINT NOT NULL,
+    kolam_id           BIGINT NOT NULL,
+    total_bibit        BIGINT NOT NULL DEFAULT 0,
+    total_berat_bibit  DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_mati         BIGINT NOT NULL DEFAULT 0,
+    total_pakan_gram   DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_biaya        BIGINT NOT NULL DEFAULT 0,
+    total_berat_panen  DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at         TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS stat_siklus_user_idx ON "StatSiklus"(user_id);
+
+-- Tambah delta secara atomik (aman dipanggil paralel dari beberapa worker)
+CREATE OR REPLACE FUNCTION tambah_stat_siklus(
+    p_siklus_id BIGINT,
+    p_user_id BIGINT,
+    p_kolam_id BIGINT,
+    p_bibit BIGINT DEFAULT 0,
+    p_berat_bibit DOUBLE PRECISION DEFAULT 0,
+    p_mati BIGINT DEFAULT 0,
+    p_pakan_gram DOUBLE PRECISION DEFAULT 0,
+    p_biaya BIGINT DEFAULT 0,
+    p_berat_panen DOUBLE PRECISION DEFAULT 0
+) RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO "StatSiklus" (
+        siklus_id, user_id, kolam_id, total_bibit, total_berat_bibit, total_mati,
+        total_pakan_gram, total_biaya, total_berat_panen
+    )
+    VALUES (
+        p_siklus_id, p_user_id, p_kolam_id, p_bibit, p_berat_bibit, p_mati,
+        p_pakan_gram, p_biaya, p_berat_panen
+    )
+    ON CONFLICT (siklus_id) DO UPDATE SET
+        total_bibit       = "StatSiklus".total_bibit + EXCLUDED.total_bibit,
+        total_berat_bibit = "StatSiklus".total_berat_bibit + EXCLUDED.total_berat_bibit,
+        total_mati        = "StatSiklus".total_mati + EXCLUDED.total_mati,
+        total_pakan_gram  = "StatSiklus".total_pakan_gram + EXCLUDED.total_pakan_gram,
+        total_biaya       = "StatSiklus".total_biaya + EXCLUDED.total_biaya,
+        total_berat_panen = "StatSiklus".total_berat_panen + EXCLUDED.total_berat_panen,
+        updated_at        = now();
+$$;
+
+-- Isi awal dari data yang sudah ada (siklus yang belum diarsipkan)
+INSERT INTO "StatSiklus" (
+    siklus_id, user_id, kolam_id, total_bibit, total_berat_bibit, total_mati,
+    total_pakan_gram, total_biaya, total_berat_panen
+)
+SELECT
+    s.id,
+    s.user_id,
+    s.kolam_id,
+    COALESCE((SELECT SUM(jumlah) FROM "Bibit" WHERE siklus_id = s.id), 0),
+    COALESCE((SELECT SUM(total_berat) FROM "Bibit" WHERE siklus_id = s.id), 0),
+    COALESCE((SELECT SUM(jumlah) FROM "Kematian" WHERE siklus_id = s.id), 0),
+    COALESCE((SELECT SUM(jumlah_gram) FROM "PemberianPakan" WHERE siklus_id = s.id), 0),
+    COALESCE((SELECT SUM(ROUND(total_harga)) FROM "Bibit" WHERE siklus_id = s.id), 0)
+      + COALESCE((SELECT SUM(ROUND(harga)) FROM "PakanStok" WHERE siklus_id = s.id), 0)
+      + COALESCE((SELECT SUM(ROUND(harga) * COALESCE(jumlah, 1)) FROM "Pengeluaran" WHERE siklus_id = s.id), 0),
+    COALESCE((SELECT SUM(total_berat) FROM "Panen" WHERE siklus_id = s.id), 0)
+FROM "Siklus" s
+WHERE s.diarsipkan_pada IS NULL
+ON CONFLICT (siklus_id) DO NOTHING;
@@ -0,0 +1,25 @@
+-- migrations/005_stat_pakan.sql
+-- Konsumsi pakan harian per kolam (jendela bergulir 14 hari, JSON {tanggal: gram}).
+-- Diperbarui saat PemberianPakan ditulis; dipakai proyeksi hari-sampai-habis stok.
+
+CREATE TABLE IF NOT EXISTS "StatPakan" (
+    kolam_id    BIGINT PRIMARY KEY REFERENCES "Kolam"(id) ON DELETE CASCADE,
+    user_id     BIGINT NOT NULL,
+    harian      JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS stat_pakan_user_idx ON "StatPakan"(user_id);
+
+-- Isi awal dari 14 hari terakhir
+INSERT INTO "StatPakan" (kolam_id, user_id, harian)
+SELECT kolam_id, user_id, jsonb_object_agg(tanggal::text, gram)
+FROM (
+    SELECT kolam_id, user_id, tanggal, SUM(jumlah_gram) AS gram
+    FROM "PemberianPakan"
+    WHERE kolam_id IS NOT NULL
+      AND tanggal >= (now() AT TIME ZONE 'Asia/Jakarta')::date - 13
+    GROUP BY kolam_id, user_id, tanggal
+) t
+GROUP BY kolam_id, user_id
+ON CONFLICT (kolam_id) DO NOTHING;
@@ -0,0 +1,11 @@
+-- migrations/006_ringkasan_ai.sql
+-- Hasil ringkasan AI terakhir per user, disimpan bersama sidik (hash) data input.
+-- Diisi batch malam (services/batch_malam.py) atau saat halaman ringkasan dibuka;
+-- dipakai ulang selama data input tidak berubah, jadi Gemini tidak dipanggil tiap page view.
+
+CREATE TABLE IF NOT EXISTS "RingkasanAI" (
+    user_id     BIGINT PRIMARY KEY,
+    sidik       TEXT NOT NULL,
+    hasil       JSONB NOT NULL,
+    dibuat_pada TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,121 @@
+-- migrations/007_catat_panen.sql
+-- Catat panen secara atomik: satu panen per kolam per tanggal (unique constraint),
+-- insert + status_panen kolam 'sudah' + tutup siklus aktif + delta StatSiklus
+-- dalam satu transaksi. Ringkasan beku siklus diisi aplikasi setelahnya
+-- (services.siklus.bekukan_siklus, atau job bekukan_tertunda).
+-- Menggantikan cek duplikat (baca semua panen) lalu insert lalu update kolam
+-- yang sebelumnya butuh beberapa round trip dan bisa balapan.
+
+-- Duplikat lama (kolam + tanggal sama) digabung ke row pertama supaya constraint bisa
+-- dibuat: berat & penjualan dijumlahkan, catatan disambung, baru row lainnya dihapus
+UPDATE "Panen" p
+SET total_berat = d.total_berat,
+    total_jual  = d.total_jual,
+    catatan     = d.catatan
+FROM (
+    SELECT
+        MIN(id) AS id,
+        SUM(COALESCE(total_berat, 0)) AS total_berat,
+        SUM(COALESCE(total_jual, 0)) AS total_jual,
+        string_agg(NULLIF(catatan, ''), '; ' ORDER BY id) AS catatan
+    FROM "Panen"
+    GROUP BY kolam_id, tanggal_panen
+    HAVING COUNT(*) > 1
+) d
+WHERE p.id = d.id;
+
+DELETE FROM "Panen" p
+USING "Panen" q
+WHERE p.kolam_id = q.kolam_id
+  AND p.tanggal_panen = q.tanggal_panen
+  AND p.id > q.id;
+
+-- Bisa dijalankan ulang: constraint hanya ditambahkan kalau belum ada
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'panen_satu_per_kolam_tanggal'
+    ) THEN
+        ALTER TABLE "Panen"
+            ADD CONSTRAINT panen_satu_per_kolam_tanggal UNIQUE (kolam_id, tanggal_panen);
+    END IF;
+END;
+$$;
+
+-- Kembalikan {"kolam": row kolam | null, "panen": row panen baru | null}.
+-- kolam null  -> kolam tidak ada / bukan milik user (tidak ada yang ditulis)
+-- panen null  -> panen tanggal itu sudah tercatat, atau p_jika_belum_panen
+--                dan kolam memang sudah berstatus 'sudah' (tidak ada yang ditulis:
+--                status kolam & siklus hanya berubah kalau row panen benar-benar masuk)
+CREATE OR REPLACE FUNCTION catat_panen(
+    p_user_id BIGINT,
+    p_kolam_id BIGINT,
+    p_tanggal_panen DATE,
+    p_total_berat DOUBLE PRECISION DEFAULT 0,
+    p_total_jual DOUBLE PRECISION DEFAULT 0,
+    p_catatan TEXT DEFAULT NULL,
+    p_jika_belum_panen BOOLEAN DEFAULT FALSE
+) RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_kolam "Kolam";
+    v_panen "Panen";
+    v_siklus_id BIGINT;
+    v_masuk INTEGER;
+BEGIN
+    -- Kunci row kolam: panen paralel untuk kolam yang sama menunggu di sini
+    SELECT * INTO v_kolam FROM "Kolam"
+    WHERE id = p_kolam_id AND user_id = p_user_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('kolam', NULL, 'panen', NULL);
+    END IF;
+
+    -- Toggle status dari halaman kolam: sudah 'sudah' berarti tidak ada perubahan
+    IF p_jika_belum_panen AND v_kolam.status_panen = 'sudah' THEN
+        RETURN jsonb_build_object('kolam', to_jsonb(v_kolam), 'panen', NULL);
+    END IF;
+
+    SELECT id INTO v_siklus_id FROM "Siklus"
+    WHERE kolam_id = p_kolam_id AND status = 'aktif'
+    FOR UPDATE;
+
+    INSERT INTO "Panen" (
+        user_id, kolam_id, siklus_id, nama_kolam, tanggal_panen,
+        total_berat, total_jual, catatan
+    )
+    VALUES (
+        p_user_id, p_kolam_id, v_siklus_id, v_kolam.nama_kolam, p_tanggal_panen,
+        COALESCE(p_total_berat, 0), COALESCE(p_total_jual, 0),
+        COALESCE(p_catatan, 'Panen otomatis pada ' || p_tanggal_panen)
+    )
+    ON CONFLICT (kolam_id, tanggal_panen) DO NOTHING
+    RETURNING * INTO v_panen;
+
+    -- Bentrok ON CONFLICT: panen tanggal itu sudah ada, kolam & siklus tidak disentuh
+    GET DIAGNOSTICS v_masuk = ROW_COUNT;
+    IF v_masuk = 0 THEN
+        RETURN jsonb_build_object('kolam', to_jsonb(v_kolam), 'panen', NULL);
+    END IF;
+
+    UPDATE "Kolam" SET status_panen = 'sudah'
+    WHERE id = p_kolam_id
+    RETURNING * INTO v_kolam;
+
+    IF v_siklus_id IS NOT NULL THEN
+        UPDATE "Siklus"
+        SET status = 'selesai', tanggal_selesai = p_tanggal_panen
+        WHERE id = v_siklus_id;
+
+        PERFORM tambah_stat_siklus(
+            p_siklus_id => v_siklus_id,
+            p_user_id => p_user_id,
+            p_kolam_id => p_kolam_id,
+            p_berat_panen => COALESCE(p_total_berat, 0)
+        );
+    END IF;
+
+    RETURN jsonb_build_object('kolam', to_jsonb(v_kolam), 'panen', to_jsonb(v_panen));
+END;
+$$;
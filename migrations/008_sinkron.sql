@@ -0,0 +1,66 @@
+-- migrations/008_sinkron.sql
+-- Dasar delta-sync untuk perangkat lapangan (services.sinkron):
+-- - updated_at di semua tabel data, diisi otomatis saat insert & update
+-- - tombstone "Terhapus" diisi trigger setiap row dihapus (termasuk cascade
+--   dan row yang dipindah ke arsip: di perangkat ikut hilang seperti di halaman live)
+-- Klien cukup minta row dengan (updated_at, id) setelah cursor terakhirnya.
+
+CREATE TABLE IF NOT EXISTS "Terhapus" (
+    id            BIGSERIAL PRIMARY KEY,
+    user_id       BIGINT NOT NULL,
+    tabel         TEXT NOT NULL,
+    row_id        BIGINT NOT NULL,
+    updated_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS terhapus_sinkron_idx ON "Terhapus"(user_id, updated_at, id);
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION catat_terhapus() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO "Terhapus" (user_id, tabel, row_id)
+    VALUES (OLD.user_id, TG_TABLE_NAME, OLD.id);
+    RETURN OLD;
+END;
+$$;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'Kolam', 'Siklus', 'Bibit', 'Kematian', 'PemberianPakan',
+        'PakanStok', 'Pengeluaran', 'Panen'
+    ] LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()',
+            t
+        );
+        -- Keyset sinkron: WHERE user_id = ? AND (updated_at, id) > cursor ORDER BY updated_at, id
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (user_id, updated_at, id)',
+            lower(t) || '_sinkron_idx', t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS set_updated_at ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER set_updated_at BEFORE UPDATE ON %I '
+            'FOR EACH ROW EXECUTE FUNCTION set_updated_at()',
+            t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS catat_terhapus ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER catat_terhapus AFTER DELETE ON %I '
+            'FOR EACH ROW EXECUTE FUNCTION catat_terhapus()',
+            t
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,22 @@
+-- migrations/009_idem_key.sql
+-- Kunci idempotensi untuk insert dari antrian tulis (lib/antrian_tulis.py).
+-- Tulis yang diulang setelah hasil percobaan pertama tidak diketahui (timeout,
+-- koneksi putus) membawa idem_key yang sama, jadi tidak membuat row ganda.
+-- NULL boleh berulang (insert lama / impor tanpa kunci).
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'Bibit', 'Kematian', 'PemberianPakan', 'PakanStok', 'Pengeluaran'
+    ] LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS idem_key TEXT', t);
+        -- Index unik penuh (bukan parsial) supaya bisa dipakai ON CONFLICT (idem_key)
+        EXECUTE format(
+            'CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I (idem_key)',
+            lower(t) || '_idem_key_unik', t
+        );
+    END LOOP;
+END;
+$$;
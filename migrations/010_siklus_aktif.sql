@@ -0,0 +1,49 @@
+-- migrations/010_siklus_aktif.sql
+-- Ambil-atau-buka siklus aktif kolam dalam satu round trip atomik.
+-- Dipanggil setiap tulis data (services.siklus.pastikan_siklus_aktif) supaya
+-- siklus_id selalu dibaca dari DB, bukan dari cache worker yang bisa basi
+-- (siklus sudah ditutup panen di worker lain).
+
+-- Kembalikan {"id": id siklus aktif | null, "baru": true kalau baru dibuka}.
+-- id null -> kolam tidak ada / bukan milik user
+CREATE OR REPLACE FUNCTION siklus_aktif(
+    p_user_id BIGINT,
+    p_kolam_id BIGINT,
+    p_tanggal_mulai DATE DEFAULT NULL
+) RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_id BIGINT;
+BEGIN
+    PERFORM 1 FROM "Kolam" WHERE id = p_kolam_id AND user_id = p_user_id;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('id', NULL, 'baru', FALSE);
+    END IF;
+
+    SELECT id INTO v_id FROM "Siklus"
+    WHERE kolam_id = p_kolam_id AND status = 'aktif';
+    IF FOUND THEN
+        RETURN jsonb_build_object('id', v_id, 'baru', FALSE);
+    END IF;
+
+    -- Unique index parsial siklus_satu_aktif_per_kolam: kalau request lain
+    -- membuka siklus di saat yang sama, insert ini dilewati dan siklusnya dipakai
+    INSERT INTO "Siklus" (user_id, kolam_id, tanggal_mulai, status)
+    VALUES (
+        p_user_id,
+        p_kolam_id,
+        COALESCE(p_tanggal_mulai, (now() AT TIME ZONE 'Asia/Jakarta')::date),
+        'aktif'
+    )
+    ON CONFLICT (kolam_id) WHERE status = 'aktif' DO NOTHING
+    RETURNING id INTO v_id;
+
+    IF v_id IS NOT NULL THEN
+        RETURN jsonb_build_object('id', v_id, 'baru', TRUE);
+    END IF;
+
+    SELECT id INTO v_id FROM "Siklus"
+    WHERE kolam_id = p_kolam_id AND status = 'aktif';
+    RETURN jsonb_build_object('id', v_id, 'baru', FALSE);
+END;
+$$;
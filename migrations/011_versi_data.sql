@@ -0,0 +1,75 @@
+-- migrations/011_versi_data.sql
+-- Nomor versi data per user, naik setiap ada insert / update / delete di tabel
+-- data mana pun (trigger, ikut transaksi tulisnya). Dipakai sebagai bagian key
+-- cache hasil hitung (services.ringkasan dkk.), jadi tulis di satu worker
+-- langsung membuat cache di semua worker lain tidak terpakai lagi.
+--
+-- Trigger per statement dengan transition table: insert array / update massal
+-- menaikkan versi sekali per user yang tersentuh, bukan sekali per row (satu
+-- upsert VersiData per row akan saling antri di row lock user yang sama).
+
+CREATE TABLE IF NOT EXISTS "VersiData" (
+    user_id     BIGINT PRIMARY KEY,
+    versi       BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION naikkan_versi_data() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Transition table yang tidak ada untuk event ini tidak disentuh
+    -- (INSERT: hanya baru, DELETE: hanya lama, UPDATE: keduanya)
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "VersiData" (user_id, versi)
+        SELECT DISTINCT user_id, 1 FROM baru WHERE user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET versi = "VersiData".versi + 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO "VersiData" (user_id, versi)
+        SELECT DISTINCT user_id, 1 FROM lama WHERE user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET versi = "VersiData".versi + 1;
+    ELSE
+        INSERT INTO "VersiData" (user_id, versi)
+        SELECT user_id, 1 FROM (
+            SELECT user_id FROM baru UNION SELECT user_id FROM lama
+        ) u
+        WHERE user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET versi = "VersiData".versi + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Transition table hanya boleh untuk trigger satu event, jadi satu trigger per
+-- event per tabel (trigger lama FOR EACH ROW ikut dibuang)
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'Kolam', 'Siklus', 'Bibit', 'Kematian', 'PemberianPakan',
+        'PakanStok', 'Pengeluaran', 'Panen'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS naikkan_versi_data ON %I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS naikkan_versi_data_ins ON %I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS naikkan_versi_data_upd ON %I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS naikkan_versi_data_del ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER naikkan_versi_data_ins AFTER INSERT ON %I '
+            'REFERENCING NEW TABLE AS baru '
+            'FOR EACH STATEMENT EXECUTE FUNCTION naikkan_versi_data()',
+            t
+        );
+        EXECUTE format(
+            'CREATE TRIGGER naikkan_versi_data_upd AFTER UPDATE ON %I '
+            'REFERENCING OLD TABLE AS lama NEW TABLE AS baru '
+            'FOR EACH STATEMENT EXECUTE FUNCTION naikkan_versi_data()',
+            t
+        );
+        EXECUTE format(
+            'CREATE TRIGGER naikkan_versi_data_del AFTER DELETE ON %I '
+            'REFERENCING OLD TABLE AS lama '
+            'FOR EACH STATEMENT EXECUTE FUNCTION naikkan_versi_data()',
+            t
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,48 @@
+-- migrations/012_stat_pakan_atomik.sql
+-- Update jendela konsumsi StatPakan secara atomik di DB. Sebelumnya baca-ubah-
+-- upsert dari Python yang hanya di-lock per worker, jadi dua worker yang
+-- menulis pakan kolam yang sama bisa saling menimpa delta.
+
+-- Tambah delta gram ke tanggal p_tanggal dan buang entri di luar p_simpan_hari
+-- (dihitung mundur dari p_today). Row dikunci selama update (FOR UPDATE).
+CREATE OR REPLACE FUNCTION tambah_stat_pakan(
+    p_user_id BIGINT,
+    p_kolam_id BIGINT,
+    p_tanggal DATE,
+    p_delta_gram DOUBLE PRECISION,
+    p_today DATE,
+    p_simpan_hari INTEGER DEFAULT 14
+) RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_batas TEXT := (p_today - (p_simpan_hari - 1))::text;
+    v_key TEXT := p_tanggal::text;
+    v_harian JSONB;
+BEGIN
+    INSERT INTO "StatPakan" (kolam_id, user_id)
+    VALUES (p_kolam_id, p_user_id)
+    ON CONFLICT (kolam_id) DO NOTHING;
+
+    SELECT harian INTO v_harian FROM "StatPakan"
+    WHERE kolam_id = p_kolam_id AND user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(jsonb_object_agg(key, value), '{}'::jsonb) INTO v_harian
+    FROM jsonb_each(v_harian)
+    WHERE key >= v_batas;
+
+    IF v_key >= v_batas THEN
+        v_harian := v_harian || jsonb_build_object(
+            v_key,
+            GREATEST(COALESCE((v_harian ->> v_key)::double precision, 0) + p_delta_gram, 0)
+        );
+    END IF;
+
+    UPDATE "StatPakan"
+    SET harian = v_harian, updated_at = now()
+    WHERE kolam_id = p_kolam_id;
+END;
+$$;
@@ -0,0 +1,195 @@
+-- migrations/013_stat_kematian_atomik.sql
+-- Update statistik EWMA kematian secara atomik di DB (sebelumnya baca-ubah-upsert
+-- dari Python yang hanya di-lock per worker), dan jumlah ekor tebar siklus
+-- disimpan di row state supaya setiap tulis kematian tidak membaca riwayat Bibit.
+
+ALTER TABLE "StatKematian" ADD COLUMN IF NOT EXISTS ekor_tebar BIGINT NOT NULL DEFAULT 0;
+
+UPDATE "StatKematian" sk
+SET ekor_tebar = COALESCE((
+    SELECT SUM(b.jumlah) FROM "Bibit" b
+    WHERE b.kolam_id = sk.kolam_id
+      AND b.user_id = sk.user_id
+      AND b.siklus_id IS NOT DISTINCT FROM sk.siklus_id
+), 0);
+
+-- Ikuti tulis Bibit: ekor_tebar state kolam berubah hanya untuk siklus yang sama
+CREATE OR REPLACE FUNCTION stat_kematian_bibit() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "StatKematian"
+        SET ekor_tebar = ekor_tebar - COALESCE(OLD.jumlah, 0)
+        WHERE kolam_id = OLD.kolam_id
+          AND user_id = OLD.user_id
+          AND siklus_id IS NOT DISTINCT FROM OLD.siklus_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "StatKematian"
+        SET ekor_tebar = ekor_tebar + COALESCE(NEW.jumlah, 0)
+        WHERE kolam_id = NEW.kolam_id
+          AND user_id = NEW.user_id
+          AND siklus_id IS NOT DISTINCT FROM NEW.siklus_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS stat_kematian_bibit ON "Bibit";
+CREATE TRIGGER stat_kematian_bibit AFTER INSERT OR UPDATE OR DELETE ON "Bibit"
+    FOR EACH ROW EXECUTE FUNCTION stat_kematian_bibit();
+
+-- Terapkan satu perubahan kematian (p_delta ekor pada p_tanggal) ke state kolam,
+-- dengan row state dikunci (FOR UPDATE). Perubahan untuk siklus yang bukan
+-- siklus state maupun siklus aktif kolam diabaikan. Kembalikan anomali (dan mencatatnya di
+-- AnomaliKematian) jika hari itu melewati ambang skor z, selain itu NULL.
+-- Parameter ambang dikirim dari services/anomali.py (env).
+CREATE OR REPLACE FUNCTION catat_stat_kematian(
+    p_user_id BIGINT,
+    p_kolam_id BIGINT,
+    p_siklus_id BIGINT,
+    p_tanggal DATE,
+    p_delta INTEGER,
+    p_alpha DOUBLE PRECISION,
+    p_batas_z DOUBLE PRECISION,
+    p_min_ekor INTEGER,
+    p_hari_pemanasan INTEGER,
+    p_maks_hari_kosong INTEGER,
+    p_var_min DOUBLE PRECISION
+) RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    s "StatKematian"%ROWTYPE;
+    v_baru BOOLEAN;
+    v_mundur BOOLEAN := FALSE;
+    v_mean DOUBLE PRECISION;
+    v_var DOUBLE PRECISION;
+    v_diff DOUBLE PRECISION;
+    v_kosong INTEGER;
+    v_hidup BIGINT;
+    v_laju DOUBLE PRECISION;
+    v_z DOUBLE PRECISION;
+    v_anomali JSONB;
+BEGIN
+    INSERT INTO "StatKematian" (kolam_id, user_id, siklus_id)
+    VALUES (p_kolam_id, p_user_id, p_siklus_id)
+    ON CONFLICT (kolam_id) DO NOTHING;
+    v_baru := FOUND;
+
+    SELECT * INTO s FROM "StatKematian"
+    WHERE kolam_id = p_kolam_id AND user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    -- Perubahan untuk siklus lain: hanya siklus aktif kolam (siklus yang lebih baru
+    -- dari state) yang me-reset state. Edit / hapus kematian siklus lama diabaikan,
+    -- supaya statistik siklus berjalan tidak terhapus.
+    IF NOT v_baru AND s.siklus_id IS DISTINCT FROM p_siklus_id THEN
+        PERFORM 1 FROM "Siklus"
+        WHERE id = p_siklus_id AND kolam_id = p_kolam_id AND status = 'aktif';
+        IF NOT FOUND THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    -- Kolam baru / siklus baru -> statistik mulai dari nol, ekor tebar dihitung sekali
+    IF v_baru OR s.siklus_id IS DISTINCT FROM p_siklus_id THEN
+        s.siklus_id := p_siklus_id;
+        s.ewma_mean := 0;
+        s.ewma_var := 0;
+        s.jumlah_hari := 0;
+        s.tanggal_terakhir := NULL;
+        s.mati_hari_terakhir := 0;
+        s.laju_hari_terakhir := 0;
+        s.total_mati := 0;
+        SELECT COALESCE(SUM(jumlah), 0) INTO s.ekor_tebar FROM "Bibit"
+        WHERE kolam_id = p_kolam_id
+          AND user_id = p_user_id
+          AND siklus_id IS NOT DISTINCT FROM p_siklus_id;
+    END IF;
+
+    s.total_mati := s.total_mati + p_delta;
+
+    IF s.tanggal_terakhir IS NULL OR p_tanggal > s.tanggal_terakhir THEN
+        IF s.tanggal_terakhir IS NOT NULL THEN
+            -- Tutup hari terbuka, lalu hari kosong sampai p_tanggal (0 kematian)
+            v_mean := s.ewma_mean;
+            v_var := s.ewma_var;
+            v_diff := s.laju_hari_terakhir - v_mean;
+            v_mean := v_mean + p_alpha * v_diff;
+            v_var := (1 - p_alpha) * (v_var + v_diff * p_alpha * v_diff);
+            v_kosong := GREATEST(
+                LEAST(p_tanggal - s.tanggal_terakhir - 1, p_maks_hari_kosong), 0
+            );
+            FOR i IN 1..v_kosong LOOP
+                v_diff := -v_mean;
+                v_mean := v_mean + p_alpha * v_diff;
+                v_var := (1 - p_alpha) * (v_var + v_diff * p_alpha * v_diff);
+            END LOOP;
+            s.ewma_mean := v_mean;
+            s.ewma_var := v_var;
+            s.jumlah_hari := s.jumlah_hari + 1 + v_kosong;
+        END IF;
+        s.tanggal_terakhir := p_tanggal;
+        s.mati_hari_terakhir := p_delta;
+    ELSIF p_tanggal = s.tanggal_terakhir THEN
+        s.mati_hari_terakhir := s.mati_hari_terakhir + p_delta;
+    ELSE
+        -- Catatan mundur tanggal: hari itu sudah masuk EWMA, cukup perbarui total
+        v_mundur := TRUE;
+    END IF;
+
+    IF NOT v_mundur THEN
+        -- Ekor hidup di awal hari (sebelum kematian hari ini)
+        v_hidup := GREATEST(s.ekor_tebar - (s.total_mati - s.mati_hari_terakhir), 1);
+        v_laju := GREATEST(s.mati_hari_terakhir, 0)::double precision / v_hidup;
+        s.laju_hari_terakhir := v_laju;
+    END IF;
+
+    UPDATE "StatKematian"
+    SET siklus_id = s.siklus_id, ewma_mean = s.ewma_mean, ewma_var = s.ewma_var,
+        jumlah_hari = s.jumlah_hari, tanggal_terakhir = s.tanggal_terakhir,
+        mati_hari_terakhir = s.mati_hari_terakhir,
+        laju_hari_terakhir = s.laju_hari_terakhir, total_mati = s.total_mati,
+        ekor_tebar = s.ekor_tebar, updated_at = now()
+    WHERE kolam_id = p_kolam_id;
+
+    IF v_mundur OR s.jumlah_hari < p_hari_pemanasan
+       OR s.mati_hari_terakhir < p_min_ekor THEN
+        RETURN NULL;
+    END IF;
+
+    v_z := (v_laju - s.ewma_mean) / sqrt(GREATEST(s.ewma_var, p_var_min));
+    IF v_z < p_batas_z THEN
+        RETURN NULL;
+    END IF;
+
+    v_anomali := jsonb_build_object(
+        'tanggal', p_tanggal,
+        'jumlah', s.mati_hari_terakhir,
+        'ekor_hidup', v_hidup,
+        'laju', v_laju,
+        'ewma_mean', s.ewma_mean,
+        'skor_z', round(v_z::numeric, 2)
+    );
+
+    INSERT INTO "AnomaliKematian" (
+        user_id, kolam_id, siklus_id, tanggal, jumlah, ekor_hidup, laju, ewma_mean, skor_z
+    )
+    VALUES (
+        p_user_id, p_kolam_id, p_siklus_id, p_tanggal, s.mati_hari_terakhir, v_hidup,
+        v_laju, s.ewma_mean, round(v_z::numeric, 2)
+    )
+    ON CONFLICT (kolam_id, tanggal) DO UPDATE SET
+        siklus_id  = EXCLUDED.siklus_id,
+        jumlah     = EXCLUDED.jumlah,
+        ekor_hidup = EXCLUDED.ekor_hidup,
+        laju       = EXCLUDED.laju,
+        ewma_mean  = EXCLUDED.ewma_mean,
+        skor_z     = EXCLUDED.skor_z;
+
+    RETURN v_anomali;
+END;
+$$;
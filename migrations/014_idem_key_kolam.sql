@@ -0,0 +1,7 @@
+-- migrations/014_idem_key_kolam.sql
+-- Kunci idempotensi untuk Kolam (lihat 009_idem_key.sql): buat kolam sekarang
+-- lewat antrian tulis, jadi replay setelah hasil percobaan pertama tidak
+-- diketahui tidak boleh membuat kolam ganda.
+
+ALTER TABLE "Kolam" ADD COLUMN IF NOT EXISTS idem_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS kolam_idem_key_unik ON "Kolam" (idem_key);
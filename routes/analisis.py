@@ -0,0 +1,81 @@
+# routes/analisis.py
+# Halaman analisis lintas siklus & kolam (DuckDB di atas snapshot Parquet)
+
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.templating import Jinja2Templates
+
+from lib import antrian
+from lib.money import fmt
+from services.analisis import get_analisis
+from services.snapshot import snapshot_user
+
+router = APIRouter()
+logger = logging.getLogger("router_analisis")
+templates = Jinja2Templates(directory="templates")
+
+
+def _desimal(x, digit: int = 1) -> str:
+    return "-" if x is None else f"{x:.{digit}f}".replace(".", ",")
+
+
+def _rupiah(x) -> str:
+    if x is None:
+        return "-"
+    return f"-Rp {fmt(abs(x))}" if x < 0 else f"Rp {fmt(x)}"
+
+
+def _view(row: dict) -> dict:
+    """Format angka untuk tampilan; nilai mentah tetap ada untuk warna (laba < 0)"""
+    view = dict(row)
+    for k in ("berat_panen", "pakan_kg", "ekor", "mati"):
+        if k in row:
+            view[k] = fmt(row[k] or 0)
+    for k in ("total_biaya", "total_jual", "biaya_per_kg", "laba"):
+        if k in row:
+            view[f"{k}_fmt"] = _rupiah(row[k])
+    if "fcr" in row:
+        view["fcr"] = _desimal(row["fcr"], 2)
+    if "persen_mati" in row:
+        view["persen_mati"] = _desimal(row["persen_mati"])
+    return view
+
+
+@router.get("/dashboard/analisis", response_class=HTMLResponse)
+async def analisis_page(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses /dashboard/analisis ditolak: user belum login.")
+        return RedirectResponse("/login", status_code=303)
+    user_id = int(user_id)
+
+    try:
+        hasil = await get_analisis(user_id)
+    except Exception as e:
+        logger.error(f"[ANALISIS] Gagal menjalankan analisis user_id={user_id}: {e}")
+        hasil = None
+
+    context = {"request": request, "hasil": None}
+    if hasil is not None:
+        context["hasil"] = {
+            "per_siklus": [_view(r) for r in hasil["per_siklus"]],
+            "per_kolam": [_view(r) for r in hasil["per_kolam"]],
+            "per_ukuran_bibit": [_view(r) for r in hasil["per_ukuran_bibit"]],
+            "durasi_ms": hasil["durasi_ms"],
+            "snapshot_pada": (hasil["snapshot_pada"] or "")[:16].replace("T", " "),
+        }
+    return templates.TemplateResponse("dashboard/analisis.html", context)
+
+
+@router.post("/dashboard/analisis/perbarui")
+async def analisis_perbarui(request: Request):
+    """Perbarui snapshot user di latar belakang (hanya partisi yang berubah ditulis)"""
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return RedirectResponse("/login", status_code=303)
+    user_id = int(user_id)
+
+    await antrian.kirim(snapshot_user, user_id, kunci=user_id)
+    logger.info(f"[USER {user_id}] Minta perbarui snapshot analisis")
+    return RedirectResponse("/dashboard/analisis?diperbarui=1", status_code=303)
@@ -0,0 +1,81 @@
+# routes/arsip.py
+# Riwayat siklus yang sudah diarsipkan: ringkasan beku + detail on-demand dari arsip
+
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+
+from lib.money import fmt
+from services.kolam import get_all_kolam
+from services.siklus import get_riwayat_siklus
+from services.arsip import get_detail_arsip, get_siklus_terarsip
+
+router = APIRouter()
+logger = logging.getLogger("router_arsip")
+
+
+def _ringkasan_view(siklus, nama_kolam: str) -> dict:
+    r = siklus.ringkasan or {}
+    return {
+        "id": siklus.id,
+        "nama_kolam": nama_kolam,
+        "tanggal_mulai": siklus.tanggal_mulai,
+        "tanggal_selesai": siklus.tanggal_selesai,
+        "diarsipkan": bool(siklus.diarsipkan_pada),
+        "hari": r.get("hari", 0),
+        "total_bibit": fmt(r.get("total_bibit", 0)),
+        "total_kematian": fmt(r.get("total_kematian", 0)),
+        "total_pakan_kg": fmt(r.get("total_pakan_gram", 0) // 1000),
+        "total_pengeluaran": fmt(r.get("total_pengeluaran", 0)),
+        "total_jual": fmt(r.get("total_jual", 0)),
+        "laba": r.get("laba", 0),
+        "laba_fmt": fmt(abs(r.get("laba", 0))),
+    }
+
+
+@router.get("/dashboard/arsip", response_class=HTMLResponse)
+async def arsip_page(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses arsip ditolak: user belum login")
+        return RedirectResponse(url="/login", status_code=303)
+    user_id = int(user_id)
+
+    kolam_map = {k["id"]: k.get("nama_kolam", "-") for k in await get_all_kolam(user_id)}
+    riwayat = await get_riwayat_siklus(user_id)
+
+    siklus_list = [
+        _ringkasan_view(s, kolam_map.get(s.kolam_id, "-")) for s in riwayat
+    ]
+    logger.info(f"User {user_id} membuka arsip: {len(siklus_list)} siklus selesai")
+
+    return request.app.templates.TemplateResponse(
+        "dashboard/arsip.html",
+        {"request": request, "siklus_list": siklus_list, "detail": None},
+    )
+
+
+@router.get("/dashboard/arsip/{siklus_id}", response_class=HTMLResponse)
+async def arsip_detail_page(request: Request, siklus_id: int):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses arsip ditolak: user belum login")
+        return RedirectResponse(url="/login", status_code=303)
+    user_id = int(user_id)
+
+    siklus = await get_siklus_terarsip(user_id, siklus_id)
+    if siklus is None:
+        logger.warning(f"Siklus {siklus_id} tidak ditemukan di arsip user {user_id}")
+        return RedirectResponse(url="/dashboard/arsip", status_code=303)
+
+    kolam_map = {k["id"]: k.get("nama_kolam", "-") for k in await get_all_kolam(user_id)}
+    detail = await get_detail_arsip(user_id, siklus_id)
+
+    return request.app.templates.TemplateResponse(
+        "dashboard/arsip.html",
+        {
+            "request": request,
+            "siklus_list": [_ringkasan_view(siklus, kolam_map.get(siklus.kolam_id, "-"))],
+            "detail": detail,
+        },
+    )
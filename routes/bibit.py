@@ -4,8 +4,11 @@ from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.bibit import get_all_bibit, create_bibit, edit_bibit, delete_bibit
 from services.kolam import get_all_kolam
+from services.ransum import UKURAN_BIBIT
 
 router = APIRouter()
 logger = logging.getLogger("router_bibit")
@@ -25,9 +28,6 @@ async def bibit_page(request: Request):
     kolam_list = await get_all_kolam(user_id)
     bibit_list = await get_all_bibit(user_id)
 
-    kolam_list = [dict(k) for k in kolam_list]
-    bibit_list = [dict(b) for b in bibit_list]
-
     kolam_dict = {k["id"]: k["nama_kolam"] for k in kolam_list}
 
     # Menambahkan nama kolam dan total_berat ke dalam data bibit
@@ -37,20 +37,7 @@ async def bibit_page(request: Request):
 
     total_bibit = sum(int(b.get("jumlah", 0)) for b in bibit_list)
     total_berat = sum(float(b.get("total_berat", 0)) for b in bibit_list)
-    total_harga = sum(float(b.get("total_harga", 0)) for b in bibit_list)
-
-    # List ukuran bibit untuk mapping di template
-    ukuran_list = [
-        "2-3 cm",
-        "3-4 cm",
-        "3-5 cm",
-        "4-6 cm",
-        "4-7 cm",
-        "5-7 cm",
-        "6-8 cm",
-        "7-9 cm",
-        "9-12 cm",
-    ]
+    total_harga = sum(b.get("total_harga", 0) for b in bibit_list)
 
     return templates.TemplateResponse(
         "dashboard/bibit.html",
@@ -60,13 +47,14 @@ async def bibit_page(request: Request):
             "bibit_list": bibit_list,
             "total_bibit": total_bibit,
             "total_berat": total_berat,
-            "ukuran_list": ukuran_list,  # <-- kirim ke template
+            "ukuran_list": UKURAN_BIBIT,  # <-- kirim ke template
             "total_harga": total_harga,
         },
     )
 
 
 @router.post("/dashboard/bibit")
+@sekali
 async def bibit_submit(
     request: Request,
     kolam_id: int | None = Form(None),
@@ -95,7 +83,9 @@ async def bibit_submit(
             status_code=303,
         )
 
-    result = await create_bibit(
+    result = await antrian_tulis.tulis(
+        create_bibit,
+        idem_key=await kunci_form(request),
         kolam_id=kolam_id,
         ukuran_bibit=ukuran_bibit,
         jumlah=jumlah,
@@ -106,6 +96,8 @@ async def bibit_submit(
         total_berat=total_berat,
     )
 
+    if result is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/bibit?tertunda=1", status_code=303)
     if result:
         logger.info(f"[BIBIT] Bibit berhasil ditambahkan user_id={user_id}")
     else:
@@ -115,6 +107,7 @@ async def bibit_submit(
 
 
 @router.post("/dashboard/bibit/edit")
+@sekali
 async def bibit_edit(request: Request):
     """Edit data bibit."""
     user_id = request.cookies.get("user_id")
@@ -132,7 +125,9 @@ async def bibit_edit(request: Request):
     tanggal_tebar = form.get("tanggal_tebar")
     total_berat = float(form.get("total_berat") or 0)  # Ambil total_berat
 
-    updated = await edit_bibit(
+    updated = await antrian_tulis.tulis(
+        edit_bibit,
+        idem_key=await kunci_form(request),
         bibit_id=bibit_id,
         kolam_id=kolam_id,
         ukuran_bibit=ukuran_bibit,
@@ -144,6 +139,8 @@ async def bibit_edit(request: Request):
         total_berat=total_berat,  # Sertakan total_berat saat mengedit bibit
     )
 
+    if updated is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/bibit?tertunda=1", status_code=303)
     if updated:
         logger.info(f"[USER {user_id}] Bibit {bibit_id} berhasil diedit")
     else:
@@ -153,6 +150,7 @@ async def bibit_edit(request: Request):
 
 
 @router.post("/dashboard/bibit/delete")
+@sekali
 async def bibit_delete(request: Request):
     """Hapus data bibit."""
     user_id = request.cookies.get("user_id")
@@ -163,8 +161,15 @@ async def bibit_delete(request: Request):
     form = await request.form()
     bibit_id = int(form.get("bibit_id"))
 
-    success = await delete_bibit(bibit_id, user_id=user_id)
+    success = await antrian_tulis.tulis(
+        delete_bibit,
+        idem_key=await kunci_form(request),
+        bibit_id=bibit_id,
+        user_id=user_id,
+    )
 
+    if success is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/bibit?tertunda=1", status_code=303)
     if success:
         logger.info(f"[USER {user_id}] Bibit {bibit_id} dihapus")
     else:
@@ -0,0 +1,141 @@
+# routes/catat_harian.py
+# Form "catat semua kolam hari ini": pakan & kematian seluruh kolam dalam satu
+# POST, disimpan lewat insert array (satu round trip per tabel, satu render).
+
+import logging
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.templating import Jinja2Templates
+
+from lib.tanggal import request_today
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
+from services.kolam import get_all_kolam, kolam_milik_semua
+from services.pakan_stok import get_all_pakan_stok
+from services.pemberian_pakan import add_pakan_many
+from services.kematian import create_kematian_many
+
+router = APIRouter()
+logger = logging.getLogger("router_catat_harian")
+templates = Jinja2Templates(directory="templates")
+
+
+def _angka(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def _tulis_rows(fungsi, user_id: int, rows: list[dict], idem_key: str | None):
+    """Insert array lewat antrian tulis; tabel tanpa row tidak dikirim sama sekali"""
+    if not rows:
+        return []
+    return await antrian_tulis.tulis(fungsi, idem_key=idem_key, user_id=user_id, rows=rows)
+
+
+@router.get("/dashboard/catat_harian", response_class=HTMLResponse)
+async def catat_harian_page(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses /dashboard/catat_harian ditolak: user belum login.")
+        return RedirectResponse("/login", status_code=303)
+
+    user_id = int(user_id)
+
+    kolam_list, pakan_stok_list = await asyncio.gather(
+        get_all_kolam(user_id), get_all_pakan_stok(user_id=user_id)
+    )
+    # Kolam yang sudah panen tidak perlu dicatat harian
+    kolam_list = [k for k in kolam_list if k.get("status_panen") != "sudah"]
+
+    return templates.TemplateResponse(
+        "dashboard/catat_harian.html",
+        {
+            "request": request,
+            "kolam_list": kolam_list,
+            "pakan_stok_list": pakan_stok_list,
+            "today": request_today(request).isoformat(),
+        },
+    )
+
+
+@router.post("/dashboard/catat_harian")
+@sekali
+async def catat_harian_submit(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return RedirectResponse("/login", status_code=303)
+    user_id = int(user_id)
+
+    form = await request.form()
+    tanggal = form.get("tanggal") or request_today(request).isoformat()
+    satuan = form.get("satuan")
+    pakan_stok_id = form.get("pakan_stok_id")
+
+    jenis_pakan = "Unknown"
+    if pakan_stok_id:
+        stok_list = await get_all_pakan_stok(user_id=user_id)
+        stok_dict = {s["id"]: s["nama_pakan"] for s in stok_list}
+        jenis_pakan = stok_dict.get(int(pakan_stok_id), "Unknown")
+
+    # Satu baris form per kolam; kolom yang kosong / 0 dilewati
+    pakan_rows, kematian_rows = [], []
+    for kolam_id, pakan, mati, catatan in zip(
+        form.getlist("kolam_id"),
+        form.getlist("jumlah_pakan"),
+        form.getlist("jumlah_mati"),
+        form.getlist("catatan"),
+    ):
+        kolam_id = int(kolam_id)
+        catatan = catatan or None
+        jumlah = _angka(pakan)
+        if jumlah > 0 and pakan_stok_id:
+            pakan_rows.append(
+                {
+                    "kolam_id": kolam_id,
+                    "tanggal": tanggal,
+                    "jenis_pakan": jenis_pakan,
+                    "jumlah_gram": jumlah * 1000 if satuan == "kg" else jumlah,
+                    "catatan": catatan,
+                }
+            )
+        mati = int(_angka(mati))
+        if mati > 0:
+            kematian_rows.append(
+                {"kolam_id": kolam_id, "tanggal": tanggal, "jumlah": mati, "catatan": catatan}
+            )
+
+    # ================= VALIDASI: KOLAM MILIK USER =================
+    kolam_ids = {r["kolam_id"] for r in pakan_rows + kematian_rows}
+    if not await kolam_milik_semua(user_id, kolam_ids):
+        logger.warning(f"[USER {user_id}] Kolam_id tidak valid saat catat harian")
+        return RedirectResponse("/dashboard/catat_harian?error=kolam", status_code=303)
+
+    # Kunci per row diturunkan dari token form: kiriman ulang / replay antrian
+    # tulis setelah salah satu insert gagal hanya melengkapi row yang belum
+    # masuk, tidak menggandakannya
+    kunci = await kunci_form(request)
+    pakan_added, kematian_added = await asyncio.gather(
+        _tulis_rows(add_pakan_many, user_id, pakan_rows, kunci and f"{kunci}-pakan"),
+        _tulis_rows(
+            create_kematian_many, user_id, kematian_rows, kunci and f"{kunci}-mati"
+        ),
+    )
+
+    if any(h is antrian_tulis.TERTUNDA for h in (pakan_added, kematian_added)):
+        logger.warning(f"[USER {user_id}] Catatan harian {tanggal} masuk antrian tulis")
+        return RedirectResponse("/dashboard/catat_harian?tertunda=1", status_code=303)
+    if pakan_added is None or kematian_added is None:
+        logger.error(f"[USER {user_id}] Gagal simpan catatan harian {tanggal}")
+        return RedirectResponse("/dashboard/catat_harian?error=gagal", status_code=303)
+
+    logger.info(
+        f"[USER {user_id}] Catatan harian {tanggal}: {len(pakan_added)} pakan, "
+        f"{len(kematian_added)} kematian"
+    )
+    return RedirectResponse(
+        f"/dashboard/catat_harian?tersimpan={len(pakan_added) + len(kematian_added)}",
+        status_code=303,
+    )
@@ -2,11 +2,11 @@
 # Dashboard user (filter wajib: user_id)
 
 import logging
-import asyncio
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from datetime import datetime, timezone, timedelta
 
+from lib.money import fmt
+from lib.tanggal import request_today, umur_hari
 from services.user import get_user_by_id
 from services.kolam import get_all_kolam
 from services.kematian import get_all_kematian
@@ -14,11 +14,21 @@ from services.bibit import get_all_bibit
 from services.pengeluaran import get_all_pengeluaran
 from services.pemberian_pakan import get_all_pakan
 from services.pakan_stok import get_all_pakan_stok
+from services.ringkasan import group_by_kolam
+from services.siklus import get_scope_siklus_ids, get_ringkasan_beku
+from services.anomali import get_anomali_terbaru
+from services.statistik import get_stat_kolam
+from services.proyeksi_stok import get_proyeksi_stok, HARI_KRITIS
 
 router = APIRouter()
 logger = logging.getLogger("router_dashboard")
 
 
+def _sorted_iso(values) -> list[str]:
+    """Set tanggal unik, diurutkan, lalu diubah ke 'YYYY-MM-DD'"""
+    return [d.isoformat() for d in sorted({v for v in values if v})]
+
+
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     # Ambil user_id dari cookie
@@ -35,14 +45,21 @@ async def dashboard(request: Request):
     # ============================
     # AMBIL DATA (WAJIB FILTER USER)
     # ============================
-    kolam_list_raw = await get_all_kolam(user_id)
-    kolam_list = [dict(k) for k in kolam_list_raw]
+    # Row model dari services sudah punya slot "status" & "persentase_kematian",
+    # jadi tidak perlu disalin ke dict baru
+    kolam_list = await get_all_kolam(user_id)
+    stat = await get_stat_kolam(user_id)
+    proyeksi = await get_proyeksi_stok(user_id)
 
-    kematian_list = await get_all_kematian(user_id)
-    bibit_list = await get_all_bibit(user_id)
-    pengeluaran_list = await get_all_pengeluaran(user_id)
-    pakan_list = await get_all_pakan(user_id)
-    pakan_stok_list = await get_all_pakan_stok(user_id)
+    # Hanya siklus berjalan tiap kolam; siklus lama sudah diringkas & dibekukan
+    siklus_ids = await get_scope_siklus_ids(user_id)
+    # Kolam yang siklusnya sudah diarsipkan: tidak ada row live, pakai ringkasan beku
+    ringkasan_beku = await get_ringkasan_beku(user_id)
+    kematian_list = await get_all_kematian(user_id, siklus_ids=siklus_ids)
+    bibit_list = await get_all_bibit(user_id, siklus_ids=siklus_ids)
+    pengeluaran_list = await get_all_pengeluaran(user_id, siklus_ids=siklus_ids)
+    pakan_list = await get_all_pakan(user_id, siklus_ids=siklus_ids)
+    pakan_stok_list = await get_all_pakan_stok(user_id, siklus_ids=siklus_ids)
 
     # --- Tetapkan status langsung dari status_panen ---
     for k in kolam_list:
@@ -59,69 +76,61 @@ async def dashboard(request: Request):
     # ============================
     # HITUNG BIBIT & KEMATIAN
     # ============================
-    total_bibit = sum(b.get("jumlah", 0) for b in bibit_list)
-    total_kematian = sum(k.get("jumlah", 0) for k in kematian_list)
+    total_bibit = sum(b.get("jumlah", 0) for b in bibit_list) + sum(
+        r.get("total_bibit", 0) for r in ringkasan_beku.values()
+    )
+    total_kematian = sum(k.get("jumlah", 0) for k in kematian_list) + sum(
+        r.get("total_kematian", 0) for r in ringkasan_beku.values()
+    )
+
+    # Kelompokkan per kolam sekali saja, bukan scan ulang per kolam/per bibit
+    bibit_by_kolam = group_by_kolam(bibit_list)
+    kematian_per_kolam = {
+        kolam_id: sum(km.get("jumlah", 0) for km in rows)
+        for kolam_id, rows in group_by_kolam(kematian_list).items()
+    }
+    pakan_per_kolam = {
+        kolam_id: sum(p.get("jumlah_gram", 0) for p in rows)
+        for kolam_id, rows in group_by_kolam(pakan_list).items()
+    }
+    stok_per_kolam = {
+        kolam_id: sum(s.get("jumlah", 0) for s in rows)
+        for kolam_id, rows in group_by_kolam(pakan_stok_list).items()
+    }
+    for kolam_id, r in ringkasan_beku.items():
+        kematian_per_kolam[kolam_id] = r.get("total_kematian", 0)
+        pakan_per_kolam[kolam_id] = r.get("total_pakan_gram", 0)
+        stok_per_kolam[kolam_id] = r.get("total_stok_pakan", 0)
 
     bibit_per_kolam = {}
     for k in kolam_list:
         kolam_id = k.get("id")
         bibit_per_kolam[kolam_id] = sum(
-            b.get("jumlah", 0) for b in bibit_list if b.get("kolam_id") == kolam_id
-        )
-        kematian_kolam = sum(
-            km.get("jumlah", 0)
-            for km in kematian_list
-            if km.get("kolam_id") == kolam_id
-        )
+            b.get("jumlah", 0) for b in bibit_by_kolam.get(kolam_id, ())
+        ) or ringkasan_beku.get(kolam_id, {}).get("total_bibit", 0)
+        kematian_kolam = kematian_per_kolam.get(kolam_id, 0)
         total_b = bibit_per_kolam[kolam_id]
         k["persentase_kematian"] = (kematian_kolam / total_b * 100) if total_b else 0
 
     # ============================
     # TABEL BIBIT & PAKAN ENTRY PER KOLAM
     # ============================
+    # Satu "hari ini WIB" untuk seluruh request, umur = selisih ordinal hari
+    today = request_today(request)
+
     bibit_entries = []
     for k in kolam_list:
         kolam_id = k.get("id")
         nama_kolam = k.get("nama_kolam")
-        bibit_kolam = [b for b in bibit_list if b.get("kolam_id") == kolam_id]
+        bibit_kolam = bibit_by_kolam.get(kolam_id)
+        pakan_total = pakan_per_kolam.get(kolam_id, 0)
+        stok_pakan_total = stok_per_kolam.get(kolam_id, 0)
 
         if bibit_kolam:
+            kematian_kolam = kematian_per_kolam.get(kolam_id, 0)
             for b in bibit_kolam:
+                # tanggal_tebar sudah berupa `date` dari services
                 tanggal_tebar = b.get("tanggal_tebar")
-                umur_hari = 0
-                if tanggal_tebar:
-                    try:
-                        start_date = (
-                            datetime.fromisoformat(tanggal_tebar.split("T")[0]).date()
-                            if isinstance(tanggal_tebar, str)
-                            else (
-                                tanggal_tebar.date()
-                                if isinstance(tanggal_tebar, datetime)
-                                else tanggal_tebar
-                            )
-                        )
-                        now_wib = datetime.now(timezone.utc) + timedelta(hours=7)
-                        umur_hari = max((now_wib.date() - start_date).days, 0)
-                    except Exception as e:
-                        logger.error(
-                            f"Gagal hitung umur bibit kolam {nama_kolam}, tanggal_tebar={tanggal_tebar}: {e}"
-                        )
-
-                kematian_kolam = sum(
-                    km.get("jumlah", 0)
-                    for km in kematian_list
-                    if km.get("kolam_id") == kolam_id
-                )
-                pakan_total = sum(
-                    p.get("jumlah_gram", 0)
-                    for p in pakan_list
-                    if p.get("kolam_id") == kolam_id
-                )
-                stok_pakan_total = sum(
-                    s.get("jumlah", 0)
-                    for s in pakan_stok_list
-                    if s.get("kolam_id") == kolam_id
-                )
 
                 bibit_entries.append(
                     {
@@ -131,7 +140,7 @@ async def dashboard(request: Request):
                         "harga": b.get("total_harga", 0),
                         "ukuran_bibit": b.get("ukuran_bibit", "-"),
                         "tanggal_tebar": tanggal_tebar,
-                        "umur_hari": umur_hari,
+                        "umur_hari": umur_hari(tanggal_tebar, today),
                         "status": k["status"],
                         "kematian": kematian_kolam,
                         "pakan_total": pakan_total,
@@ -139,28 +148,21 @@ async def dashboard(request: Request):
                     }
                 )
         else:
-            # Kolam tanpa bibit → tetap tampil
+            # Kolam tanpa bibit live (belum tebar / siklus sudah diarsipkan) → tetap tampil
+            beku = ringkasan_beku.get(kolam_id, {})
             bibit_entries.append(
                 {
                     "kolam_id": kolam_id,
                     "nama_kolam": nama_kolam,
-                    "jumlah": 0,
-                    "harga": 0,
+                    "jumlah": beku.get("total_bibit", 0),
+                    "harga": beku.get("biaya_bibit", 0),
                     "ukuran_bibit": "-",
                     "tanggal_tebar": None,
                     "umur_hari": 0,
                     "status": k["status"],
-                    "kematian": 0,
-                    "pakan_total": sum(
-                        p.get("jumlah_gram", 0)
-                        for p in pakan_list
-                        if p.get("kolam_id") == kolam_id
-                    ),
-                    "stok_pakan_total": sum(
-                        s.get("jumlah", 0)
-                        for s in pakan_stok_list
-                        if s.get("kolam_id") == kolam_id
-                    ),
+                    "kematian": beku.get("total_kematian", 0),
+                    "pakan_total": pakan_total,
+                    "stok_pakan_total": stok_pakan_total,
                 }
             )
 
@@ -197,14 +199,27 @@ async def dashboard(request: Request):
         for s in pakan_stok_list
     ]
 
-    pengeluaran_detail += bibit_detail + pakan_stok_detail
-    pengeluaran_total_formatted = "{:,}".format(
-        int(sum(item["total"] for item in pengeluaran_detail))
-    ).replace(",", ".")
+    arsip_detail = [
+        {
+            "nama": "Siklus terarsip (ringkasan)",
+            "jumlah": 1,
+            "harga": r.get("total_pengeluaran", 0),
+            "total": r.get("total_pengeluaran", 0),
+        }
+        for r in ringkasan_beku.values()
+        if r.get("total_pengeluaran")
+    ]
+
+    pengeluaran_detail += bibit_detail + pakan_stok_detail + arsip_detail
+    # Semua "total" sudah integer rupiah dari services, cukup dijumlah
+    pengeluaran_total_formatted = fmt(sum(item["total"] for item in pengeluaran_detail))
 
-    total_pakan_semua_kg = sum(
-        p.get("jumlah_gram", 0) for p in pakan_list
-    ) / 1000 + sum(s.get("jumlah", 0) for s in pakan_stok_list)
+    total_pakan_semua_kg = (
+        sum(p.get("jumlah_gram", 0) for p in pakan_list)
+        + sum(r.get("total_pakan_gram", 0) for r in ringkasan_beku.values())
+    ) / 1000 + sum(s.get("jumlah", 0) for s in pakan_stok_list) + sum(
+        r.get("total_stok_pakan", 0) for r in ringkasan_beku.values()
+    )
     total_pakan = f"{int(total_pakan_semua_kg)} kg"
 
     return request.app.templates.TemplateResponse(
@@ -213,35 +228,43 @@ async def dashboard(request: Request):
             "request": request,
             "username": username,
             "kolam_list": kolam_list,
-            "total_bibit": "{:,}".format(total_bibit).replace(",", "."),
-            "total_kematian": "{:,}".format(total_kematian).replace(",", "."),
+            "total_bibit": fmt(total_bibit),
+            "total_kematian": fmt(total_kematian),
             "bibit_entries": bibit_entries,
             "pengeluaran_total": pengeluaran_total_formatted,
             "pengeluaran_detail": pengeluaran_detail,
             "total_pakan": total_pakan,
-            "total_kolam": "{:,}".format(total_kolam).replace(",", "."),
+            "total_kolam": fmt(total_kolam),
             "kolam_belum": kolam_belum,
             "kolam_sudah": kolam_sudah,
             "bibit_per_kolam": bibit_per_kolam,
             "kematian_list": kematian_list,
-            "tanggal_bibit": sorted(
-                {str(b["tanggal_tebar"]) for b in bibit_list if b.get("tanggal_tebar")}
-            ),
-            "tanggal_kematian": sorted(
-                {str(k["tanggal"]) for k in kematian_list if k.get("tanggal")}
+            # Flag lonjakan kematian (dicatat saat input, bukan dihitung ulang di sini)
+            "anomali_kematian": await get_anomali_terbaru(user_id),
+            # Metrik performa dari akumulator per siklus (tanpa scan riwayat)
+            "performa_kolam": [
+                {**stat[k["id"]], "nama_kolam": k.get("nama_kolam")}
+                for k in kolam_list
+                if k["id"] in stat
+            ],
+            # Kolam yang stok pakannya diperkirakan habis dalam HARI_KRITIS hari
+            "stok_kritis": [
+                {**proyeksi["per_kolam"][k["id"]], "nama_kolam": k.get("nama_kolam")}
+                for k in kolam_list
+                if k["id"] in proyeksi["per_kolam"]
+                and proyeksi["per_kolam"][k["id"]]["hari_sampai_habis"] is not None
+                and proyeksi["per_kolam"][k["id"]]["hari_sampai_habis"] <= HARI_KRITIS
+            ],
+            "stok_habis_hari": proyeksi["hari_sampai_habis"],
+            # Tanggal sudah `date`: sort sebagai tanggal, baru diubah ke string
+            "tanggal_bibit": _sorted_iso(b.get("tanggal_tebar") for b in bibit_list),
+            "tanggal_kematian": _sorted_iso(k.get("tanggal") for k in kematian_list),
+            "tanggal_pengeluaran": _sorted_iso(
+                p.get("tanggal") for p in pengeluaran_list
             ),
-            "tanggal_pengeluaran": sorted(
-                {str(p["tanggal"]) for p in pengeluaran_list if p.get("tanggal")}
-            ),
-            "tanggal_pemberian_pakan": sorted(
-                {str(pp["tanggal"]) for pp in pakan_list if pp.get("tanggal")}
-            ),
-            "tanggal_pakan_stok": sorted(
-                {
-                    str(s["tanggal_masuk"])
-                    for s in pakan_stok_list
-                    if s.get("tanggal_masuk")
-                }
+            "tanggal_pemberian_pakan": _sorted_iso(pp.get("tanggal") for pp in pakan_list),
+            "tanggal_pakan_stok": _sorted_iso(
+                s.get("tanggal_masuk") for s in pakan_stok_list
             ),
         },
     )
@@ -0,0 +1,60 @@
+# routes/ekspor.py
+# Unduh ekspor penuh (CSV / NDJSON) per tabel atau laporan ringkasan per kolam,
+# dialirkan per halaman.
+# Filter sama dengan halaman daftar: ?kolam_id=&dari=YYYY-MM-DD&sampai=YYYY-MM-DD
+
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from lib.tanggal import to_date
+from services.ekspor import EKSPOR, FORMAT, stream_ekspor
+
+router = APIRouter()
+logger = logging.getLogger("router_ekspor")
+
+
+@router.get("/api/ekspor/{tabel}.{format_file}")
+async def ekspor_api(request: Request, tabel: str, format_file: str):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    if tabel not in EKSPOR or format_file not in FORMAT:
+        return JSONResponse(
+            {"detail": f"Tabel: {', '.join(EKSPOR)}; format: {', '.join(FORMAT)}"},
+            status_code=404,
+        )
+
+    params = request.query_params
+    try:
+        kolam_id = int(params["kolam_id"]) if params.get("kolam_id") else None
+    except ValueError:
+        return JSONResponse({"detail": "kolam_id harus angka"}, status_code=400)
+    dari, sampai = params.get("dari"), params.get("sampai")
+    if (dari and to_date(dari) is None) or (sampai and to_date(sampai) is None):
+        return JSONResponse({"detail": "Format tanggal YYYY-MM-DD"}, status_code=400)
+    # Pakai hasil parse (bukan string mentah) untuk query dan nama file
+    dari = to_date(dari).isoformat() if dari else None
+    sampai = to_date(sampai).isoformat() if sampai else None
+
+    logger.info(
+        f"[USER {user_id}] Ekspor {tabel}.{format_file} "
+        f"kolam_id={kolam_id} {dari}..{sampai}"
+    )
+    nama_file = f"{tabel}{'_' + dari if dari else ''}{'_' + sampai if sampai else ''}"
+    return StreamingResponse(
+        stream_ekspor(
+            user_id,
+            tabel,
+            format_file,
+            kolam_id=kolam_id,
+            dari=dari,
+            sampai=sampai,
+        ),
+        media_type=FORMAT[format_file],
+        headers={
+            "Content-Disposition": f'attachment; filename="{nama_file}.{format_file}"'
+        },
+    )
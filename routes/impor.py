@@ -0,0 +1,60 @@
+# routes/impor.py
+# Upload spreadsheet (CSV / XLSX) untuk impor data lama.
+# Progres dikirim sebagai Server-Sent Events selama impor berjalan.
+
+import os
+import json
+import shutil
+import asyncio
+import logging
+import tempfile
+from fastapi import APIRouter, Request, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.impor import TABEL, impor, format_dari_nama
+
+router = APIRouter()
+logger = logging.getLogger("router_impor")
+
+
+def _simpan_sementara(upload: UploadFile, suffix: str) -> str:
+    """Salin upload ke file sementara per blok (memori tetap kecil)"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(upload.file, tmp, 1024 * 1024)
+        return tmp.name
+
+
+@router.post("/api/impor/{tabel}")
+async def impor_api(request: Request, tabel: str, file: UploadFile = File(...)):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    if tabel not in TABEL:
+        pilihan = ", ".join(sorted(TABEL))
+        return JSONResponse(
+            {"detail": f"Tabel tidak dikenal, pilih salah satu: {pilihan}"}, status_code=400
+        )
+
+    format_file = format_dari_nama(file.filename)
+    # Upload ditutup FastAPI sebelum body streaming dikirim, jadi disalin dulu
+    path = await asyncio.to_thread(_simpan_sementara, file, f".{format_file}")
+    logger.info(f"[USER {user_id}] Impor {tabel} dari {file.filename} dimulai")
+
+    async def event_stream():
+        try:
+            async for progres in impor(user_id, tabel, path, format_file):
+                yield f"data: {json.dumps(progres, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"[USER {user_id}] Impor {tabel} gagal: {e}")
+            pesan = json.dumps({"tabel": tabel, "selesai": True, "error_fatal": str(e)})
+            yield f"event: error\ndata: {pesan}\n\n"
+        finally:
+            os.remove(path)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
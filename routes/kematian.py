@@ -6,19 +6,27 @@ from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.kematian import (
     get_all_kematian,
     create_kematian,
     update_kematian,
     delete_kematian,
 )
-from services.kolam import get_all_kolam
+from services.kolam import get_all_kolam, kolam_milik
 
 router = APIRouter()
 logger = logging.getLogger("router_kematian")
 templates = Jinja2Templates(directory="templates")
 
 
+def _kembali(hasil) -> RedirectResponse:
+    if hasil is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/kematian?tertunda=1", status_code=303)
+    return RedirectResponse("/dashboard/kematian", status_code=303)
+
+
 # ============================================================
 # HALAMAN KEMATIAN
 # ============================================================
@@ -31,8 +39,8 @@ async def kematian_page(request: Request):
 
     user_id = int(user_id)
 
-    kolam_list = [dict(k) for k in await get_all_kolam(user_id)]
-    kematian_list = [dict(k) for k in await get_all_kematian(user_id)]
+    kolam_list = await get_all_kolam(user_id)
+    kematian_list = await get_all_kematian(user_id)
 
     kolam_dict = {k["id"]: k["nama_kolam"] for k in kolam_list}
 
@@ -58,6 +66,7 @@ async def kematian_page(request: Request):
 # TAMBAH KEMATIAN
 # ============================================================
 @router.post("/dashboard/kematian")
+@sekali
 async def kematian_submit(
     request: Request,
     kolam_id: int | None = Form(None),
@@ -81,9 +90,7 @@ async def kematian_submit(
         )
 
     # ================= VALIDASI: KOLAM MILIK USER =================
-    kolam_list = await get_all_kolam(user_id)
-    kolam_ids = {k["id"] for k in kolam_list}
-    if kolam_id not in kolam_ids:
+    if not await kolam_milik(user_id, kolam_id):
         logger.warning(f"[USER {user_id}] Kolam_id tidak valid saat submit kematian")
         return RedirectResponse("/dashboard/kematian", status_code=303)
 
@@ -91,7 +98,9 @@ async def kematian_submit(
         f"[USER {user_id}] Tambah kematian | kolam_id={kolam_id} | jumlah={jumlah}"
     )
 
-    await create_kematian(
+    hasil = await antrian_tulis.tulis(
+        create_kematian,
+        idem_key=await kunci_form(request),
         kolam_id=kolam_id,
         tanggal=tanggal,
         jumlah=jumlah,
@@ -99,13 +108,14 @@ async def kematian_submit(
         user_id=user_id,
     )
 
-    return RedirectResponse("/dashboard/kematian", status_code=303)
+    return _kembali(hasil)
 
 
 # ============================================================
 # EDIT KEMATIAN
 # ============================================================
 @router.post("/dashboard/kematian/edit")
+@sekali
 async def kematian_edit(
     request: Request,
     kematian_id: int = Form(...),
@@ -123,9 +133,7 @@ async def kematian_edit(
 
     # ================= VALIDASI KOLAM (JIKA DIUBAH) =================
     if kolam_id:
-        kolam_list = await get_all_kolam(user_id)
-        kolam_ids = {k["id"] for k in kolam_list}
-        if kolam_id not in kolam_ids:
+        if not await kolam_milik(user_id, kolam_id):
             logger.warning(f"[USER {user_id}] Kolam_id tidak valid saat edit kematian")
             return RedirectResponse("/dashboard/kematian", status_code=303)
     else:
@@ -133,7 +141,9 @@ async def kematian_edit(
 
     logger.info(f"[USER {user_id}] Edit kematian_id={kematian_id}, kolam_id={kolam_id}")
 
-    await update_kematian(
+    hasil = await antrian_tulis.tulis(
+        update_kematian,
+        idem_key=await kunci_form(request),
         kematian_id=kematian_id,
         user_id=user_id,
         kolam_id=kolam_id,
@@ -142,13 +152,14 @@ async def kematian_edit(
         catatan=catatan,
     )
 
-    return RedirectResponse("/dashboard/kematian", status_code=303)
+    return _kembali(hasil)
 
 
 # ============================================================
 # DELETE KEMATIAN
 # ============================================================
 @router.post("/dashboard/kematian/delete")
+@sekali
 async def kematian_delete(
     request: Request,
     kematian_id: int = Form(...),
@@ -162,9 +173,11 @@ async def kematian_delete(
 
     logger.info(f"[USER {user_id}] Hapus kematian_id={kematian_id}")
 
-    await delete_kematian(
+    hasil = await antrian_tulis.tulis(
+        delete_kematian,
+        idem_key=await kunci_form(request),
         kematian_id=kematian_id,
         user_id=user_id,
     )
 
-    return RedirectResponse("/dashboard/kematian", status_code=303)
+    return _kembali(hasil)
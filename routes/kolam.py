@@ -6,6 +6,8 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.kolam import (
     get_all_kolam,
     create_kolam,
@@ -19,6 +21,12 @@ logger = logging.getLogger("router_kolam")
 templates = Jinja2Templates(directory="templates")
 
 
+def _kembali(hasil) -> RedirectResponse:
+    if hasil is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/kolam?tertunda=1", status_code=303)
+    return RedirectResponse("/dashboard/kolam", status_code=303)
+
+
 @router.get("/dashboard/kolam", response_class=HTMLResponse)
 async def kolam_page(request: Request):
     # --- Ambil user_id dari cookies ---
@@ -45,6 +53,7 @@ async def kolam_page(request: Request):
 
 
 @router.post("/dashboard/kolam")
+@sekali
 async def kolam_submit(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -60,25 +69,32 @@ async def kolam_submit(request: Request):
 
     logger.info(f"[USER {user_id}] Submit kolam baru: {kolam_baru}")
 
-    if kolam_baru:
-        kolam = await create_kolam(
-            user_id=user_id,
-            nama_kolam=kolam_baru,
-            kapasitas_bibit=kapasitas_bibit,
-            tanggal_mulai=tanggal_mulai,
-            catatan=catatan,
-        )
+    if not kolam_baru:
+        return RedirectResponse("/dashboard/kolam", status_code=303)
 
-        if not kolam:
-            logger.error(f"[USER {user_id}] Gagal buat kolam baru")
-            return HTMLResponse("Gagal buat kolam baru", status_code=400)
+    kolam = await antrian_tulis.tulis(
+        create_kolam,
+        idem_key=await kunci_form(request),
+        user_id=user_id,
+        nama_kolam=kolam_baru,
+        kapasitas_bibit=kapasitas_bibit,
+        tanggal_mulai=tanggal_mulai,
+        catatan=catatan,
+    )
 
+    if kolam is antrian_tulis.TERTUNDA:
+        logger.warning(f"[USER {user_id}] Kolam baru masuk antrian tulis")
+    elif not kolam:
+        logger.error(f"[USER {user_id}] Gagal buat kolam baru")
+        return HTMLResponse("Gagal buat kolam baru", status_code=400)
+    else:
         logger.info(f"[USER {user_id}] Kolam dibuat id={kolam['id']}")
 
-    return RedirectResponse("/dashboard/kolam", status_code=303)
+    return _kembali(kolam)
 
 
 @router.post("/dashboard/kolam/edit")
+@sekali
 async def kolam_edit(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -96,7 +112,9 @@ async def kolam_edit(request: Request):
     if kapasitas_bibit:
         kapasitas_bibit = int(kapasitas_bibit)
 
-    updated = await edit_kolam(
+    updated = await antrian_tulis.tulis(
+        edit_kolam,
+        idem_key=await kunci_form(request),
         user_id=user_id,
         kolam_id=kolam_id,
         nama_kolam=nama_kolam,
@@ -107,13 +125,14 @@ async def kolam_edit(request: Request):
 
     if updated:
         logger.info(f"[USER {user_id}] Kolam {kolam_id} berhasil diedit")
-    else:
+    elif updated is not antrian_tulis.TERTUNDA:
         logger.error(f"[USER {user_id}] Gagal edit kolam {kolam_id}")
 
-    return RedirectResponse("/dashboard/kolam", status_code=303)
+    return _kembali(updated)
 
 
 @router.post("/dashboard/kolam/status")
+@sekali
 async def kolam_update_status(request: Request):
     """
     Update status kolam: belum / sudah
@@ -130,19 +149,22 @@ async def kolam_update_status(request: Request):
 
     logger.info(f"[USER {user_id}] Update status kolam id={kolam_id} -> {status}")
 
-    updated = await update_status_kolam(
+    updated = await antrian_tulis.tulis(
+        update_status_kolam,
+        idem_key=await kunci_form(request),
         user_id=user_id,
         kolam_id=kolam_id,
         status=status,
     )
 
-    if not updated:
+    if not updated and updated is not antrian_tulis.TERTUNDA:
         logger.error(f"[USER {user_id}] Gagal update status kolam id={kolam_id}")
 
-    return RedirectResponse("/dashboard/kolam", status_code=303)
+    return _kembali(updated)
 
 
 @router.post("/dashboard/kolam/delete")
+@sekali
 async def kolam_delete(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -153,11 +175,13 @@ async def kolam_delete(request: Request):
 
     kolam_id = int(form.get("kolam_id"))
 
-    success = await delete_kolam(kolam_id, user_id=user_id)
+    success = await antrian_tulis.tulis(
+        delete_kolam, idem_key=await kunci_form(request), user_id=user_id, kolam_id=kolam_id
+    )
 
     if success:
         logger.info(f"[USER {user_id}] Kolam {kolam_id} dihapus")
-    else:
+    elif success is not antrian_tulis.TERTUNDA:
         logger.error(f"[USER {user_id}] Gagal hapus kolam {kolam_id}")
 
-    return RedirectResponse("/dashboard/kolam", status_code=303)
+    return _kembali(success)
@@ -6,7 +6,10 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services import pakan_stok, kolam  # kolam service untuk ambil list kolam
+from services.proyeksi_stok import get_proyeksi_stok
 
 router = APIRouter()
 logger = logging.getLogger("router_pakan_stok")
@@ -37,10 +40,22 @@ async def pakan_stok_page(request: Request):
         satuan = p.get("satuan") or "g"
         jumlah_g = float(p["jumlah"]) * 1000 if satuan == "kg" else float(p["jumlah"])
         total_jumlah_g += jumlah_g
-        total_harga += float(p["harga"])
+        total_harga += p["harga"]  # integer rupiah dari services
 
     total_jumlah_kg = int(total_jumlah_g / 1000)  # buang desimal
 
+    # Proyeksi hari-sampai-habis (dari state konsumsi yang sudah di-cache)
+    proyeksi = await get_proyeksi_stok(user_id)
+    nama_kolam = {k["id"]: k["nama_kolam"] for k in kolam_list}
+    proyeksi_kolam = sorted(
+        (
+            {**p, "nama_kolam": nama_kolam.get(p["kolam_id"], "-")}
+            for p in proyeksi["per_kolam"].values()
+            if p["kolam_id"] in nama_kolam
+        ),
+        key=lambda p: (p["hari_sampai_habis"] is None, p["hari_sampai_habis"] or 0),
+    )
+
     logger.info(
         f"[USER {user_id}] Render pakan_stok_page: {len(stok_list)} data ditemukan"
     )
@@ -54,6 +69,8 @@ async def pakan_stok_page(request: Request):
             "total_harga": total_harga,
             "kolam_list": kolam_list,  # untuk dropdown
             "selected_kolam_id": kolam_id,
+            "proyeksi": proyeksi,
+            "proyeksi_kolam": proyeksi_kolam,
         },
     )
 
@@ -62,6 +79,7 @@ async def pakan_stok_page(request: Request):
 
 
 @router.post("/dashboard/pakan_stok/add")
+@sekali
 async def pakan_stok_add(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -98,7 +116,9 @@ async def pakan_stok_add(request: Request):
     harga = float(form.get("harga") or 0)
     tanggal_masuk = form.get("tanggal_masuk")
 
-    added = await pakan_stok.add_pakan_stok(
+    added = await antrian_tulis.tulis(
+        pakan_stok.add_pakan_stok,
+        idem_key=await kunci_form(request),
         user_id=user_id,
         nama_pakan=nama_pakan,
         jumlah=jumlah,
@@ -108,6 +128,8 @@ async def pakan_stok_add(request: Request):
         satuan=satuan,
     )
 
+    if added is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pakan_stok?tertunda=1", status_code=303)
     if added:
         logger.info(f"[USER {user_id}] Stok pakan ditambahkan: {nama_pakan}")
     else:
@@ -117,6 +139,7 @@ async def pakan_stok_add(request: Request):
 
 
 @router.post("/dashboard/pakan_stok/edit")
+@sekali
 async def pakan_stok_edit(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -137,16 +160,21 @@ async def pakan_stok_edit(request: Request):
     harga = float(form.get("harga", 0))
     tanggal_masuk = form.get("tanggal_masuk")
 
-    updated = await pakan_stok.edit_pakan_stok(
-        user_id,
-        pakan_stok_id,
-        nama_pakan,
-        jumlah,
-        harga,
-        kolam_id,
-        tanggal_masuk,
-        satuan,
+    # Argumen bernama: antrian tulis menyimpannya sebagai JSON untuk replay
+    updated = await antrian_tulis.tulis(
+        pakan_stok.edit_pakan_stok,
+        idem_key=await kunci_form(request),
+        user_id=user_id,
+        pakan_stok_id=pakan_stok_id,
+        nama_pakan=nama_pakan,
+        jumlah=jumlah,
+        harga=harga,
+        kolam_id=kolam_id,
+        tanggal_masuk=tanggal_masuk,
+        satuan=satuan,
     )
+    if updated is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pakan_stok?tertunda=1", status_code=303)
     if updated:
         logger.info(f"[USER {user_id}] Stok {pakan_stok_id} diedit")
     else:
@@ -156,6 +184,7 @@ async def pakan_stok_edit(request: Request):
 
 
 @router.post("/dashboard/pakan_stok/delete")
+@sekali
 async def pakan_stok_delete(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -165,7 +194,14 @@ async def pakan_stok_delete(request: Request):
     form = await request.form()
     pakan_stok_id = int(form.get("pakan_stok_id"))
 
-    success = await pakan_stok.delete_pakan_stok(user_id, pakan_stok_id)
+    success = await antrian_tulis.tulis(
+        pakan_stok.delete_pakan_stok,
+        idem_key=await kunci_form(request),
+        user_id=user_id,
+        pakan_stok_id=pakan_stok_id,
+    )
+    if success is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pakan_stok?tertunda=1", status_code=303)
     if success:
         logger.info(f"[USER {user_id}] Stok {pakan_stok_id} dihapus")
     else:
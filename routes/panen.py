@@ -1,9 +1,11 @@
 # routes/dashboard/panen.py
 import logging
-from datetime import datetime
-from decimal import Decimal
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import RedirectResponse
+from lib.money import fmt
+from lib.tanggal import selisih_hari
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.panen import get_all_panen, edit_panen
 from services.kolam import get_all_kolam
 from services.kematian import get_all_kematian
@@ -15,11 +17,6 @@ router = APIRouter()
 logger = logging.getLogger("router__panen")
 
 
-def fmt(x: float | int) -> str:
-    """Format angka ribuan tanpa desimal"""
-    return "{:,}".format(int(x)).replace(",", ".")
-
-
 def fmt_berat(x: float | int) -> str:
     """Format berat ikan, kuintal jika >=100kg"""
     if x >= 100:
@@ -64,26 +61,19 @@ async def panen_page(request: Request):
         bibit_kolam = [b for b in bibit_list if b["kolam_id"] == kolam_id]
         total_berat_bibit = sum(b.get("total_berat", 0) for b in bibit_kolam)
         total_ekor_bibit = sum(b.get("jumlah", 0) for b in bibit_kolam)
-        total_pengeluaran_bibit = sum(
-            Decimal(b.get("total_harga", 0)) for b in bibit_kolam
-        )
+        # Semua nilai uang sudah integer rupiah dari services
+        total_pengeluaran_bibit = sum(b.get("total_harga", 0) for b in bibit_kolam)
 
         # ===== TANGGAL TEBAR (DARI BIBIT) =====
-        tanggal_tebar = (
-            min(
-                datetime.strptime(b["tanggal_tebar"], "%Y-%m-%d")
-                for b in bibit_kolam
-                if b.get("tanggal_tebar")
-            )
-            if bibit_kolam
-            else None
+        # Tanggal sudah berupa `date` dari services
+        tanggal_tebar = min(
+            (b["tanggal_tebar"] for b in bibit_kolam if b.get("tanggal_tebar")),
+            default=None,
         )
 
         # Pakan
         pakan_kolam = [p for p in pakan_stok_list if p.get("kolam_id") == kolam_id]
-        total_pengeluaran_pakan = sum(
-            Decimal(p.get("harga", 0)) for p in pakan_kolam
-        )
+        total_pengeluaran_pakan = sum(p.get("harga", 0) for p in pakan_kolam)
 
         # Operasional
         pengeluaran_operasional_kolam = [
@@ -91,7 +81,7 @@ async def panen_page(request: Request):
         ]
 
         total_pengeluaran_operasional = sum(
-            Decimal(pe.get("harga", 0)) * Decimal(pe.get("jumlah", 1))
+            pe.get("harga", 0) * (pe.get("jumlah") or 1)
             for pe in pengeluaran_operasional_kolam
         )
 
@@ -99,18 +89,11 @@ async def panen_page(request: Request):
         total_pengeluaran = total_pengeluaran_bibit + total_pengeluaran_pakan + total_pengeluaran_operasional
 
         # ===== TANGGAL PANEN TERAKHIR =====
-        tanggal_terakhir_panen = max(
-            datetime.strptime(p["tanggal_panen"], "%Y-%m-%d")
-            for p in panen_kolam
-        )
+        tanggal_terakhir_panen = max(p["tanggal_panen"] for p in panen_kolam)
 
         # Hari aktif
         # ===== HARI AKTIF (DARI TANGGAL TEBAR) =====
-        hari_aktif = (
-            (tanggal_terakhir_panen - tanggal_tebar).days
-            if tanggal_tebar
-            else 0
-        )
+        hari_aktif = selisih_hari(tanggal_tebar, tanggal_terakhir_panen)
 
         # Total kematian
         total_kematian = sum(
@@ -124,9 +107,7 @@ async def panen_page(request: Request):
         # =====================================================
 
         # Total pakan (kg)
-        total_pakan_kg = sum(
-            Decimal(p.get("jumlah", 0)) for p in pakan_kolam
-        )
+        total_pakan_kg = sum(float(p.get("jumlah", 0)) for p in pakan_kolam)
 
         # Total biaya produksi
         total_biaya_produksi = (
@@ -136,7 +117,7 @@ async def panen_page(request: Request):
         )
 
         # Laba
-        total_keuntungan = Decimal(total_jual_kolam) - total_biaya_produksi
+        total_keuntungan = total_jual_kolam - total_biaya_produksi
   
         # Simpan ringkasan per kolam
         ringkasan_per_kolam[kolam_id] = {
@@ -174,7 +155,7 @@ async def panen_page(request: Request):
             "total_biaya_bibit": total_pengeluaran_bibit,
             "total_biaya_bibit_fmt": fmt(total_pengeluaran_bibit),
             "total_pakan_kg": total_pakan_kg,
-            "total_pakan_kg_fmt": fmt_berat(float(total_pakan_kg)),
+            "total_pakan_kg_fmt": fmt_berat(total_pakan_kg),
             "total_biaya_pakan": total_pengeluaran_pakan,
             "total_biaya_pakan_fmt": fmt(total_pengeluaran_pakan),
             "total_operasional": total_pengeluaran_operasional,
@@ -187,7 +168,10 @@ async def panen_page(request: Request):
             "panen_detail": [
                 {
                     "id": p["id"],
-                    "tanggal_panen": p["tanggal_panen"],
+                    # Model Panen mem-parse tanggal ke `date`; modal edit butuh YYYY-MM-DD
+                    "tanggal_panen": (
+                        p["tanggal_panen"].isoformat() if p["tanggal_panen"] else ""
+                    ),
                     "total_berat": fmt_berat(p.get("total_berat", 0)),
                     "total_jual": fmt(p.get("total_jual", 0)),
                     "catatan": p.get("catatan", "-"),
@@ -206,17 +190,13 @@ async def panen_page(request: Request):
     # TOTAL PENGELUARAN GLOBAL (BENAR)
     # ===============================
 
-    total_pengeluaran_bibit_global = sum(
-        Decimal(b.get("total_harga", 0)) for b in bibit_list
-    )
+    total_pengeluaran_bibit_global = sum(b.get("total_harga", 0) for b in bibit_list)
 
-    total_pengeluaran_pakan_global = sum(
-        Decimal(p.get("total_harga", 0)) for p in pakan_stok_list
-    )
+    # PakanStok menyimpan biaya di kolom "harga" (sama seperti per kolam)
+    total_pengeluaran_pakan_global = sum(p.get("harga", 0) for p in pakan_stok_list)
 
     total_pengeluaran_operasional_global = sum(
-        Decimal(pe.get("harga", 0)) * Decimal(pe.get("jumlah", 1))
-        for pe in pengeluaran_list
+        pe.get("harga", 0) * (pe.get("jumlah") or 1) for pe in pengeluaran_list
     )
 
     total_pengeluaran_global = (
@@ -236,11 +216,10 @@ async def panen_page(request: Request):
             "total_panen_global": fmt(total_panen_global),
             "total_jual_global": fmt(total_jual_global),
             "total_pengeluaran_global": fmt(total_pengeluaran_global),
-            "total_pengeluaran_global": fmt(int(total_pengeluaran_global)),
-            "total_pengeluaran_bibit_global": fmt(int(total_pengeluaran_bibit_global)),
-            "total_pengeluaran_pakan_global": fmt(int(total_pengeluaran_pakan_global)),
+            "total_pengeluaran_bibit_global": fmt(total_pengeluaran_bibit_global),
+            "total_pengeluaran_pakan_global": fmt(total_pengeluaran_pakan_global),
             "total_pengeluaran_operasional_global": fmt(
-                int(total_pengeluaran_operasional_global)
+                total_pengeluaran_operasional_global
             ),
             "total_kolam_panen": total_kolam_panen,
         },
@@ -251,6 +230,7 @@ async def panen_page(request: Request):
 # EDIT PANEN
 # ============================================================
 @router.post("/dashboard/panen/edit")
+@sekali
 async def edit_panen_route(
     request: Request,
     panen_id: int = Form(...),
@@ -268,7 +248,9 @@ async def edit_panen_route(
 
     logger.info(f"Request edit panen: panen_id={panen_id}, user_id={user_id}")
 
-    success = await edit_panen(
+    success = await antrian_tulis.tulis(
+        edit_panen,
+        idem_key=await kunci_form(request),
         panen_id=panen_id,
         user_id=user_id,
         total_berat=total_berat,
@@ -277,6 +259,9 @@ async def edit_panen_route(
         catatan=catatan,
     )
 
+    if success is antrian_tulis.TERTUNDA:
+        logger.warning(f"Edit panen panen_id={panen_id} masuk antrian tulis")
+        return RedirectResponse(url="/dashboard/panen?tertunda=1", status_code=303)
     if not success:
         logger.error(f"Gagal edit panen panen_id={panen_id}")
     else:
@@ -6,6 +6,8 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.kolam import get_all_kolam
 from services import pemberian_pakan
 from services import pakan_stok
@@ -15,6 +17,17 @@ logger = logging.getLogger("router_pemberian_pakan")
 templates = Jinja2Templates(directory="templates")
 
 
+async def _nama_pakan(user_id: int, pakan_stok_id: int) -> str:
+    """Nama pakan dari stok ("Unknown" kalau tidak ada / DB tidak terjangkau)"""
+    try:
+        stok_list = await pakan_stok.get_all_pakan_stok(user_id=user_id)
+    except Exception as e:
+        logger.warning(f"[USER {user_id}] Nama stok {pakan_stok_id} tidak terbaca: {e}")
+        return "Unknown"
+    stok_dict = {s["id"]: s["nama_pakan"] for s in stok_list}
+    return stok_dict.get(pakan_stok_id, "Unknown")
+
+
 @router.get("/dashboard/pemberian_pakan", response_class=HTMLResponse)
 async def pakan_page(request: Request):
     user_id = request.cookies.get("user_id")
@@ -46,6 +59,7 @@ async def pakan_page(request: Request):
 
 
 @router.post("/dashboard/pemberian_pakan/add")
+@sekali
 async def pakan_add(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -60,18 +74,16 @@ async def pakan_add(request: Request):
     satuan = form.get("satuan")
     catatan = form.get("catatan")
 
-    # Ambil nama pakan dari stok
-    stok_list = await pakan_stok.get_all_pakan_stok(user_id=user_id)
-    stok_dict = {s["id"]: s["nama_pakan"] for s in stok_list}
-    jenis_pakan = stok_dict.get(pakan_stok_id, "Unknown")
-
+    jenis_pakan = await _nama_pakan(user_id, pakan_stok_id)
     jumlah_gram = jumlah * 1000 if satuan == "kg" else jumlah
 
     logger.info(
         f"[USER {user_id}] Tambah pakan kolam={kolam_id}, pakan='{jenis_pakan}', jumlah={jumlah_gram}g"
     )
 
-    added = await pemberian_pakan.add_pakan(
+    added = await antrian_tulis.tulis(
+        pemberian_pakan.add_pakan,
+        idem_key=await kunci_form(request),
         kolam_id=kolam_id,
         tanggal=tanggal,
         jenis_pakan=jenis_pakan,
@@ -80,12 +92,15 @@ async def pakan_add(request: Request):
         user_id=user_id,
     )
 
+    if added is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pemberian_pakan?tertunda=1", status_code=303)
     if not added:
         logger.error(f"[USER {user_id}] Gagal tambah pakan")
     return RedirectResponse("/dashboard/pemberian_pakan", status_code=303)
 
 
 @router.post("/dashboard/pemberian_pakan/edit")
+@sekali
 async def pakan_edit(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -109,14 +124,12 @@ async def pakan_edit(request: Request):
     satuan = form.get("satuan")
     catatan = form.get("catatan")
 
-    # Ambil nama pakan dari stok
-    stok_list = await pakan_stok.get_all_pakan_stok(user_id=user_id)
-    stok_dict = {s["id"]: s["nama_pakan"] for s in stok_list}
-    jenis_pakan = stok_dict.get(pakan_stok_id, "Unknown")
-
+    jenis_pakan = await _nama_pakan(user_id, pakan_stok_id)
     jumlah_gram = jumlah * 1000 if satuan == "kg" else jumlah
 
-    updated = await pemberian_pakan.edit_pakan(
+    updated = await antrian_tulis.tulis(
+        pemberian_pakan.edit_pakan,
+        idem_key=await kunci_form(request),
         pakan_id=pakan_id,
         kolam_id=kolam_id,
         tanggal=tanggal,
@@ -126,6 +139,8 @@ async def pakan_edit(request: Request):
         user_id=user_id,
     )
 
+    if updated is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pemberian_pakan?tertunda=1", status_code=303)
     if updated:
         logger.info(
             f"[USER {user_id}] PemberianPakan {pakan_id} diedit: pakan='{jenis_pakan}', jumlah={jumlah_gram}g"
@@ -133,27 +148,11 @@ async def pakan_edit(request: Request):
     else:
         logger.error(f"[USER {user_id}] Gagal edit pakan {pakan_id}")
 
-    # Ambil ulang data setelah edit
-    kolam_list = await get_all_kolam(user_id=user_id)
-    pakan_list = await pemberian_pakan.get_all_pakan(user_id=user_id)
-    pakan_stok_list = await pakan_stok.get_all_pakan_stok(user_id=user_id)
-
-    kolam_dict = {k["id"]: k["nama_kolam"] for k in kolam_list}
-    for p in pakan_list:
-        p["kolam_nama"] = kolam_dict.get(p["kolam_id"], "Unknown")
-
-    return templates.TemplateResponse(
-        "dashboard/pemberian_pakan.html",
-        {
-            "request": request,
-            "kolam_list": kolam_list,
-            "pakan_list": pakan_list,
-            "pakan_stok_list": pakan_stok_list,
-        },
-    )
+    return RedirectResponse("/dashboard/pemberian_pakan", status_code=303)
 
 
 @router.post("/dashboard/pemberian_pakan/delete")
+@sekali
 async def pakan_delete(request: Request):
     user_id = request.cookies.get("user_id")
     if not user_id:
@@ -164,8 +163,15 @@ async def pakan_delete(request: Request):
     pakan_id = int(form.get("pakan_id"))
 
     # Panggil delete_pakan tanpa mengirimkan user_id lagi, karena sudah ada di cookies
-    success = await pemberian_pakan.delete_pakan(pakan_id, user_id)
+    success = await antrian_tulis.tulis(
+        pemberian_pakan.delete_pakan,
+        idem_key=await kunci_form(request),
+        pakan_id=pakan_id,
+        user_id=user_id,
+    )
 
+    if success is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pemberian_pakan?tertunda=1", status_code=303)
     if success:
         logger.info(f"[USER {user_id}] PemberianPakan {pakan_id} dihapus")
     else:
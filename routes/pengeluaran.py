@@ -6,19 +6,27 @@ from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib import antrian_tulis
+from lib.idem import sekali, kunci_form
 from services.pengeluaran import (
     get_all_pengeluaran,
     create_pengeluaran,
     update_pengeluaran,
     delete_pengeluaran,
 )
-from services.kolam import get_all_kolam
+from services.kolam import get_all_kolam, kolam_milik
 
 router = APIRouter()
 logger = logging.getLogger("router_pengeluaran")
 templates = Jinja2Templates(directory="templates")
 
 
+def _kembali(hasil) -> RedirectResponse:
+    if hasil is antrian_tulis.TERTUNDA:
+        return RedirectResponse("/dashboard/pengeluaran?tertunda=1", status_code=303)
+    return RedirectResponse("/dashboard/pengeluaran", status_code=303)
+
+
 # ============================================================
 # HALAMAN DAFTAR PENGELUARAN
 # ============================================================
@@ -31,13 +39,12 @@ async def pengeluaran_page(request: Request):
 
     user_id = int(user_id)
 
-    pengeluaran_list = [dict(p) for p in await get_all_pengeluaran(user_id)]
-    kolam_list = [dict(k) for k in await get_all_kolam(user_id)]
+    pengeluaran_list = await get_all_pengeluaran(user_id)
+    kolam_list = await get_all_kolam(user_id)
 
     kolam_map = {k["id"]: k["nama_kolam"] for k in kolam_list}
 
     for p in pengeluaran_list:
-        p["harga"] = float(p.get("harga", 0))
         p["jumlah"] = int(p.get("jumlah", 0))
         p["total"] = p["harga"] * p["jumlah"]
         p["nama_kolam"] = kolam_map.get(p.get("kolam_id"), "-")
@@ -65,6 +72,7 @@ async def pengeluaran_page(request: Request):
 # TAMBAH PENGELUARAN
 # ============================================================
 @router.post("/dashboard/pengeluaran")
+@sekali
 async def pengeluaran_submit(
     request: Request,
     nama: str = Form(...),
@@ -92,15 +100,15 @@ async def pengeluaran_submit(
         )
 
     # ================= VALIDASI: KOLAM MILIK USER =================
-    kolam_list = await get_all_kolam(user_id)
-    kolam_ids = {k["id"] for k in kolam_list}
-    if kolam_id not in kolam_ids:
+    if not await kolam_milik(user_id, kolam_id):
         logger.warning(f"[USER {user_id}] Kolam_id tidak valid saat submit pengeluaran")
         return RedirectResponse("/dashboard/pengeluaran", status_code=303)
 
     logger.info(f"[USER {user_id}] Tambah pengeluaran: {nama}, kolam_id={kolam_id}")
 
-    await create_pengeluaran(
+    hasil = await antrian_tulis.tulis(
+        create_pengeluaran,
+        idem_key=await kunci_form(request),
         user_id=user_id,
         nama_pengeluaran=nama,
         harga=harga,
@@ -110,13 +118,14 @@ async def pengeluaran_submit(
         kolam_id=kolam_id,
     )
 
-    return RedirectResponse("/dashboard/pengeluaran", status_code=303)
+    return _kembali(hasil)
 
 
 # ============================================================
 # EDIT PENGELUARAN
 # ============================================================
 @router.post("/dashboard/pengeluaran/edit")
+@sekali
 async def pengeluaran_edit(
     request: Request,
     pengeluaran_id: int = Form(...),
@@ -136,9 +145,7 @@ async def pengeluaran_edit(
 
     # ================= VALIDASI KOLAM (JIKA DIUBAH) =================
     if kolam_id:
-        kolam_list = await get_all_kolam(user_id)
-        kolam_ids = {k["id"] for k in kolam_list}
-        if kolam_id not in kolam_ids:
+        if not await kolam_milik(user_id, kolam_id):
             logger.warning(
                 f"[USER {user_id}] Kolam_id tidak valid saat edit pengeluaran"
             )
@@ -150,7 +157,9 @@ async def pengeluaran_edit(
         f"[USER {user_id}] Edit pengeluaran_id={pengeluaran_id}, kolam_id={kolam_id}"
     )
 
-    await update_pengeluaran(
+    hasil = await antrian_tulis.tulis(
+        update_pengeluaran,
+        idem_key=await kunci_form(request),
         pengeluaran_id=pengeluaran_id,
         user_id=user_id,
         nama_pengeluaran=nama,
@@ -161,13 +170,14 @@ async def pengeluaran_edit(
         kolam_id=kolam_id,
     )
 
-    return RedirectResponse("/dashboard/pengeluaran", status_code=303)
+    return _kembali(hasil)
 
 
 # ============================================================
 # HAPUS PENGELUARAN
 # ============================================================
 @router.post("/dashboard/pengeluaran/delete")
+@sekali
 async def pengeluaran_delete(
     request: Request,
     pengeluaran_id: int = Form(...),
@@ -181,9 +191,11 @@ async def pengeluaran_delete(
 
     logger.info(f"[USER {user_id}] Hapus pengeluaran_id={pengeluaran_id}")
 
-    await delete_pengeluaran(
+    hasil = await antrian_tulis.tulis(
+        delete_pengeluaran,
+        idem_key=await kunci_form(request),
         pengeluaran_id=pengeluaran_id,
         user_id=user_id,
     )
 
-    return RedirectResponse("/dashboard/pengeluaran", status_code=303)
+    return _kembali(hasil)
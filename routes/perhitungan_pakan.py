@@ -5,10 +5,10 @@ import logging
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from datetime import date
+from lib.tanggal import request_today
 
 from services import perhitungan_pakan
-from services.perhitungan_pakan import get_persen_pakan
+from services.ransum import ransum_kolam
 
 router = APIRouter()
 logger = logging.getLogger("router_perhitungan_pakan")
@@ -37,24 +37,24 @@ async def perhitungan_pakan_page(request: Request):
     total_berat_bibit = 0
 
     hasil_perhitungan = []
-
-    for kolam in kolam_list:
+    today_date = request_today(request)
+    today = today_date.isoformat()
+
+    # ============================================================
+    # HITUNG KEBUTUHAN PAKAN HARIAN (SEMUA KOLAM SEKALIGUS)
+    # Rumus: Biomassa estimasi (kg) × Persentase Pakan Harian
+    # Biomassa = ekor hidup × berat rata-rata dari tabel pertumbuhan
+    # ============================================================
+    for kolam in ransum_kolam(kolam_list, today_date):
         kolam_id = kolam["id"]
         nama_kolam = kolam["nama_kolam"]
         jumlah_ikan = kolam["jumlah_ikan_hidup"]
-        total_berat = kolam["total_berat_kg"]  # kg
-        ukuran_bibit = kolam.get("ukuran_bibit", "7-9 cm")
+        total_berat = kolam["biomassa_kg"]  # kg, estimasi hari ini
         stok_pakan = kolam.get("stok_pakan", 0)
+        persen_pakan_harian = kolam["persen_pakan_harian"]
 
-        # ambil persen pakan harian sesuai ukuran bibit
-        persen_pakan_harian = get_persen_pakan(ukuran_bibit)
-
-        # ============================================================
-        # HITUNG KEBUTUHAN PAKAN HARIAN
-        # Rumus: Biomassa (kg) × Persentase Pakan Harian
-        # ============================================================
-        kebutuhan_harian_kg = total_berat * (persen_pakan_harian / 100)
-        kebutuhan_harian_gram = kebutuhan_harian_kg * 1000
+        kebutuhan_harian_gram = kolam["kebutuhan_pakan_gram"]
+        kebutuhan_harian_kg = kebutuhan_harian_gram / 1000
 
         sisa_stok = stok_pakan - kebutuhan_harian_gram
         if sisa_stok < 0:
@@ -67,10 +67,10 @@ async def perhitungan_pakan_page(request: Request):
             await perhitungan_pakan.create_pemberian_pakan(
                 user_id=user_id,
                 kolam_id=kolam_id,
-                tanggal=date.today(),
+                tanggal=today,
                 jenis_pakan="pakan standar",
                 jumlah_gram=kebutuhan_harian_gram,
-                catatan=f"Auto generate perhitungan {date.today()}",
+                catatan=f"Auto generate perhitungan {today}",
             )
             await perhitungan_pakan.update_pakan_stok(
                 user_id=user_id,
@@ -86,6 +86,9 @@ async def perhitungan_pakan_page(request: Request):
                 "nama_kolam": nama_kolam,
                 "jumlah_ikan": jumlah_ikan,
                 "total_berat": total_berat,
+                "ukuran_bibit": kolam.get("ukuran_bibit"),
+                "umur_hari": kolam["umur_hari"],
+                "berat_kini_gram": kolam["berat_kini_gram"],
                 "persen_pakan_harian": persen_pakan_harian,
                 "kebutuhan_harian_kg": kebutuhan_harian_kg,
                 "kebutuhan_harian_gram": kebutuhan_harian_gram,
@@ -96,7 +99,7 @@ async def perhitungan_pakan_page(request: Request):
         # total global
         total_kebutuhan_gram += kebutuhan_harian_gram
         total_ikan += jumlah_ikan
-        total_stok_pakan += stok_pakan
+        total_stok_pakan = stok_pakan  # stok user, sama untuk semua kolam
         total_berat_bibit += total_berat
 
     return templates.TemplateResponse(
@@ -3,18 +3,71 @@
 
 import logging
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
+from lib.money import fmt
+from lib.tanggal import request_today
+from lib.timing import stage, format_timings
+from services.prediksi import get_prediksi, TARGET_BERAT_GRAM
+from services.simulasi import get_simulasi_laba
+
 router = APIRouter()
 logger = logging.getLogger("router_prediksi")
 templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/dashboard/prediksi", response_class=HTMLResponse)
-async def prediksi_page(request: Request):
-    logger.info("Render halaman prediksi tanpa ambil data")
+async def prediksi_page(request: Request, skenario: int = 2000):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses prediksi ditolak: user belum login")
+        return RedirectResponse(url="/login", status_code=303)
+    user_id = int(user_id)
+
+    today = request_today(request)
+    timings = {}
+    with stage("prediksi", timings):
+        prediksi = await get_prediksi(user_id, today)
+    with stage("simulasi", timings):
+        simulasi = await get_simulasi_laba(user_id, skenario, today)
+    logger.info(f"Prediksi user {user_id}: {format_timings(timings)}")
+
+    prediksi_list = sorted(prediksi.values(), key=lambda p: p["tanggal_panen"])
+    rows = [
+        {
+            **p,
+            "jumlah_tebar_fmt": fmt(p["jumlah_tebar"]),
+            "ekor_hidup_fmt": fmt(p["ekor_hidup"]),
+            "ekor_panen_fmt": fmt(p["ekor_panen"]),
+            "harga_per_kg_fmt": fmt(p["harga_per_kg"]),
+            "estimasi_pendapatan_fmt": fmt(p["estimasi_pendapatan"]),
+        }
+        for p in prediksi_list
+    ]
+
+    simulasi_rows = [
+        {
+            **s,
+            "biaya_terpakai_fmt": fmt(s["biaya_terpakai"]),
+            "p10_fmt": fmt(s["p10"]),
+            "p50_fmt": fmt(s["p50"]),
+            "p90_fmt": fmt(s["p90"]),
+        }
+        for s in (simulasi[p["kolam_id"]] for p in prediksi_list if p["kolam_id"] in simulasi)
+    ]
+
     return templates.TemplateResponse(
         "dashboard/prediksi.html",
-        {"request": request},
+        {
+            "request": request,
+            "prediksi_list": rows,
+            "target_gram": int(TARGET_BERAT_GRAM),
+            "total_biomassa_panen": round(
+                sum(p["biomassa_panen_kg"] for p in prediksi_list), 1
+            ),
+            "total_pendapatan": fmt(sum(p["estimasi_pendapatan"] for p in prediksi_list)),
+            "simulasi_list": simulasi_rows,
+            "jumlah_skenario": simulasi_rows[0]["jumlah_skenario"] if simulasi_rows else 0,
+        },
     )
@@ -0,0 +1,46 @@
+# routes/sinkron.py
+# API delta-sync JSON untuk aplikasi lapangan / offline.
+# GET /api/sinkron?cursor=...  -> perubahan sejak cursor, gzip kalau klien mendukung
+
+import gzip
+import json
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
+
+from services.sinkron import SINKRON_LIMIT, get_perubahan
+
+router = APIRouter()
+logger = logging.getLogger("router_sinkron")
+
+# Body lebih kecil dari ini tidak sepadan dikompres
+GZIP_MIN = 512
+
+
+@router.get("/api/sinkron")
+async def sinkron_api(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    try:
+        limit = int(request.query_params.get("limit") or SINKRON_LIMIT)
+    except ValueError:
+        limit = SINKRON_LIMIT
+    limit = max(1, min(limit, SINKRON_LIMIT))
+
+    data = await get_perubahan(user_id, request.query_params.get("cursor"), limit)
+    if data is None:
+        # Cursor klien tetap berlaku, cukup diulang
+        return JSONResponse({"detail": "Sinkron gagal, coba lagi"}, status_code=503)
+
+    body = json.dumps(
+        data, separators=(",", ":"), ensure_ascii=False, default=str
+    ).encode("utf-8")
+    headers = {"Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(body, media_type="application/json", headers=headers)
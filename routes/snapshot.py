@@ -0,0 +1,62 @@
+# routes/snapshot.py
+# Daftar & unduh partisi snapshot Parquet milik user (dibuat job snapshot harian)
+
+import os
+import re
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, JSONResponse
+
+from services.snapshot import SKEMA, BULAN_KOSONG, baca_manifest, partisi_path
+
+router = APIRouter()
+logger = logging.getLogger("router_snapshot")
+
+_POLA_BULAN = re.compile(r"\d{4}-\d{2}")
+
+
+@router.get("/api/snapshot")
+async def snapshot_list(request: Request):
+    """Partisi yang tersedia per tabel: bulan, jumlah row, waktu tulis, URL unduh"""
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    manifest = baca_manifest(user_id)
+    data = {
+        table: [
+            {
+                "bulan": bulan,
+                "row": info["row"],
+                "ditulis_pada": info["ditulis_pada"],
+                "url": f"/api/snapshot/{table}/{bulan}.parquet",
+            }
+            for bulan, info in sorted(manifest.get(table, {}).items())
+        ]
+        for table in SKEMA
+    }
+    return JSONResponse(data)
+
+
+@router.get("/api/snapshot/{table}/{bulan}.parquet")
+async def snapshot_unduh(request: Request, table: str, bulan: str):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    # Validasi ketat: nilai ini dipakai menyusun path file
+    if table not in SKEMA or not (_POLA_BULAN.fullmatch(bulan) or bulan == BULAN_KOSONG):
+        return JSONResponse({"detail": "Partisi tidak dikenal"}, status_code=404)
+
+    path = partisi_path(table, user_id, bulan)
+    if not os.path.exists(path):
+        return JSONResponse({"detail": "Snapshot belum tersedia"}, status_code=404)
+
+    logger.info(f"[USER {user_id}] Unduh snapshot {table} {bulan}")
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"{table}_{bulan}.parquet",
+    )
@@ -0,0 +1,52 @@
+# routes/statistik.py
+# Endpoint JSON metrik performa kolam (FCR, survival, biaya/kg, biomassa)
+
+import asyncio
+import logging
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from lib import antrian, antrian_tulis
+from lib.jadwal import baca_state
+from services.kolam import get_all_kolam
+from services.statistik import get_stat_kolam
+
+router = APIRouter()
+logger = logging.getLogger("router_statistik")
+
+
+@router.get("/api/statistik/kolam")
+async def statistik_kolam_json(request: Request):
+    user_id = request.cookies.get("user_id")
+    if not user_id:
+        logger.warning("Akses statistik ditolak: user belum login")
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    user_id = int(user_id)
+
+    kolam_list = await get_all_kolam(user_id)
+    stat = await get_stat_kolam(user_id)
+
+    data = [
+        {"nama_kolam": k.get("nama_kolam", "-"), **stat[k["id"]]}
+        for k in kolam_list
+        if k["id"] in stat
+    ]
+    return JSONResponse({"kolam": data})
+
+
+@router.get("/api/jadwal")
+async def jadwal_json(request: Request):
+    """
+    Metrik job terjadwal (jalan terakhir, durasi, gagal) dari state penjadwal,
+    plus jumlah tugas antrian yang menunggu di worker ini dan isi antrian tulis
+    tertunda (bersama semua worker) per status.
+    """
+    if not request.cookies.get("user_id"):
+        return JSONResponse({"detail": "Belum login"}, status_code=401)
+    return JSONResponse(
+        {
+            "job": baca_state(),
+            "antrian": antrian.kedalaman(),
+            "antrian_tulis": await asyncio.to_thread(antrian_tulis.kedalaman),
+        }
+    )
@@ -1,10 +1,13 @@
 # services/ai/ringkasan_ai.py
 import json
+import hashlib
 import logging
 import asyncio
+from datetime import datetime, timezone
 from typing import Dict, Any
 
 from google.genai import types
+from lib.supabase_client import get_db
 from services.ai.client import get_gemini_client
 from services.ai.prompt import SYSTEM_PROMPT, ringkasan_prompt
 from services.ai.schema import RingkasanAIResult
@@ -99,6 +102,7 @@ async def generate_ringkasan_ai(raw_data: Dict[str, Any]) -> RingkasanAIResult:
         logger.error(f"AI ringkasan gagal: {e}")
 
         return {
+            "gagal": True,
             "status": "Tidak Diketahui",
             "summary": "Analisis gagal dibuat karena kendala pemrosesan data atau respon AI.",
             "warnings": ["Respon AI tidak valid atau tidak dapat diproses."],
@@ -106,3 +110,59 @@ async def generate_ringkasan_ai(raw_data: Dict[str, Any]) -> RingkasanAIResult:
                 "Coba ulangi proses analisis atau periksa kelengkapan data input."
             ],
         }
+
+
+# ============================================================
+# HASIL TERSIMPAN (DIPAKAI ULANG SELAMA DATA TIDAK BERUBAH)
+# ============================================================
+def sidik_data(raw_data: Dict[str, Any]) -> str:
+    """Hash data yang dikirim ke AI; berubah hanya jika input AI berubah"""
+    data = json.dumps(_sanitize_ai_data(raw_data), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+async def get_ringkasan_ai_tersimpan(user_id: int) -> Dict[str, Any] | None:
+    db = get_db()
+    try:
+        result = await asyncio.to_thread(
+            lambda: db.table("RingkasanAI")
+            .select("sidik, hasil")
+            .eq("user_id", user_id)
+            .execute()
+        )
+    except Exception as e:
+        logger.error(f"Gagal ambil ringkasan AI tersimpan user_id={user_id}: {e}")
+        return None
+
+    rows = getattr(result, "data", None) or []
+    return rows[0] if rows else None
+
+
+async def get_ringkasan_ai(user_id: int, raw_data: Dict[str, Any]) -> RingkasanAIResult:
+    """
+    Ringkasan AI untuk agregat user: pakai hasil tersimpan jika sidik datanya
+    sama, kalau tidak panggil AI lalu simpan (hanya hasil yang berhasil).
+    """
+    sidik = sidik_data(raw_data)
+    tersimpan = await get_ringkasan_ai_tersimpan(user_id)
+    if tersimpan and tersimpan.get("sidik") == sidik:
+        return tersimpan["hasil"]
+
+    hasil = await generate_ringkasan_ai(raw_data)
+    if hasil.get("gagal"):
+        return hasil
+
+    db = get_db()
+    payload = {
+        "user_id": user_id,
+        "sidik": sidik,
+        "hasil": hasil,
+        "dibuat_pada": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        await asyncio.to_thread(
+            lambda: db.table("RingkasanAI").upsert(payload, on_conflict="user_id").execute()
+        )
+    except Exception as e:
+        logger.error(f"Gagal simpan ringkasan AI user_id={user_id}: {e}")
+    return hasil
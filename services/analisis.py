@@ -0,0 +1,224 @@
+# services/analisis.py
+# Laporan analisis lintas siklus & lintas kolam dengan DuckDB (embedded) di atas
+# snapshot Parquet (services.snapshot).
+#
+# Tiap permintaan membuka koneksi DuckDB in-memory, mendaftarkan file partisi
+# milik user sebagai view per tabel, lalu menjalankan SQL agregat langsung di
+# file kolumnar. Tidak ada round trip PostgREST, jadi data bertahun-tahun tetap
+# selesai dalam hitungan milidetik. Data setara snapshot terakhir (job malam
+# atau "perbarui" manual).
+
+import os
+import glob
+import time
+import asyncio
+import logging
+
+from lib.cache import TTLCache
+from services.snapshot import SNAPSHOT_DIR, SKEMA, baca_manifest
+
+logger = logging.getLogger("service_analisis")
+
+_TIPE_SQL = {
+    "int": "BIGINT",
+    "float": "DOUBLE",
+    "rupiah": "BIGINT",
+    "str": "VARCHAR",
+    "date": "DATE",
+    "ts": "TIMESTAMPTZ",
+    "json": "VARCHAR",
+}
+
+# Hasil hanya berubah kalau snapshot diperbarui (waktu snapshot ikut jadi key)
+_analisis_cache = TTLCache("analisis", ttl=6 * 3600, maxsize=256)
+
+# ============================================================
+# QUERY
+# ============================================================
+# Satu row per siklus yang sudah panen, dihitung sekali per koneksi lalu dipakai
+# query per_siklus & per_kolam. Biaya = bibit + stok pakan + operasional
+# (rumus sama dengan ringkasan beku di services.siklus).
+_PER_SIKLUS = """
+CREATE TEMP TABLE per_siklus AS
+WITH
+panen AS (
+    SELECT siklus_id,
+           SUM(total_berat) AS berat_panen,
+           SUM(total_jual) AS total_jual,
+           MAX(tanggal_panen) AS tanggal_panen
+    FROM "Panen" WHERE siklus_id IS NOT NULL GROUP BY siklus_id
+),
+bibit AS (
+    SELECT siklus_id, SUM(jumlah) AS ekor, SUM(total_harga) AS biaya
+    FROM "Bibit" GROUP BY siklus_id
+),
+mati AS (SELECT siklus_id, SUM(jumlah) AS mati FROM "Kematian" GROUP BY siklus_id),
+pakan AS (
+    SELECT siklus_id, SUM(jumlah_gram) / 1000.0 AS pakan_kg
+    FROM "PemberianPakan" GROUP BY siklus_id
+),
+stok AS (SELECT siklus_id, SUM(harga) AS biaya FROM "PakanStok" GROUP BY siklus_id),
+ops AS (
+    SELECT siklus_id, SUM(harga * COALESCE(jumlah, 1)) AS biaya
+    FROM "Pengeluaran" GROUP BY siklus_id
+),
+hasil AS (
+    SELECT s.id AS siklus_id,
+           s.kolam_id,
+           COALESCE(k.nama_kolam, '-') AS nama_kolam,
+           s.tanggal_mulai,
+           p.tanggal_panen,
+           date_diff('day', s.tanggal_mulai, p.tanggal_panen) AS hari,
+           COALESCE(b.ekor, 0) AS ekor,
+           COALESCE(m.mati, 0) AS mati,
+           COALESCE(pk.pakan_kg, 0) AS pakan_kg,
+           p.berat_panen,
+           p.total_jual,
+           COALESCE(b.biaya, 0) + COALESCE(st.biaya, 0) + COALESCE(o.biaya, 0)
+               AS total_biaya
+    FROM "Siklus" s
+    JOIN panen p ON p.siklus_id = s.id
+    LEFT JOIN "Kolam" k ON k.id = s.kolam_id
+    LEFT JOIN bibit b ON b.siklus_id = s.id
+    LEFT JOIN mati m ON m.siklus_id = s.id
+    LEFT JOIN pakan pk ON pk.siklus_id = s.id
+    LEFT JOIN stok st ON st.siklus_id = s.id
+    LEFT JOIN ops o ON o.siklus_id = s.id
+)
+SELECT * FROM hasil
+"""
+
+QUERY = {
+    "per_siklus": """
+SELECT *,
+       total_biaya / NULLIF(berat_panen, 0) AS biaya_per_kg,
+       pakan_kg / NULLIF(berat_panen, 0) AS fcr,
+       100.0 * mati / NULLIF(ekor, 0) AS persen_mati,
+       total_jual - total_biaya AS laba
+FROM per_siklus
+ORDER BY tanggal_panen DESC, siklus_id DESC
+""",
+    "per_kolam": """
+SELECT kolam_id,
+       ANY_VALUE(nama_kolam) AS nama_kolam,
+       COUNT(*) AS siklus,
+       SUM(berat_panen) AS berat_panen,
+       SUM(total_biaya) / NULLIF(SUM(berat_panen), 0) AS biaya_per_kg,
+       SUM(pakan_kg) / NULLIF(SUM(berat_panen), 0) AS fcr,
+       100.0 * SUM(mati) / NULLIF(SUM(ekor), 0) AS persen_mati,
+       SUM(total_jual) - SUM(total_biaya) AS laba
+FROM per_siklus
+GROUP BY kolam_id
+ORDER BY biaya_per_kg NULLS LAST
+""",
+    # Kematian satu siklus dibagi proporsional ke ukuran bibit yang ditebar di
+    # siklus itu (satu siklus bisa tebar beberapa ukuran)
+    "per_ukuran_bibit": """
+WITH
+tebar AS (
+    SELECT siklus_id,
+           COALESCE(NULLIF(TRIM(ukuran_bibit), ''), '-') AS ukuran_bibit,
+           SUM(jumlah) AS ekor
+    FROM "Bibit" WHERE siklus_id IS NOT NULL GROUP BY 1, 2
+),
+total AS (SELECT siklus_id, SUM(ekor) AS ekor FROM tebar GROUP BY siklus_id),
+mati AS (SELECT siklus_id, SUM(jumlah) AS mati FROM "Kematian" GROUP BY siklus_id),
+alokasi AS (
+    SELECT t.ukuran_bibit,
+           t.siklus_id,
+           t.ekor,
+           COALESCE(m.mati, 0) * t.ekor / NULLIF(tt.ekor, 0) AS mati
+    FROM tebar t
+    JOIN total tt ON tt.siklus_id = t.siklus_id
+    LEFT JOIN mati m ON m.siklus_id = t.siklus_id
+)
+SELECT ukuran_bibit,
+       COUNT(DISTINCT siklus_id) AS siklus,
+       SUM(ekor) AS ekor,
+       SUM(mati) AS mati,
+       100.0 * SUM(mati) / NULLIF(SUM(ekor), 0) AS persen_mati
+FROM alokasi
+GROUP BY ukuran_bibit
+ORDER BY persen_mati NULLS LAST
+""",
+}
+
+
+# ============================================================
+# KONEKSI
+# ============================================================
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError("Analisis butuh paket duckdb (pip install duckdb)") from e
+    return duckdb
+
+
+def _literal(teks: str) -> str:
+    return "'" + teks.replace("'", "''") + "'"
+
+
+def _koneksi(user_id: int):
+    """
+    Koneksi DuckDB in-memory dengan satu view per tabel SKEMA yang membaca
+    partisi Parquet milik user (hanya kolom yang dipakai query yang dibaca).
+    Tabel tanpa snapshot jadi tabel kosong berskema sama, supaya query tetap jalan.
+    """
+    con = _duckdb().connect(":memory:")
+    for table, (_, kolom) in SKEMA.items():
+        files = sorted(
+            glob.glob(
+                os.path.join(
+                    SNAPSHOT_DIR, table, f"user_id={user_id}", "bulan=*", "data.parquet"
+                )
+            )
+        )
+        if files:
+            daftar = ", ".join(_literal(f) for f in files)
+            con.execute(
+                f'CREATE VIEW "{table}" AS SELECT * FROM read_parquet([{daftar}], '
+                "hive_partitioning = false)"
+            )
+        else:
+            kolom_sql = ", ".join(f"{k} {_TIPE_SQL[t]}" for k, t in kolom)
+            con.execute(f'CREATE TABLE "{table}" ({kolom_sql})')
+    return con
+
+
+def _jalankan(user_id: int) -> dict:
+    mulai = time.perf_counter()
+    con = _koneksi(user_id)
+    hasil = {}
+    try:
+        con.execute(_PER_SIKLUS)
+        for nama, sql in QUERY.items():
+            cur = con.execute(sql)
+            kolom = [d[0] for d in cur.description]
+            hasil[nama] = [dict(zip(kolom, row)) for row in cur.fetchall()]
+    finally:
+        con.close()
+    hasil["durasi_ms"] = round((time.perf_counter() - mulai) * 1000, 1)
+    return hasil
+
+
+async def get_analisis(user_id: int) -> dict:
+    """
+    Hasil semua QUERY untuk user + info snapshot:
+    {"per_siklus": [...], "per_kolam": [...], "per_ukuran_bibit": [...],
+     "durasi_ms": float, "snapshot_pada": str | None}
+    """
+    snapshot_pada = baca_manifest(user_id).get("_diperbarui_pada")
+    key = (user_id, snapshot_pada)
+    cached = _analisis_cache.get(key)
+    if cached is not None:
+        return cached
+
+    hasil = await asyncio.to_thread(_jalankan, user_id)
+    hasil["snapshot_pada"] = snapshot_pada
+    logger.info(
+        f"[ANALISIS] user_id={user_id}: {len(hasil['per_siklus'])} siklus panen "
+        f"({hasil['durasi_ms']} ms)"
+    )
+    _analisis_cache.set(key, hasil)
+    return hasil
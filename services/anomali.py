@@ -0,0 +1,122 @@
+# services/anomali.py
+# Deteksi lonjakan kematian secara streaming (dipanggil saat Kematian ditulis).
+#
+# Per kolam disimpan satu row state (tabel StatKematian): EWMA mean & varians
+# laju kematian harian (ekor mati / ekor hidup) dan jumlah ekor tebar siklus
+# (diikuti trigger di Bibit). Setiap tulis hanya memperbarui row itu (O(1)),
+# atomik di DB lewat RPC catat_stat_kematian (migrations/013), tanpa scan
+# riwayat. Hari yang lebih tinggi dari ambang (skor z) dicatat di
+# AnomaliKematian dan ditampilkan di dashboard.
+
+import os
+import asyncio
+import logging
+from datetime import timedelta
+
+from lib.supabase_client import get_db
+from lib.cache import TTLCache
+from lib.tanggal import to_date, today_wib
+
+logger = logging.getLogger("service_anomali")
+
+# Bobot EWMA per hari (0.2 ~ memori efektif 5-10 hari)
+ALPHA = float(os.getenv("ANOMALI_ALPHA", "0.2"))
+# Skor z minimum untuk dianggap anomali
+BATAS_Z = float(os.getenv("ANOMALI_BATAS_Z", "3"))
+# Minimal ekor mati dalam sehari supaya kolam kecil tidak jadi false alarm
+MIN_EKOR = int(os.getenv("ANOMALI_MIN_EKOR", "10"))
+# Hari pemanasan sebelum statistik dianggap stabil
+HARI_PEMANASAN = 5
+# Hari kosong di antara dua catatan dianggap 0 kematian (dibatasi supaya tetap O(1))
+MAKS_HARI_KOSONG = 60
+# Batas bawah varians: hindari skor z tak hingga saat riwayat masih datar
+VAR_MIN = 1e-6
+
+# Flag terbaru per user untuk dashboard
+_anomali_cache = TTLCache("anomali_kematian", ttl=300, maxsize=1024)
+
+
+# ============================================================
+# HOOK DARI SERVICES KEMATIAN
+# ============================================================
+async def catat_kematian(
+    user_id: int, kolam_id: int, siklus_id: int | None, tanggal, delta: int
+):
+    """
+    Perbarui statistik kolam untuk satu perubahan kematian dan catat anomali.
+    Dijalankan lewat lib.antrian setelah insert/update/delete Kematian berhasil;
+    error dilempar supaya antrian mencoba ulang (input tetap tidak gagal).
+    """
+    tanggal = to_date(tanggal)
+    if not kolam_id or tanggal is None or not delta:
+        return None
+
+    db = get_db()
+    params = {
+        "p_user_id": user_id,
+        "p_kolam_id": kolam_id,
+        "p_siklus_id": siklus_id,
+        "p_tanggal": tanggal.isoformat(),
+        "p_delta": delta,
+        "p_alpha": ALPHA,
+        "p_batas_z": BATAS_Z,
+        "p_min_ekor": MIN_EKOR,
+        "p_hari_pemanasan": HARI_PEMANASAN,
+        "p_maks_hari_kosong": MAKS_HARI_KOSONG,
+        "p_var_min": VAR_MIN,
+    }
+    result = await asyncio.to_thread(
+        lambda: db.rpc("catat_stat_kematian", params).execute()
+    )
+    anomali = getattr(result, "data", None)
+
+    if anomali:
+        _anomali_cache.invalidate((user_id,))
+        logger.warning(
+            f"[ANOMALI] Lonjakan kematian kolam_id={kolam_id} tanggal={anomali['tanggal']} "
+            f"mati={anomali['jumlah']} laju={anomali['laju']:.4f} z={anomali['skor_z']}"
+        )
+    return anomali
+
+
+# ============================================================
+# AMBIL FLAG UNTUK DASHBOARD
+# ============================================================
+async def get_anomali_terbaru(user_id: int, hari: int = 7) -> list[dict]:
+    """
+    Flag anomali kematian beberapa hari terakhir (langsung dari tabel flag,
+    tanpa menghitung ulang riwayat).
+    """
+    cached = _anomali_cache.get((user_id,))
+    if cached is not None:
+        return cached
+
+    db = get_db()
+    sejak = (today_wib() - timedelta(days=hari)).isoformat()
+
+    def db_call():
+        return (
+            db.table("AnomaliKematian")
+            .select("*, Kolam(nama_kolam)")
+            .eq("user_id", user_id)
+            .gte("tanggal", sejak)
+            .order("tanggal", desc=True)
+            .limit(20)
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(db_call)
+    except Exception as e:
+        logger.error(f"[ANOMALI] Gagal ambil anomali user_id={user_id}: {e}")
+        return []
+
+    anomali = []
+    for a in getattr(result, "data", None) or []:
+        kolam = a.pop("Kolam", None) or {}
+        a["nama_kolam"] = kolam.get("nama_kolam", "-")
+        a["persen"] = round(a.get("laju", 0) * 100, 2)
+        anomali.append(a)
+
+    _anomali_cache.set((user_id,), anomali)
+    return anomali
@@ -0,0 +1,265 @@
+# services/arsip.py
+# Arsip (cold store) untuk siklus yang sudah selesai.
+# Row detail siklus lama dipindah dari tabel live ke file JSONL.gz per siklus:
+#   {ARSIP_DIR}/{user_id}/{siklus_id}/{Tabel}.jsonl.gz
+# Ringkasan beku tetap di Siklus.ringkasan, jadi tabel live hanya berisi
+# siklus berjalan dan query halaman aktif tidak membesar seiring waktu.
+#
+# Jalankan berkala (cron):  python -m services.arsip
+
+import os
+import gzip
+import json
+import logging
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib.tanggal import today_wib
+from services.models import Siklus
+from services.siklus import (
+    KOLOM_RINGKASAN,
+    get_all_siklus,
+    get_riwayat_siklus,
+    ringkas_siklus,
+    bekukan_ulang,
+)
+
+logger = logging.getLogger("service_arsip")
+
+ARSIP_DIR = os.getenv("ARSIP_DIR", "data/arsip")
+# Siklus baru diarsipkan setelah selesai sekian hari (masih bisa dikoreksi dulu)
+ARSIP_MIN_HARI = int(os.getenv("ARSIP_MIN_HARI", "7"))
+
+# Tabel transaksi yang diarsipkan. Panen tetap live: hanya ~1 row per siklus
+# dan dipakai halaman riwayat panen. PakanStok juga tetap live: itu inventaris
+# yang masih dipakai siklus berikutnya, bukan riwayat siklus (hanya dibaca untuk
+# ringkasan).
+TABEL_ARSIP = ("Bibit", "Kematian", "PemberianPakan", "Pengeluaran")
+TABEL_RINGKASAN_LIVE = ("PakanStok", "Panen")
+# Jumlah id per DELETE ... WHERE id IN (...) (batas panjang URL PostgREST)
+HAPUS_PER_BATCH = 200
+
+
+def _siklus_dir(user_id: int, siklus_id: int) -> str:
+    return os.path.join(ARSIP_DIR, str(user_id), str(siklus_id))
+
+
+def _arsip_path(user_id: int, siklus_id: int, table: str) -> str:
+    return os.path.join(_siklus_dir(user_id, siklus_id), f"{table}.jsonl.gz")
+
+
+# ============================================================
+# TULIS ARSIP
+# ============================================================
+def _tulis_jsonl(path: str, rows: list[dict]):
+    """
+    Tulis ke file sementara, fsync, lalu rename, supaya arsip tidak pernah
+    setengah jadi dan sudah pasti di disk sebelum row live dihapus.
+    """
+    direktori = os.path.dirname(path)
+    os.makedirs(direktori, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str, ensure_ascii=False).encode("utf-8"))
+                f.write(b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    # Rename juga harus sampai di disk
+    fd = os.open(direktori, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def arsipkan_siklus(user_id: int, siklus: Siklus) -> bool:
+    """
+    Pindahkan row detail satu siklus selesai ke arsip:
+    ambil row -> bekukan ulang ringkasan dari row itu -> tulis file (fsync)
+    -> hapus row live per id yang diarsipkan -> tandai siklus.
+    Ringkasan dihitung ulang karena koreksi di masa tunggu arsip tidak
+    memperbarui ringkasan beku saat panen. File ditulis dulu sebelum hapus, dan
+    yang dihapus hanya id yang ada di file, jadi kalau gagal di tengah (atau ada
+    row baru masuk setelah diambil) tidak ada data hilang. Menjalankan ulang aman.
+    """
+    if siklus.status != "selesai" or siklus.diarsipkan_pada:
+        return False
+
+    db = get_db()
+
+    def fetch(table: str, columns: str = "*"):
+        return lambda: (
+            db.table(table)
+            .select(columns)
+            .eq("siklus_id", siklus.id)
+            .eq("user_id", user_id)
+            .execute()
+            .data
+            or []
+        )
+
+    try:
+        hasil = await asyncio.gather(
+            *(asyncio.to_thread(fetch(table)) for table in TABEL_ARSIP),
+            *(
+                asyncio.to_thread(fetch(table, KOLOM_RINGKASAN[table]))
+                for table in TABEL_RINGKASAN_LIVE
+            ),
+        )
+    except Exception as e:
+        logger.error(f"[ARSIP] Gagal ambil row siklus {siklus.id}: {e}")
+        return False
+
+    rows_per_tabel = dict(zip(TABEL_ARSIP, hasil))
+    rows_live = dict(zip(TABEL_RINGKASAN_LIVE, hasil[len(TABEL_ARSIP) :]))
+    ringkasan = ringkas_siklus(siklus, {**rows_per_tabel, **rows_live})
+    if await bekukan_ulang(user_id, siklus, ringkasan) is None:
+        logger.error(f"[ARSIP] Gagal bekukan ulang siklus {siklus.id}, skip arsip")
+        return False
+
+    try:
+        for table, rows in rows_per_tabel.items():
+            await asyncio.to_thread(
+                _tulis_jsonl, _arsip_path(user_id, siklus.id, table), rows
+            )
+    except Exception as e:
+        logger.error(f"[ARSIP] Gagal tulis arsip siklus {siklus.id}: {e}")
+        return False
+
+    def hapus_live():
+        for table, rows in rows_per_tabel.items():
+            ids = [r["id"] for r in rows]
+            for i in range(0, len(ids), HAPUS_PER_BATCH):
+                db.table(table).delete().in_("id", ids[i : i + HAPUS_PER_BATCH]).eq(
+                    "user_id", user_id
+                ).execute()
+        return (
+            db.table("Siklus")
+            .update({"diarsipkan_pada": datetime.now(timezone.utc).isoformat()})
+            .eq("id", siklus.id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(hapus_live)
+    except Exception as e:
+        logger.error(f"[ARSIP] Gagal hapus row live siklus {siklus.id}: {e}")
+        return False
+
+    if not getattr(result, "data", None):
+        logger.error(f"[ARSIP] Gagal tandai siklus {siklus.id} terarsip: {result}")
+        return False
+
+    invalidate_user(user_id)
+    jumlah = sum(len(rows) for rows in hasil)
+    logger.info(
+        f"[ARSIP] Siklus {siklus.id} diarsipkan ({jumlah} row) user_id={user_id}"
+    )
+    return True
+
+
+async def arsipkan_user(user_id: int, min_hari: int = ARSIP_MIN_HARI) -> int:
+    """
+    Arsipkan semua siklus selesai milik user yang sudah lewat masa tunggu.
+    Siklus selesai terbaru tiap kolam yang belum ditebar ulang juga ikut:
+    halaman aktif membacanya dari ringkasan beku.
+    """
+    batas = today_wib() - timedelta(days=min_hari)
+    kandidat = [
+        s
+        for s in await get_riwayat_siklus(user_id)
+        if not s.diarsipkan_pada and s.tanggal_selesai and s.tanggal_selesai <= batas
+    ]
+
+    jumlah = 0
+    for s in kandidat:
+        if await arsipkan_siklus(user_id, s):
+            jumlah += 1
+    return jumlah
+
+
+async def jalankan_arsip(min_hari: int = ARSIP_MIN_HARI) -> int:
+    """Arsipkan siklus lama untuk semua user (dipanggil dari CLI / cron)"""
+    db = get_db()
+
+    def db_call():
+        return (
+            db.table("Siklus")
+            .select("user_id")
+            .eq("status", "selesai")
+            .is_("diarsipkan_pada", "null")
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(db_call)
+    except Exception as e:
+        logger.error(f"[ARSIP] Gagal ambil daftar siklus siap arsip: {e}")
+        return 0
+
+    user_ids = sorted({r["user_id"] for r in (getattr(result, "data", None) or [])})
+    total = 0
+    for user_id in user_ids:
+        total += await arsipkan_user(user_id, min_hari)
+    logger.info(f"[ARSIP] Selesai: {total} siklus diarsipkan dari {len(user_ids)} user")
+    return total
+
+
+# ============================================================
+# BACA ARSIP (ON DEMAND)
+# ============================================================
+def baca_arsip(user_id: int, siklus_id: int, table: str):
+    """
+    Generator row arsip satu tabel, dibaca streaming baris per baris
+    (tidak memuat seluruh file ke memori).
+    """
+    path = _arsip_path(user_id, siklus_id, table)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def get_siklus_terarsip(user_id: int, siklus_id: int) -> Siklus | None:
+    """Ambil siklus milik user yang sudah diarsipkan"""
+    for s in await get_all_siklus(user_id):
+        if s.id == siklus_id and s.diarsipkan_pada:
+            return s
+    return None
+
+
+async def get_detail_arsip(user_id: int, siklus_id: int, limit: int = 500) -> dict:
+    """
+    Detail siklus terarsip per tabel (dibatasi `limit` row per tabel untuk tampilan).
+    Hanya siklus milik user sendiri yang bisa dibaca.
+    """
+    if await get_siklus_terarsip(user_id, siklus_id) is None:
+        return {}
+
+    def load():
+        detail = {}
+        for table in TABEL_ARSIP:
+            rows = []
+            for row in baca_arsip(user_id, siklus_id, table):
+                if len(rows) >= limit:
+                    break
+                rows.append(row)
+            detail[table] = rows
+        return detail
+
+    return await asyncio.to_thread(load)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(jalankan_arsip(int(sys.argv[1]) if len(sys.argv) > 1 else ARSIP_MIN_HARI))
@@ -0,0 +1,192 @@
+# services/batch_malam.py
+# Batch malam: hitung di muka agregat ringkasan, prediksi panen, simulasi laba,
+# dan ringkasan AI untuk semua user, supaya pengunjung pertama pagi hari
+# tidak menanggung biaya hitung penuh.
+#
+# User diproses per chunk. Setelah tiap chunk, progres (user selesai, gagal,
+# total durasi per tahap) ditulis ke file checkpoint per tanggal, jadi batch
+# yang terputus bisa dijalankan ulang dan melanjutkan dari chunk berikutnya.
+#
+# Agregat, prediksi & simulasi disimpan di DiskCache (lib/cache_disk.py) dengan
+# key versi data user, ringkasan AI di tabel RingkasanAI; keduanya dibaca semua
+# worker dan berlaku sampai data user berubah atau batch berikutnya.
+#
+# Jalankan (cron / scheduler):  python -m services.batch_malam [--ulang]
+
+import os
+import json
+import time
+import logging
+import asyncio
+from datetime import date
+
+from lib.timing import stage, format_timings
+from lib.tanggal import today_wib
+from services.user import get_all_user_ids
+from services.ringkasan import get_ringkasan_aggregate
+from services.prediksi import get_prediksi
+from services.simulasi import get_simulasi_laba
+from services.ai.ringkasan_ai import (
+    get_ringkasan_ai,
+    get_ringkasan_ai_tersimpan,
+    sidik_data,
+)
+
+logger = logging.getLogger("service_batch_malam")
+
+BATCH_DIR = os.getenv("BATCH_DIR", "data/batch")
+BATCH_CHUNK = int(os.getenv("BATCH_CHUNK", "50"))
+# User yang dihitung bersamaan dalam satu chunk (query Supabase paralel)
+BATCH_KONKURENSI = int(os.getenv("BATCH_KONKURENSI", "4"))
+# Batas panggilan Gemini per menit (kuota API)
+AI_PER_MENIT = float(os.getenv("BATCH_AI_PER_MENIT", "10"))
+
+TAHAP = ("ringkasan", "prediksi", "simulasi", "ai")
+
+
+class PembatasLaju:
+    """Jeda minimal antar panggilan (token bucket kapasitas 1)"""
+
+    def __init__(self, per_menit: float):
+        self.jeda = 60.0 / per_menit if per_menit > 0 else 0.0
+        self._berikutnya = 0.0
+        self._lock = asyncio.Lock()
+
+    async def tunggu(self):
+        async with self._lock:
+            sekarang = time.monotonic()
+            if self._berikutnya > sekarang:
+                await asyncio.sleep(self._berikutnya - sekarang)
+            self._berikutnya = max(sekarang, self._berikutnya) + self.jeda
+
+
+# ============================================================
+# CHECKPOINT
+# ============================================================
+def _checkpoint_path(tanggal: date) -> str:
+    return os.path.join(BATCH_DIR, f"{tanggal.isoformat()}.json")
+
+
+def _checkpoint_baru(tanggal: date) -> dict:
+    return {
+        "tanggal": tanggal.isoformat(),
+        "selesai": [],
+        "gagal": {},
+        "timings": dict.fromkeys(TAHAP, 0.0),
+        "status": "berjalan",
+    }
+
+
+def baca_checkpoint(tanggal: date) -> dict:
+    """Progres batch tanggal ini (kosong kalau belum pernah jalan)"""
+    path = _checkpoint_path(tanggal)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return _checkpoint_baru(tanggal)
+
+
+def _tulis_checkpoint(tanggal: date, checkpoint: dict):
+    """Tulis ke file sementara lalu rename, checkpoint tidak pernah setengah jadi"""
+    path = _checkpoint_path(tanggal)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# PROSES PER USER
+# ============================================================
+async def proses_user(user_id: int, today: date, pembatas: PembatasLaju) -> dict:
+    """Jalankan semua tahap untuk satu user, kembalikan durasi per tahap (ms)"""
+    timings = {}
+    with stage("ringkasan", timings):
+        agg = await get_ringkasan_aggregate(user_id)
+    with stage("prediksi", timings):
+        await get_prediksi(user_id, today)
+    with stage("simulasi", timings):
+        await get_simulasi_laba(user_id, today=today)
+
+    # Sidik data dicek sebelum antri jatah rate limit: user yang datanya belum
+    # berubah sejak ringkasan AI terakhir tidak memanggil AI sama sekali
+    tersimpan = await get_ringkasan_ai_tersimpan(user_id)
+    if tersimpan and tersimpan.get("sidik") == sidik_data(agg):
+        return timings
+
+    # Jeda rate limit tidak ikut dihitung sebagai durasi tahap AI
+    await pembatas.tunggu()
+    with stage("ai", timings):
+        await get_ringkasan_ai(user_id, agg)
+    return timings
+
+
+async def _proses_chunk(user_ids: list[int], today: date, pembatas: PembatasLaju):
+    sem = asyncio.Semaphore(BATCH_KONKURENSI)
+
+    async def satu(user_id: int):
+        async with sem:
+            try:
+                return user_id, await proses_user(user_id, today, pembatas), None
+            except Exception as e:
+                logger.error(f"[BATCH] Gagal proses user_id={user_id}: {e}")
+                return user_id, None, str(e)
+
+    return await asyncio.gather(*(satu(u) for u in user_ids))
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+async def jalankan_batch(today: date | None = None, ulang: bool = False) -> dict:
+    """
+    Hitung di muka untuk semua user. Melanjutkan checkpoint hari yang sama
+    kecuali `ulang=True`. Kembalikan checkpoint akhir (progres + timings).
+    """
+    today = today or today_wib()
+    checkpoint = _checkpoint_baru(today) if ulang else baca_checkpoint(today)
+
+    user_ids = await get_all_user_ids()
+    sudah = set(checkpoint["selesai"])
+    sisa = [u for u in user_ids if u not in sudah]
+    if sudah:
+        logger.info(f"[BATCH] Melanjutkan {today}: {len(sudah)} user sudah selesai")
+
+    pembatas = PembatasLaju(AI_PER_MENIT)
+    mulai = time.perf_counter()
+    total_chunk = (len(sisa) + BATCH_CHUNK - 1) // BATCH_CHUNK
+
+    for n, i in enumerate(range(0, len(sisa), BATCH_CHUNK), start=1):
+        chunk = sisa[i : i + BATCH_CHUNK]
+        for user_id, timings, error in await _proses_chunk(chunk, today, pembatas):
+            if error is not None:
+                checkpoint["gagal"][str(user_id)] = error
+                continue
+            checkpoint["selesai"].append(user_id)
+            checkpoint["gagal"].pop(str(user_id), None)
+            for tahap, ms in timings.items():
+                checkpoint["timings"][tahap] = round(checkpoint["timings"][tahap] + ms, 2)
+
+        _tulis_checkpoint(today, checkpoint)
+        logger.info(
+            f"[BATCH] Chunk {n}/{total_chunk}: "
+            f"{len(checkpoint['selesai'])}/{len(user_ids)} user selesai, "
+            f"{len(checkpoint['gagal'])} gagal, "
+            f"{time.perf_counter() - mulai:.1f}s | {format_timings(checkpoint['timings'])}"
+        )
+
+    checkpoint["status"] = "selesai" if not checkpoint["gagal"] else "sebagian"
+    _tulis_checkpoint(today, checkpoint)
+    logger.info(
+        f"[BATCH] {today} {checkpoint['status']}: {len(checkpoint['selesai'])} user, "
+        f"{len(checkpoint['gagal'])} gagal"
+    )
+    return checkpoint
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(jalankan_batch(ulang="--ulang" in sys.argv))
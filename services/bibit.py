@@ -1,7 +1,16 @@
 # services/bibit.py
 import logging
 import asyncio
+from collections import defaultdict
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from lib.money import rupiah
+from lib.tanggal import today_wib
+from services.models import Bibit
+from services.siklus import pastikan_siklus_aktif, siklus_aktif_per_kolam
+from services.statistik import tambah_stat, sinkron_dari_rows
+from services.tulis import update_milik, delete_milik, insert_sekali, insert_banyak
 
 logger = logging.getLogger("service_bibit")
 
@@ -9,21 +18,22 @@ logger = logging.getLogger("service_bibit")
 # ============================================================
 # AMBIL SEMUA BIBIT (FILTER BERDASARKAN USER)
 # ============================================================
-async def get_all_bibit(user_id: int):
+async def get_all_bibit(user_id: int, siklus_ids: list[int] = None):
     """
     Ambil semua data bibit milik user tertentu,
     urut berdasarkan tanggal_tebar descending.
+    Jika siklus_ids diberikan, hanya ambil bibit dari siklus tersebut.
     """
+    if siklus_ids is not None and not siklus_ids:
+        return []
+
     db = get_db()
 
     def db_call():
-        return (
-            db.table("Bibit")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("tanggal_tebar", desc=True)
-            .execute()
-        )
+        query = db.table("Bibit").select("*").eq("user_id", user_id)
+        if siklus_ids is not None:
+            query = query.in_("siklus_id", siklus_ids)
+        return query.order("tanggal_tebar", desc=True).execute()
 
     try:
         result = await asyncio.to_thread(db_call)
@@ -33,7 +43,7 @@ async def get_all_bibit(user_id: int):
             return []
 
         logger.info(f"Ambil {len(result.data)} data bibit untuk user_id={user_id}")
-        return result.data
+        return Bibit.from_rows(result.data)
 
     except Exception as e:
         logger.error(f"Gagal ambil bibit untuk user_id={user_id}: {e}")
@@ -52,12 +62,12 @@ async def create_bibit(
     tanggal_tebar: str = None,
     user_id: int = None,
     total_berat: float = 0,  # Tambahkan parameter total_berat
+    idem_key: str = None,
 ):
     """
     Tambah data bibit ke kolam tertentu untuk user tertentu.
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat row ganda.
     """
-    db = get_db()
-
     payload = {
         "user_id": user_id,
         "kolam_id": kolam_id,
@@ -71,24 +81,97 @@ async def create_bibit(
     if tanggal_tebar:
         payload["tanggal_tebar"] = tanggal_tebar
 
-    def db_call():
-        return db.table("Bibit").insert(payload).execute()
+    # Tebar bibit membuka siklus baru jika kolam belum punya siklus aktif
+    payload["siklus_id"] = await pastikan_siklus_aktif(user_id, kolam_id, tanggal_tebar)
+    if kolam_id and payload["siklus_id"] is None:
+        logger.error(f"Siklus kolam_id={kolam_id} tidak tersedia, batal tulis")
+        return None
 
-    try:
-        result = await asyncio.to_thread(db_call)
+    hasil = await insert_sekali("Bibit", payload, idem_key)
+    if not hasil.ok:
+        logger.error(f"Gagal input bibit untuk user_id={user_id}: {hasil.error}")
+        return None
+    if not hasil.baru:
+        logger.info(f"Bibit idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.row
+
+    invalidate_user(user_id)
+    logger.info(
+        f"Bibit ditambahkan user_id={user_id} kolam_id={kolam_id} jumlah={jumlah} total_berat={total_berat}"
+    )
+    await antrian.kirim(
+        tambah_stat,
+        user_id,
+        kolam_id,
+        payload["siklus_id"],
+        bibit=jumlah,
+        berat_bibit=total_berat,
+        biaya=rupiah(total_harga),
+        kunci=user_id,
+    )
+    return hasil.row
+
+
+async def create_bibit_many(user_id: int, rows: list[dict], idem_key: str = None):
+    """
+    Tambah banyak data bibit sekaligus dalam satu insert (array).
+    Tiap row: kolam_id, ukuran_bibit, jumlah, dan opsional total_harga,
+    total_berat, tanggal_tebar (default hari ini), catatan.
+    Semua row masuk atau tidak sama sekali.
+    `idem_key`: kiriman ulang hanya memasukkan row yang belum ada (hasil: row baru).
+    """
+    if not rows:
+        return []
 
-        if not getattr(result, "data", None):
-            logger.error(f"Gagal input bibit untuk user_id={user_id}: {result}")
-            return None
+    hari_ini = today_wib().isoformat()
+    tanggal_kolam = {}
+    for r in rows:
+        tanggal_kolam.setdefault(r["kolam_id"], r.get("tanggal_tebar") or hari_ini)
+    siklus_kolam = await siklus_aktif_per_kolam(user_id, tanggal_kolam)
+    if siklus_kolam is None:
+        logger.error(f"Siklus tidak tersedia untuk sebagian row user_id={user_id}")
+        return None
 
-        logger.info(
-            f"Bibit ditambahkan user_id={user_id} kolam_id={kolam_id} jumlah={jumlah} total_berat={total_berat}"
+    payload = [
+        {
+            "user_id": user_id,
+            "kolam_id": r["kolam_id"],
+            "ukuran_bibit": r["ukuran_bibit"],
+            "jumlah": r["jumlah"],
+            "total_harga": r.get("total_harga") or 0,
+            "total_berat": r.get("total_berat") or 0,
+            "catatan": r.get("catatan"),
+            "tanggal_tebar": r.get("tanggal_tebar") or hari_ini,
+            "siklus_id": siklus_kolam.get(r["kolam_id"]),
+        }
+        for r in rows
+    ]
+
+    hasil = await insert_banyak("Bibit", payload, idem_key)
+    if hasil.gagal:
+        logger.error(
+            f"Gagal input {len(rows)} bibit untuk user_id={user_id}: {hasil.error}"
         )
-        return result.data[0]
-
-    except Exception as e:
-        logger.error(f"Error create_bibit user_id={user_id}: {e}")
         return None
+    if not hasil.baru:
+        logger.info(f"Bibit idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.rows
+
+    invalidate_user(user_id)
+    logger.info(f"{len(hasil.rows)} bibit ditambahkan user_id={user_id}")
+
+    # Delta statistik digabung per siklus, bukan per row
+    delta_siklus = defaultdict(lambda: {"bibit": 0, "berat_bibit": 0.0, "biaya": 0})
+    for row in hasil.rows:
+        delta = delta_siklus[(row["kolam_id"], row.get("siklus_id"))]
+        delta["bibit"] += row.get("jumlah") or 0
+        delta["berat_bibit"] += row.get("total_berat") or 0
+        delta["biaya"] += rupiah(row.get("total_harga"))
+    for (kolam_id, siklus_id), delta in delta_siklus.items():
+        await antrian.kirim(
+            tambah_stat, user_id, kolam_id, siklus_id, **delta, kunci=user_id
+        )
+    return hasil.rows
 
 
 # ============================================================
@@ -108,7 +191,6 @@ async def edit_bibit(
     """
     Update data bibit berdasarkan bibit_id dan user_id
     """
-    db = get_db()
     payload = {}
 
     if kolam_id is not None:
@@ -130,26 +212,19 @@ async def edit_bibit(
         logger.warning(f"Tidak ada field untuk update bibit_id={bibit_id}")
         return False
 
-    def db_call():
-        return (
-            db.table("Bibit")
-            .update(payload)
-            .eq("id", bibit_id)
-            .eq("user_id", user_id)
-            .execute()
+    hasil = await update_milik("Bibit", bibit_id, user_id, payload)
+    if hasil.ok:
+        invalidate_user(user_id)
+        logger.info(f"Bibit {bibit_id} berhasil diupdate user_id={user_id}")
+        await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+        return True
+    if hasil.tidak_ditemukan:
+        logger.warning(f"Bibit {bibit_id} tidak ditemukan untuk user_id={user_id}")
+    else:
+        logger.error(
+            f"Error edit_bibit bibit_id={bibit_id} user_id={user_id}: {hasil.error}"
         )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-        if getattr(result, "data", None):
-            logger.info(f"Bibit {bibit_id} berhasil diupdate user_id={user_id}")
-            return True
-        else:
-            logger.warning(f"Gagal update bibit {bibit_id} user_id={user_id}")
-            return False
-    except Exception as e:
-        logger.error(f"Error edit_bibit bibit_id={bibit_id} user_id={user_id}: {e}")
-        return False
+    return False
 
 
 # ============================================================
@@ -159,25 +234,16 @@ async def delete_bibit(bibit_id: int, user_id: int = None):
     """
     Hapus bibit berdasarkan bibit_id dan user_id
     """
-    db = get_db()
-
-    def db_call():
-        return (
-            db.table("Bibit")
-            .delete()
-            .eq("id", bibit_id)
-            .eq("user_id", user_id)
-            .execute()
+    hasil = await delete_milik("Bibit", bibit_id, user_id)
+    if hasil.ok:
+        invalidate_user(user_id)
+        logger.info(f"Bibit {bibit_id} berhasil dihapus user_id={user_id}")
+        await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+        return True
+    if hasil.tidak_ditemukan:
+        logger.warning(f"Bibit {bibit_id} tidak ditemukan untuk user_id={user_id}")
+    else:
+        logger.error(
+            f"Error delete_bibit bibit_id={bibit_id} user_id={user_id}: {hasil.error}"
         )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-        if getattr(result, "data", None):
-            logger.info(f"Bibit {bibit_id} berhasil dihapus user_id={user_id}")
-            return True
-        else:
-            logger.warning(f"Gagal hapus bibit {bibit_id} user_id={user_id}")
-            return False
-    except Exception as e:
-        logger.error(f"Error delete_bibit bibit_id={bibit_id} user_id={user_id}: {e}")
-        return False
+    return False
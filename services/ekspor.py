@@ -0,0 +1,234 @@
+# services/ekspor.py
+# Ekspor penuh data transaksi (CSV / NDJSON) untuk pembukuan.
+#
+# Row diambil per halaman (keyset pagination: id > id_terakhir, urut id) lalu
+# langsung diserialisasi, jadi hanya satu halaman yang ada di memori berapa pun
+# jumlah datanya. Setelah tabel live, row siklus yang sudah diarsipkan
+# (services.arsip, JSONL.gz) ikut dialirkan dengan filter yang sama.
+#
+# Laporan `ringkasan` bukan tabel DB: satu row per kolam dari agregat ringkasan
+# (services.ringkasan stage 1-4, cache versi data), angka mentah tanpa format.
+# Cakupannya siklus berjalan tiap kolam, jadi filter tanggal tidak berlaku.
+
+import io
+import os
+import csv
+import json
+import asyncio
+import logging
+from itertools import islice
+
+from lib.supabase_client import get_db
+from lib.tanggal import to_date
+from services.models import (
+    Kolam,
+    Bibit,
+    Kematian,
+    PemberianPakan,
+    PakanStok,
+    Pengeluaran,
+    Panen,
+)
+from services.kolam import get_all_kolam
+from services.siklus import get_all_siklus
+from services.arsip import TABEL_ARSIP, baca_arsip
+from services.ringkasan import KATEGORI, get_ringkasan_aggregate
+
+logger = logging.getLogger("service_ekspor")
+
+EKSPOR_HALAMAN = int(os.getenv("EKSPOR_HALAMAN", "1000"))
+
+# nama -> (tabel DB, kolom tanggal, kolom id kolam, model untuk daftar kolom)
+TABEL = {
+    "kolam": ("Kolam", "tanggal_mulai", "id", Kolam),
+    "bibit": ("Bibit", "tanggal_tebar", "kolam_id", Bibit),
+    "kematian": ("Kematian", "tanggal", "kolam_id", Kematian),
+    "pemberian_pakan": ("PemberianPakan", "tanggal", "kolam_id", PemberianPakan),
+    "pakan_stok": ("PakanStok", "tanggal_masuk", "kolam_id", PakanStok),
+    "pengeluaran": ("Pengeluaran", "tanggal", "kolam_id", Pengeluaran),
+    "panen": ("Panen", "tanggal_panen", "kolam_id", Panen),
+}
+
+RINGKASAN = "ringkasan"
+KOLOM_RINGKASAN = [
+    "kolam_id",
+    "nama_kolam",
+    "status_label",
+    "tanggal_mulai",
+    "diarsipkan",
+    *(f"{cat}_{kolom}" for cat in KATEGORI for kolom in ("item", "transaksi", "harga")),
+    "total_kematian",
+    "total_pengeluaran",
+    "selisih_total",
+    "proporsi_max",
+]
+
+# Semua nama yang bisa diekspor: tabel + laporan ringkasan
+EKSPOR = (*TABEL, RINGKASAN)
+
+FORMAT = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def kolom_ekspor(tabel: str) -> list[str]:
+    """Kolom tabel (dari model) + nama_kolam hasil lookup"""
+    if tabel == RINGKASAN:
+        return KOLOM_RINGKASAN
+    model = TABEL[tabel][3]
+    kolom = [k for k in model._fields if k != "nama_kolam"]
+    return kolom + ["nama_kolam"]
+
+
+# ============================================================
+# SUMBER ROW (PER HALAMAN)
+# ============================================================
+async def _halaman_live(
+    user_id, tabel_db, kolom_tanggal, kolom_kolam, kolam_id, dari, sampai, ukuran
+):
+    db = get_db()
+    id_terakhir = 0
+    while True:
+
+        def db_call():
+            query = (
+                db.table(tabel_db)
+                .select("*")
+                .eq("user_id", user_id)
+                .gt("id", id_terakhir)
+            )
+            if kolam_id:
+                query = query.eq(kolom_kolam, kolam_id)
+            if dari:
+                query = query.gte(kolom_tanggal, dari)
+            if sampai:
+                query = query.lte(kolom_tanggal, sampai)
+            return query.order("id").limit(ukuran).execute()
+
+        rows = getattr(await asyncio.to_thread(db_call), "data", None) or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < ukuran:
+            return
+        id_terakhir = rows[-1]["id"]
+
+
+async def _halaman_arsip(
+    user_id, tabel_db, kolom_tanggal, kolom_kolam, kolam_id, dari, sampai, ukuran
+):
+    if tabel_db not in TABEL_ARSIP:
+        return
+    dari, sampai = to_date(dari), to_date(sampai)
+
+    def cocok(row) -> bool:
+        if kolam_id and row.get(kolom_kolam) != kolam_id:
+            return False
+        tanggal = to_date(row.get(kolom_tanggal))
+        if dari and (tanggal is None or tanggal < dari):
+            return False
+        if sampai and (tanggal is None or tanggal > sampai):
+            return False
+        return True
+
+    for siklus in await get_all_siklus(user_id):
+        if not siklus.diarsipkan_pada:
+            continue
+        if kolam_id and siklus.kolam_id != kolam_id:
+            continue
+        rows = (r for r in baca_arsip(user_id, siklus.id, tabel_db) if cocok(r))
+        while True:
+            halaman = await asyncio.to_thread(lambda: list(islice(rows, ukuran)))
+            if not halaman:
+                break
+            yield halaman
+
+
+async def _halaman_ringkasan(user_id: int, kolam_id: int = None):
+    """Satu halaman: row per kolam dari agregat ringkasan (tanpa format tampilan)"""
+    agg = await get_ringkasan_aggregate(user_id)
+    rows = []
+    for k in agg["pengeluaran_per_kolam"]:
+        if kolam_id and k["id"] != kolam_id:
+            continue
+        row = {
+            "kolam_id": k["id"],
+            "nama_kolam": k["nama_kolam"],
+            "status_label": k["status_label"],
+            "tanggal_mulai": k["tanggal_mulai"],
+            "diarsipkan": k["diarsipkan"],
+            "total_kematian": k["kematian"]["total_ekor"],
+            "total_pengeluaran": k["total_pengeluaran"],
+            "selisih_total": k["selisih_total"],
+            "proporsi_max": k["proporsi_max"],
+        }
+        for cat in KATEGORI:
+            row[f"{cat}_item"] = k[cat]["total_item"]
+            row[f"{cat}_transaksi"] = k[cat]["total_transaksi"]
+            row[f"{cat}_harga"] = k[cat]["total_harga"]
+        rows.append(row)
+    if rows:
+        yield rows
+
+
+async def halaman_ekspor(
+    user_id: int,
+    tabel: str,
+    kolam_id: int = None,
+    dari: str = None,
+    sampai: str = None,
+    arsip: bool = True,
+    ukuran: int = EKSPOR_HALAMAN,
+):
+    """
+    Async generator halaman row (list[dict]) milik user, termasuk nama_kolam.
+    Filter: kolam_id, rentang tanggal (dari / sampai, inklusif; tidak berlaku
+    untuk laporan ringkasan).
+    """
+    if tabel == RINGKASAN:
+        async for rows in _halaman_ringkasan(user_id, kolam_id):
+            yield rows
+        return
+
+    tabel_db, kolom_tanggal, kolom_kolam, _ = TABEL[tabel]
+    nama_kolam = {k["id"]: k["nama_kolam"] for k in await get_all_kolam(user_id)}
+    args = (user_id, tabel_db, kolom_tanggal, kolom_kolam, kolam_id, dari, sampai, ukuran)
+
+    sumber = [_halaman_live(*args)]
+    if arsip:
+        sumber.append(_halaman_arsip(*args))
+
+    for halaman_iter in sumber:
+        async for rows in halaman_iter:
+            for row in rows:
+                row["nama_kolam"] = nama_kolam.get(row.get(kolom_kolam))
+            yield rows
+
+
+# ============================================================
+# SERIALISASI (STREAMING)
+# ============================================================
+async def stream_ekspor(user_id: int, tabel: str, format_file: str = "csv", **filters):
+    """Async generator potongan teks CSV / NDJSON, satu potong per halaman"""
+    kolom = kolom_ekspor(tabel)
+    jumlah = 0
+
+    if format_file == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=kolom, extrasaction="ignore")
+        writer.writeheader()
+        yield buf.getvalue()
+
+    async for rows in halaman_ekspor(user_id, tabel, **filters):
+        jumlah += len(rows)
+        if format_file == "csv":
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=kolom, extrasaction="ignore")
+            writer.writerows(rows)
+            yield buf.getvalue()
+        else:
+            yield "".join(
+                json.dumps({k: row.get(k) for k in kolom}, ensure_ascii=False, default=str)
+                + "\n"
+                for row in rows
+            )
+
+    logger.info(f"[EKSPOR] user_id={user_id} {tabel}.{format_file}: {jumlah} row")
@@ -0,0 +1,435 @@
+# services/impor.py
+# Impor data lama dari spreadsheet (CSV / XLSX) ke Bibit, Kematian,
+# PemberianPakan, PakanStok, Pengeluaran dan Panen.
+#
+# File dibaca baris demi baris (csv.reader / openpyxl read_only), divalidasi,
+# nama kolam dipetakan ke kolam_id lewat lookup yang dibangun sekali per impor,
+# lalu dimasukkan per chunk (insert array) dengan jumlah chunk paralel terbatas.
+# Hanya chunk yang sedang diproses yang ada di memori, jadi pemakaian memori
+# datar untuk file ratusan ribu baris. Progres dikirim sebagai generator dict
+# (dipakai SSE di routes/impor.py dan CLI di bawah).
+#
+# Data historis tidak membuka siklus baru: row diberi siklus_id hanya jika
+# tanggalnya masuk siklus aktif kolam itu. Akumulator StatSiklus disinkron
+# sekali per siklus yang tersentuh di akhir impor (bukan delta per row), dan
+# proyeksi stok hanya menerima pakan dalam jendela SIMPAN_HARI terakhir.
+# Detektor anomali kematian tidak diisi dari histori (EWMA butuh urutan waktu).
+#
+# CLI:  python -m services.impor <tabel> <file.csv|file.xlsx> --user <user_id>
+
+import os
+import csv
+import re
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from lib.tanggal import to_date, today_wib
+from services.kolam import get_all_kolam
+from services.siklus import get_siklus_aktif
+from services.statistik import sinkron_stat
+from services.proyeksi_stok import catat_pakan, SIMPAN_HARI
+
+logger = logging.getLogger("service_impor")
+
+IMPOR_CHUNK = int(os.getenv("IMPOR_CHUNK", "500"))
+# Chunk yang di-insert bersamaan (juga batas chunk yang tertahan di memori)
+IMPOR_KONKURENSI = int(os.getenv("IMPOR_KONKURENSI", "4"))
+# Contoh error yang disimpan untuk laporan (sisanya hanya dihitung)
+MAKS_CONTOH_ERROR = 50
+
+
+# ============================================================
+# PARSER NILAI SEL
+# ============================================================
+# 15.000 / 1.500.000 (titik pemisah ribuan, tanpa koma desimal)
+_POLA_RIBUAN = re.compile(r"-?\d{1,3}(\.\d{3})+")
+
+
+def _teks(value):
+    teks = str(value).strip() if value is not None else ""
+    return teks or None
+
+
+def _bulat(value):
+    """'1.000' / '1,000' / 1000.0 -> 1000 (pemisah ribuan diabaikan)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(str(value).strip().replace(".", "").replace(",", "").replace(" ", ""))
+
+
+def _desimal(value):
+    """
+    Angka format Indonesia & biasa -> float. Koma = desimal (titik jadi pemisah
+    ribuan); tanpa koma, titik dianggap pemisah ribuan kalau polanya ribuan.
+
+    >>> _desimal("12,5"), _desimal("1.234,5"), _desimal("12.5")
+    (12.5, 1234.5, 12.5)
+    >>> _desimal("Rp 15.000"), _desimal("Rp 1.500.000"), _desimal("15.000")
+    (15000.0, 1500000.0, 15000.0)
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    teks = str(value).strip().replace("Rp", "").replace(" ", "")
+    if "," in teks:
+        teks = teks.replace(".", "").replace(",", ".")
+    elif _POLA_RIBUAN.fullmatch(teks):
+        teks = teks.replace(".", "")
+    return float(teks)
+
+
+def _tanggal(value):
+    """ISO (2024-01-31), 31/01/2024, 31-01-2024, atau sel tanggal XLSX -> 'YYYY-MM-DD'"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str) and "/" not in value and value[4:5] == "-":
+        hasil = to_date(value)
+    elif isinstance(value, str):
+        hasil = None
+        for fmt in ("%d/%m/%Y", "%d-%m-%Y"):
+            try:
+                hasil = datetime.strptime(value.strip(), fmt).date()
+                break
+            except ValueError:
+                continue
+    else:
+        hasil = to_date(value)
+    if hasil is None:
+        raise ValueError(f"tanggal tidak dikenali: {value!r}")
+    return hasil.isoformat()
+
+
+# ============================================================
+# SKEMA PER TABEL
+# ============================================================
+# nama -> (tabel DB, kolom tanggal, kolam wajib?, {kolom: (parser, wajib, default)})
+TABEL = {
+    "bibit": (
+        "Bibit",
+        "tanggal_tebar",
+        True,
+        {
+            "tanggal_tebar": (_tanggal, True, None),
+            "ukuran_bibit": (_teks, True, None),
+            "jumlah": (_bulat, True, None),
+            "total_harga": (_desimal, False, 0),
+            "total_berat": (_desimal, False, 0),
+            "catatan": (_teks, False, None),
+        },
+    ),
+    "kematian": (
+        "Kematian",
+        "tanggal",
+        True,
+        {
+            "tanggal": (_tanggal, True, None),
+            "jumlah": (_bulat, True, None),
+            "catatan": (_teks, False, None),
+        },
+    ),
+    "pemberian_pakan": (
+        "PemberianPakan",
+        "tanggal",
+        True,
+        {
+            "tanggal": (_tanggal, True, None),
+            "jenis_pakan": (_teks, True, None),
+            "jumlah_gram": (_desimal, True, None),
+            "catatan": (_teks, False, None),
+        },
+    ),
+    "pakan_stok": (
+        "PakanStok",
+        "tanggal_masuk",
+        False,
+        {
+            "tanggal_masuk": (_tanggal, True, None),
+            "nama_pakan": (_teks, True, None),
+            "jumlah": (_desimal, True, None),
+            "satuan": (_teks, False, "g"),
+            "harga": (_desimal, False, 0),
+        },
+    ),
+    "pengeluaran": (
+        "Pengeluaran",
+        "tanggal",
+        False,
+        {
+            "tanggal": (_tanggal, True, None),
+            "nama_pengeluaran": (_teks, True, None),
+            "harga": (_desimal, True, None),
+            "jumlah": (_bulat, False, 1),
+            "catatan": (_teks, False, None),
+        },
+    ),
+    "panen": (
+        "Panen",
+        "tanggal_panen",
+        True,
+        {
+            "tanggal_panen": (_tanggal, True, None),
+            "total_berat": (_desimal, True, None),
+            "total_jual": (_desimal, False, 0),
+            "catatan": (_teks, False, None),
+        },
+    ),
+}
+
+# Header yang diterima untuk nama kolam
+KOLOM_KOLAM = ("nama_kolam", "kolam")
+
+
+# ============================================================
+# BACA FILE (STREAMING)
+# ============================================================
+def _baca_csv(path: str):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _baca_xlsx(path: str):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ValueError("Impor XLSX butuh paket openpyxl (pip install openpyxl)") from e
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def baca_baris(path: str, format_file: str):
+    """
+    Generator (nomor_baris, dict kolom->nilai) dari file CSV / XLSX.
+    Header dinormalisasi: huruf kecil, spasi -> '_'.
+    """
+    rows = _baca_xlsx(path) if format_file == "xlsx" else _baca_csv(path)
+    header = None
+    for nomor, row in enumerate(rows, start=1):
+        if header is None:
+            header = [str(h or "").strip().lower().replace(" ", "_") for h in row]
+            continue
+        if not any(v not in (None, "") for v in row):
+            continue
+        yield nomor, dict(zip(header, row))
+
+
+# ============================================================
+# VALIDASI
+# ============================================================
+class Validator:
+    """Ubah satu baris mentah jadi payload insert (atau lempar ValueError)"""
+
+    def __init__(self, tabel: str, user_id: int, kolam_map: dict, siklus_aktif: dict):
+        self.nama_tabel, self.kolom_tanggal, self.kolam_wajib, self.kolom = TABEL[tabel]
+        self.user_id = user_id
+        self.kolam_map = kolam_map
+        # kolam_id -> (siklus_id, tanggal_mulai ISO)
+        self.siklus_aktif = {
+            kolam_id: (s.id, to_date(s.tanggal_mulai).isoformat())
+            for kolam_id, s in siklus_aktif.items()
+            if to_date(s.tanggal_mulai)
+        }
+
+    def _kolam_id(self, raw: dict):
+        nama = next((raw[k] for k in KOLOM_KOLAM if raw.get(k) not in (None, "")), None)
+        if nama is None:
+            if self.kolam_wajib:
+                raise ValueError("nama_kolam kosong")
+            return None
+        kolam_id = self.kolam_map.get(str(nama).strip().lower())
+        if kolam_id is None:
+            raise ValueError(f"kolam tidak dikenal: {nama!r}")
+        return kolam_id
+
+    def payload(self, raw: dict) -> dict:
+        data = {"user_id": self.user_id, "kolam_id": self._kolam_id(raw)}
+        for kolom, (parser, wajib, default) in self.kolom.items():
+            try:
+                nilai = parser(raw.get(kolom))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{kolom}: {e}") from None
+            if nilai is None:
+                if wajib:
+                    raise ValueError(f"{kolom} wajib diisi")
+                nilai = default
+            data[kolom] = nilai
+
+        # Row masuk siklus aktif hanya jika tanggalnya di dalam siklus itu
+        aktif = self.siklus_aktif.get(data["kolam_id"])
+        tanggal = data[self.kolom_tanggal]
+        data["siklus_id"] = aktif[0] if aktif and tanggal >= aktif[1] else None
+        return data
+
+
+# ============================================================
+# INSERT PER CHUNK
+# ============================================================
+async def _insert_chunk(nama_tabel: str, payload: list[dict]) -> int:
+    db = get_db()
+
+    def db_call():
+        query = db.table(nama_tabel)
+        if nama_tabel == "Panen":
+            # Unik per kolam + tanggal: panen yang sudah ada dilewati
+            query = query.upsert(
+                payload, on_conflict="kolam_id,tanggal_panen", ignore_duplicates=True
+            )
+        else:
+            query = query.insert(payload)
+        return query.execute()
+
+    result = await asyncio.to_thread(db_call)
+    return len(getattr(result, "data", None) or [])
+
+
+def _progres_baru(tabel: str) -> dict:
+    return {
+        "tabel": tabel,
+        "baris": 0,
+        "masuk": 0,
+        "gagal": 0,
+        "error": [],
+        "selesai": False,
+        "durasi_s": 0.0,
+    }
+
+
+def _catat_error(progres: dict, baris, pesan: str, jumlah: int = 1):
+    progres["gagal"] += jumlah
+    if len(progres["error"]) < MAKS_CONTOH_ERROR:
+        progres["error"].append({"baris": baris, "pesan": pesan})
+
+
+async def impor(user_id: int, tabel: str, path: str, format_file: str = "csv"):
+    """
+    Impor satu file ke tabel `tabel` milik user.
+    Async generator: yield dict progres setelah tiap chunk, terakhir dengan selesai=True.
+    """
+    if tabel not in TABEL:
+        raise ValueError(f"Tabel impor tidak dikenal: {tabel}")
+
+    mulai = time.perf_counter()
+    progres = _progres_baru(tabel)
+
+    # Lookup nama kolam & siklus aktif dibangun sekali untuk seluruh file.
+    # Siklus aktif dibaca langsung dari DB karena dipakai untuk stamp siklus_id.
+    kolam_list, siklus_aktif = await asyncio.gather(
+        get_all_kolam(user_id), get_siklus_aktif(user_id, segar=True)
+    )
+    kolam_map = {str(k["nama_kolam"]).strip().lower(): k["id"] for k in kolam_list}
+    validator = Validator(tabel, user_id, kolam_map, siklus_aktif)
+
+    siklus_tersentuh = set()
+    batas_proyeksi = (today_wib() - timedelta(days=SIMPAN_HARI)).isoformat()
+    pakan_harian = defaultdict(float)
+
+    async def proses(chunk: list[tuple[int, dict]]):
+        payload = []
+        for nomor, raw in chunk:
+            try:
+                payload.append(validator.payload(raw))
+            except ValueError as e:
+                _catat_error(progres, nomor, str(e))
+        if not payload:
+            return
+        try:
+            masuk = await _insert_chunk(validator.nama_tabel, payload)
+        except Exception as e:
+            rentang = f"{chunk[0][0]}-{chunk[-1][0]}"
+            logger.error(f"[IMPOR] Chunk {tabel} baris {rentang} gagal: {e}")
+            _catat_error(progres, rentang, str(e), len(payload))
+            return
+        progres["masuk"] += masuk
+        for row in payload:
+            if row["siklus_id"]:
+                siklus_tersentuh.add(row["siklus_id"])
+            if tabel == "pemberian_pakan" and row["tanggal"] >= batas_proyeksi:
+                pakan_harian[(row["kolam_id"], row["tanggal"])] += row["jumlah_gram"]
+
+    baris = baca_baris(path, format_file)
+    pending = set()
+    try:
+        while True:
+            chunk = await asyncio.to_thread(lambda: list(islice(baris, IMPOR_CHUNK)))
+            if not chunk:
+                break
+            progres["baris"] += len(chunk)
+            pending.add(asyncio.create_task(proses(chunk)))
+            if len(pending) >= IMPOR_KONKURENSI:
+                _, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                progres["durasi_s"] = round(time.perf_counter() - mulai, 2)
+                yield progres
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        for task in pending:
+            task.cancel()
+        baris.close()
+
+    if progres["masuk"]:
+        invalidate_user(user_id)
+        for siklus_id in siklus_tersentuh:
+            await antrian.kirim(sinkron_stat, user_id, siklus_id, kunci=user_id)
+        for (kolam_id, tanggal), gram in pakan_harian.items():
+            await antrian.kirim(
+                catat_pakan, user_id, kolam_id, tanggal, gram, kunci=kolam_id
+            )
+
+    progres["selesai"] = True
+    progres["durasi_s"] = round(time.perf_counter() - mulai, 2)
+    logger.info(
+        f"[IMPOR] user_id={user_id} {tabel}: {progres['masuk']}/{progres['baris']} baris "
+        f"masuk, {progres['gagal']} gagal, {progres['durasi_s']}s"
+    )
+    yield progres
+
+
+def format_dari_nama(nama_file: str) -> str:
+    return "xlsx" if (nama_file or "").lower().endswith(".xlsx") else "csv"
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Impor data spreadsheet LeleFarm")
+    parser.add_argument("tabel", choices=sorted(TABEL))
+    parser.add_argument("file")
+    parser.add_argument("--user", type=int, required=True, help="user_id pemilik data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        async for p in impor(args.user, args.tabel, args.file, format_dari_nama(args.file)):
+            print(
+                f"{p['baris']} baris | {p['masuk']} masuk | {p['gagal']} gagal | "
+                f"{p['durasi_s']}s",
+                file=sys.stderr,
+            )
+        for e in p["error"]:
+            print(f"  baris {e['baris']}: {e['pesan']}", file=sys.stderr)
+        return 0 if not p["gagal"] else 1
+
+    sys.exit(asyncio.run(main()))
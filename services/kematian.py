@@ -1,7 +1,15 @@
 # services/kematian.py
 import logging
 import asyncio
+from collections import defaultdict
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from services.models import Kematian
+from services.siklus import pastikan_siklus_aktif, siklus_aktif_per_kolam
+from services.anomali import catat_kematian
+from services.statistik import tambah_stat, sinkron_dari_rows
+from services.tulis import update_milik, delete_milik, insert_sekali, insert_banyak
 
 logger = logging.getLogger("service_kematian")
 
@@ -9,20 +17,21 @@ logger = logging.getLogger("service_kematian")
 # ============================================================
 # AMBIL SEMUA KEMATIAN (FILTER USER)
 # ============================================================
-async def get_all_kematian(user_id: int):
+async def get_all_kematian(user_id: int, siklus_ids: list[int] = None):
     """
     Ambil semua data kematian untuk user tertentu
+    (opsional: hanya siklus tertentu)
     """
+    if siklus_ids is not None and not siklus_ids:
+        return []
+
     db = get_db()
 
     def db_call():
-        return (
-            db.table("Kematian")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("tanggal", desc=True)
-            .execute()
-        )
+        query = db.table("Kematian").select("*").eq("user_id", user_id)
+        if siklus_ids is not None:
+            query = query.in_("siklus_id", siklus_ids)
+        return query.order("tanggal", desc=True).execute()
 
     try:
         result = await asyncio.to_thread(db_call)
@@ -32,7 +41,7 @@ async def get_all_kematian(user_id: int):
             return []
 
         logger.info(f"Ambil {len(result.data)} data kematian untuk user_id={user_id}")
-        return result.data
+        return Kematian.from_rows(result.data)
 
     except Exception as e:
         logger.error(f"Gagal ambil kematian untuk user_id={user_id}: {e}")
@@ -43,38 +52,117 @@ async def get_all_kematian(user_id: int):
 # BUAT KEMATIAN BARU
 # ============================================================
 async def create_kematian(
-    user_id: int, kolam_id: int, tanggal: str, jumlah: int, catatan: str = None
+    user_id: int,
+    kolam_id: int,
+    tanggal: str,
+    jumlah: int,
+    catatan: str = None,
+    idem_key: str = None,
 ):
     """
     Tambah data kematian lele untuk user tertentu
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat row ganda.
     """
-    db = get_db()
+    siklus_id = await pastikan_siklus_aktif(user_id, kolam_id, tanggal)
+    if kolam_id and siklus_id is None:
+        logger.error(f"Siklus kolam_id={kolam_id} tidak tersedia, batal tulis")
+        return None
+
     payload = {
         "user_id": user_id,
         "kolam_id": kolam_id,
         "tanggal": tanggal,
         "jumlah": jumlah,
         "catatan": catatan,
+        "siklus_id": siklus_id,
     }
 
-    def db_call():
-        return db.table("Kematian").insert(payload).execute()
+    hasil = await insert_sekali("Kematian", payload, idem_key)
+    if not hasil.ok:
+        logger.error(f"Gagal input data kematian untuk user_id={user_id}: {hasil.error}")
+        return None
+    if not hasil.baru:
+        logger.info(f"Kematian idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.row
 
-    try:
-        result = await asyncio.to_thread(db_call)
+    invalidate_user(user_id)
+    logger.info(
+        f"Kematian ditambahkan user_id={user_id} kolam_id={kolam_id} jumlah={jumlah}"
+    )
+    await antrian.kirim(
+        catat_kematian,
+        user_id,
+        kolam_id,
+        payload["siklus_id"],
+        tanggal,
+        jumlah,
+        kunci=kolam_id,
+    )
+    await antrian.kirim(
+        tambah_stat, user_id, kolam_id, payload["siklus_id"], mati=jumlah, kunci=user_id
+    )
+    return hasil.row
 
-        if not getattr(result, "data", None):
-            logger.error(f"Gagal input data kematian untuk user_id={user_id}: {result}")
-            return None
 
-        logger.info(
-            f"Kematian ditambahkan user_id={user_id} kolam_id={kolam_id} jumlah={jumlah}"
-        )
-        return result.data[0]
+async def create_kematian_many(user_id: int, rows: list[dict], idem_key: str = None):
+    """
+    Tambah banyak data kematian sekaligus dalam satu insert (array).
+    Tiap row: kolam_id, tanggal, jumlah, catatan (opsional).
+    Semua row masuk atau tidak sama sekali.
+    `idem_key`: kiriman ulang hanya memasukkan row yang belum ada (hasil: row baru).
+    """
+    if not rows:
+        return []
 
-    except Exception as e:
-        logger.error(f"Error create_kematian user_id={user_id}: {e}")
+    tanggal_kolam = {}
+    for r in rows:
+        tanggal_kolam.setdefault(r["kolam_id"], r["tanggal"])
+    siklus_kolam = await siklus_aktif_per_kolam(user_id, tanggal_kolam)
+    if siklus_kolam is None:
+        logger.error(f"Siklus tidak tersedia untuk sebagian row user_id={user_id}")
+        return None
+
+    payload = [
+        {
+            "user_id": user_id,
+            "kolam_id": r["kolam_id"],
+            "tanggal": r["tanggal"],
+            "jumlah": r["jumlah"],
+            "catatan": r.get("catatan"),
+            "siklus_id": siklus_kolam.get(r["kolam_id"]),
+        }
+        for r in rows
+    ]
+
+    hasil = await insert_banyak("Kematian", payload, idem_key)
+    if hasil.gagal:
+        logger.error(
+            f"Gagal input {len(rows)} data kematian untuk user_id={user_id}: {hasil.error}"
+        )
         return None
+    if not hasil.baru:
+        logger.info(f"Kematian idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.rows
+
+    invalidate_user(user_id)
+    logger.info(f"{len(hasil.rows)} data kematian ditambahkan user_id={user_id}")
+
+    # Efek samping digabung per kolam-siklus-tanggal, bukan per row
+    mati_harian = defaultdict(int)
+    for row in hasil.rows:
+        kunci = (row["kolam_id"], row.get("siklus_id"), row.get("tanggal"))
+        mati_harian[kunci] += row.get("jumlah") or 0
+    mati_siklus = defaultdict(int)
+    for (kolam_id, siklus_id, tanggal), jumlah in mati_harian.items():
+        mati_siklus[(kolam_id, siklus_id)] += jumlah
+        await antrian.kirim(
+            catat_kematian, user_id, kolam_id, siklus_id, tanggal, jumlah, kunci=kolam_id
+        )
+    for (kolam_id, siklus_id), jumlah in mati_siklus.items():
+        await antrian.kirim(
+            tambah_stat, user_id, kolam_id, siklus_id, mati=jumlah, kunci=user_id
+        )
+    return hasil.rows
 
 
 # ============================================================
@@ -108,29 +196,79 @@ async def update_kematian(
         )
         return None
 
-    def db_call():
+    def get_lama():
+        # Nilai lama dibutuhkan detektor anomali untuk menghitung selisih
         return (
             db.table("Kematian")
-            .update(payload)
+            .select("kolam_id, siklus_id, tanggal, jumlah")
             .eq("id", kematian_id)
             .eq("user_id", user_id)
             .execute()
         )
 
     try:
-        result = await asyncio.to_thread(db_call)
-        if not getattr(result, "data", None):
-            logger.warning(f"[USER {user_id}] Gagal update kematian_id={kematian_id}")
-            return None
-
-        logger.info(f"[USER {user_id}] Kematian_id={kematian_id} berhasil diupdate")
-        return result.data[0]
-
+        lama = (getattr(await asyncio.to_thread(get_lama), "data", None) or [None])[0]
     except Exception as e:
         logger.error(
             f"Error update_kematian user_id={user_id} kematian_id={kematian_id}: {e}"
         )
         return None
+    if lama is None:
+        logger.warning(f"[USER {user_id}] Kematian_id={kematian_id} tidak ditemukan")
+        return None
+
+    hasil = await update_milik("Kematian", kematian_id, user_id, payload)
+    if not hasil.ok:
+        logger.warning(
+            f"[USER {user_id}] Gagal update kematian_id={kematian_id}: "
+            f"{hasil.error or 'tidak ditemukan'}"
+        )
+        return None
+
+    invalidate_user(user_id)
+    logger.info(f"[USER {user_id}] Kematian_id={kematian_id} berhasil diupdate")
+    baru = hasil.row
+    await _catat_perubahan(user_id, lama, baru)
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    return baru
+
+
+async def _catat_perubahan(user_id: int, lama: dict, baru: dict):
+    """Teruskan selisih edit ke detektor anomali"""
+    sama_tempat = lama.get("kolam_id") == baru.get("kolam_id") and str(
+        lama.get("tanggal")
+    ) == str(baru.get("tanggal"))
+    if sama_tempat:
+        await antrian.kirim(
+            catat_kematian,
+            user_id,
+            baru.get("kolam_id"),
+            baru.get("siklus_id"),
+            baru.get("tanggal"),
+            (baru.get("jumlah") or 0) - (lama.get("jumlah") or 0),
+            kunci=baru.get("kolam_id"),
+        )
+        return
+
+    # Pindah kolam / tanggal: tarik dari tempat lama, tambahkan ke tempat baru
+    await antrian.kirim(
+        catat_kematian,
+        user_id,
+        lama.get("kolam_id"),
+        lama.get("siklus_id"),
+        lama.get("tanggal"),
+        -(lama.get("jumlah") or 0),
+        kunci=lama.get("kolam_id"),
+    )
+    await antrian.kirim(
+        catat_kematian,
+        user_id,
+        baru.get("kolam_id"),
+        baru.get("siklus_id"),
+        baru.get("tanggal"),
+        baru.get("jumlah") or 0,
+        kunci=baru.get("kolam_id"),
+    )
 
 
 # ============================================================
@@ -140,28 +278,28 @@ async def delete_kematian(kematian_id: int, user_id: int):
     """
     Hapus data kematian milik user
     """
-    db = get_db()
-
-    def db_call():
-        return (
-            db.table("Kematian")
-            .delete()
-            .eq("id", kematian_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-        if not getattr(result, "data", None):
-            logger.warning(f"[USER {user_id}] Gagal hapus kematian_id={kematian_id}")
-            return False
-
-        logger.info(f"[USER {user_id}] Kematian_id={kematian_id} berhasil dihapus")
-        return True
-
-    except Exception as e:
-        logger.error(
-            f"Error delete_kematian user_id={user_id} kematian_id={kematian_id}: {e}"
-        )
+    hasil = await delete_milik("Kematian", kematian_id, user_id)
+    if not hasil.ok:
+        if hasil.tidak_ditemukan:
+            logger.warning(f"[USER {user_id}] Kematian_id={kematian_id} tidak ditemukan")
+        else:
+            logger.error(
+                f"Error delete_kematian user_id={user_id} kematian_id={kematian_id}: "
+                f"{hasil.error}"
+            )
         return False
+
+    invalidate_user(user_id)
+    logger.info(f"[USER {user_id}] Kematian_id={kematian_id} berhasil dihapus")
+    lama = hasil.row
+    await antrian.kirim(
+        catat_kematian,
+        user_id,
+        lama.get("kolam_id"),
+        lama.get("siklus_id"),
+        lama.get("tanggal"),
+        -(lama.get("jumlah") or 0),
+        kunci=lama.get("kolam_id"),
+    )
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    return True
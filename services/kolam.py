@@ -1,11 +1,19 @@
 # services/kolam.py
+import os
 import logging
 import asyncio
-from datetime import date
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib.tanggal import today_wib
+from services.models import Kolam
+from services.panen import catat_panen
+from services.tulis import update_milik, delete_milik, insert_sekali
 
 logger = logging.getLogger("service_kolam")
 
+# Batas tunggu cek kolam milik user sebelum tulis masuk antrian (detik)
+KOLAM_CEK_TIMEOUT = float(os.getenv("KOLAM_CEK_TIMEOUT", "3"))
+
 
 async def get_all_kolam(user_id: int):
     """
@@ -29,7 +37,29 @@ async def get_all_kolam(user_id: int):
         logger.error(f"[KOLAM] Error ambil data user_id={user_id}: {result}")
         return []
 
-    return result.data
+    return Kolam.from_rows(result.data)
+
+
+async def kolam_milik(user_id: int, kolam_id: int) -> bool:
+    """
+    Cek kolam milik user sebelum tulis. Kalau DB tidak terjangkau / lambat
+    (lewat KOLAM_CEK_TIMEOUT) dianggap milik user (tulis masuk antrian tulis,
+    siklusnya dicek lagi saat replay); False hanya kalau kolam pasti bukan milik
+    user.
+    """
+    return await kolam_milik_semua(user_id, {kolam_id})
+
+
+async def kolam_milik_semua(user_id: int, kolam_ids: set) -> bool:
+    """
+    kolam_milik untuk banyak kolam sekaligus (form multi-kolam), satu baca.
+    """
+    try:
+        kolam_list = await asyncio.wait_for(get_all_kolam(user_id), KOLAM_CEK_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"[KOLAM] Cek kolam_id={sorted(kolam_ids)} dilewati (DB putus): {e}")
+        return True
+    return kolam_ids <= {k["id"] for k in kolam_list}
 
 
 async def create_kolam(
@@ -38,11 +68,12 @@ async def create_kolam(
     kapasitas_bibit: int,
     tanggal_mulai: str,
     catatan: str = None,
+    idem_key: str = None,
 ):
     """
     Buat kolam untuk user tertentu
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat kolam ganda.
     """
-    db = get_db()
     payload = {
         "user_id": user_id,
         "nama_kolam": nama_kolam,
@@ -51,16 +82,14 @@ async def create_kolam(
         "catatan": catatan,
     }
 
-    def db_call():
-        return db.table("Kolam").insert(payload).execute()
-
-    result = await asyncio.to_thread(db_call)
-
-    if not hasattr(result, "data") or result.data is None:
-        logger.error(f"[KOLAM] Gagal buat kolam user_id={user_id}: {result}")
+    hasil = await insert_sekali("Kolam", payload, idem_key)
+    if not hasil.ok:
+        logger.error(f"[KOLAM] Gagal buat kolam user_id={user_id}: {hasil.error}")
         return None
 
-    return result.data[0]
+    if hasil.baru:
+        invalidate_user(user_id)
+    return hasil.row
 
 
 async def get_kolam_by_id(kolam_id: int, user_id: int):
@@ -87,7 +116,7 @@ async def get_kolam_by_id(kolam_id: int, user_id: int):
         )
         return None
 
-    return result.data
+    return Kolam.from_row(result.data)
 
 
 async def edit_kolam(
@@ -99,15 +128,9 @@ async def edit_kolam(
     catatan: str = None,
 ):
     """
-    Update data kolam (hanya milik user terkait)
+    Update data kolam (hanya milik user terkait).
+    Satu query update bersyarat; kolam tidak ditemukan dibedakan dari gagal.
     """
-    kolam = await get_kolam_by_id(kolam_id, user_id)
-    if not kolam:
-        logger.error(
-            f"[KOLAM] Gagal edit kolam id={kolam_id}: tidak ditemukan untuk user_id={user_id}"
-        )
-        return None
-
     update_data = {}
     if nama_kolam is not None:
         update_data["nama_kolam"] = nama_kolam
@@ -120,62 +143,45 @@ async def edit_kolam(
 
     if not update_data:
         logger.warning(f"[KOLAM] Tidak ada perubahan untuk kolam id={kolam_id}")
-        return kolam
+        return await get_kolam_by_id(kolam_id, user_id)
 
-    db = get_db()
+    hasil = await update_milik("Kolam", kolam_id, user_id, update_data)
 
-    def db_call():
-        return (
-            db.table("Kolam")
-            .update(update_data)
-            .eq("id", kolam_id)
-            .eq("user_id", user_id)
-            .execute()
+    if hasil.tidak_ditemukan:
+        logger.error(
+            f"[KOLAM] Gagal edit kolam id={kolam_id}: tidak ditemukan untuk user_id={user_id}"
         )
-
-    result = await asyncio.to_thread(db_call)
-
-    if not hasattr(result, "data") or result.data is None:
+        return None
+    if hasil.gagal:
         logger.error(
-            f"[KOLAM] Gagal update kolam id={kolam_id} untuk user_id={user_id}: {result}"
+            f"[KOLAM] Gagal update kolam id={kolam_id} untuk user_id={user_id}: {hasil.error}"
         )
         return None
 
+    invalidate_user(user_id)
     logger.info(f"[KOLAM] Kolam id={kolam_id} berhasil diperbarui user_id={user_id}")
-    return result.data[0]
+    return hasil.row
 
 
 async def delete_kolam(kolam_id: int, user_id: int):
     """
     Hapus kolam milik user tertentu
     """
-    kolam = await get_kolam_by_id(kolam_id, user_id)
-    if not kolam:
-        logger.error(
-            f"[KOLAM] Gagal hapus kolam id={kolam_id}: tidak ditemukan untuk user_id={user_id}"
-        )
-        return False
-
-    db = get_db()
+    hasil = await delete_milik("Kolam", kolam_id, user_id)
 
-    def db_call():
-        return (
-            db.table("Kolam")
-            .delete()
-            .eq("id", kolam_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-
-    result = await asyncio.to_thread(db_call)
-
-    if hasattr(result, "data") and result.data is not None:
+    if hasil.ok:
+        invalidate_user(user_id)
         logger.info(f"[KOLAM] Kolam id={kolam_id} berhasil dihapus user_id={user_id}")
         return True
 
-    logger.error(
-        f"[KOLAM] Gagal hapus kolam id={kolam_id} untuk user_id={user_id}: {result}"
-    )
+    if hasil.tidak_ditemukan:
+        logger.error(
+            f"[KOLAM] Gagal hapus kolam id={kolam_id}: tidak ditemukan untuk user_id={user_id}"
+        )
+    else:
+        logger.error(
+            f"[KOLAM] Gagal hapus kolam id={kolam_id} untuk user_id={user_id}: {hasil.error}"
+        )
     return False
 
 
@@ -195,7 +201,8 @@ def get_kolam_status(kolam_entry):
 async def update_status_kolam(user_id: int, kolam_id: int, status: str):
     """
     Update status panen kolam (belum / sudah) milik user terkait.
-    Jika status menjadi 'sudah', catat panen ke tabel Panen tanpa duplikat.
+    Jika status menjadi 'sudah', panen hari ini dicatat atomik lewat
+    services.panen.catat_panen (tanpa duplikat, satu round trip).
     """
     logger.info(
         f"[KOLAM] Request update status_panen kolam id={kolam_id} "
@@ -206,91 +213,48 @@ async def update_status_kolam(user_id: int, kolam_id: int, status: str):
         logger.error(f"[KOLAM] Status panen tidak valid: {status}")
         return None
 
-    db = get_db()
-
-    # Ambil data kolam dulu
-    kolam = await asyncio.to_thread(
-        lambda: db.table("Kolam")
-        .select("*")
-        .eq("id", kolam_id)
-        .eq("user_id", user_id)
-        .single()
-        .execute()
-    )
-
-    if not hasattr(kolam, "data") or not kolam.data:
-        logger.error(
-            f"[KOLAM] Kolam id={kolam_id} tidak ditemukan untuk user_id={user_id}"
-        )
-        return None
-
-    kolam_data = kolam.data
+    if status == "sudah":
+        try:
+            hasil = await catat_panen(
+                user_id, kolam_id, today_wib().isoformat(), jika_belum_panen=True
+            )
+        except Exception as e:
+            logger.error(
+                f"[KOLAM] Gagal catat panen kolam id={kolam_id} user_id={user_id}: {e}"
+            )
+            return None
+        if not hasil["kolam"]:
+            logger.error(
+                f"[KOLAM] Kolam id={kolam_id} tidak ditemukan untuk user_id={user_id}"
+            )
+            return None
+        invalidate_user(user_id)
+        return hasil["kolam"]
 
-    # Kalau status sama, skip
-    if kolam_data.get("status_panen") == status:
-        logger.info(
-            f"[KOLAM] Status panen kolam id={kolam_id} sudah '{status}', skip update"
-        )
-        return kolam_data
+    db = get_db()
 
-    # Update status kolam
+    # Update bersyarat: hanya mengenai baris yang statusnya memang berubah,
+    # jadi cukup satu round trip untuk kasus normal
     update_res = await asyncio.to_thread(
         lambda: db.table("Kolam")
         .update({"status_panen": status})
         .eq("id", kolam_id)
         .eq("user_id", user_id)
+        .or_(f"status_panen.is.null,status_panen.neq.{status}")
         .execute()
     )
 
-    if not hasattr(update_res, "data") or not update_res.data:
-        logger.error(
-            f"[KOLAM] Gagal update status_panen kolam id={kolam_id} user_id={user_id}"
-        )
-        return None
+    if not getattr(update_res, "data", None):
+        # Tidak ada baris berubah: kolam tidak ada, atau statusnya sudah sama
+        kolam = await get_kolam_by_id(kolam_id, user_id)
+        if kolam:
+            logger.info(
+                f"[KOLAM] Status panen kolam id={kolam_id} sudah '{status}', skip update"
+            )
+        return kolam
 
+    invalidate_user(user_id)
     logger.info(
         f"[KOLAM] Status panen kolam id={kolam_id} berhasil diubah ke '{status}'"
     )
-
-    # Jika sudah panen, catat ke tabel Panen, tapi cek dulu jangan duplikat hari ini
-    if status == "sudah":
-        today = date.today().isoformat()
-
-        # cek apakah panen hari ini sudah ada
-        exists_res = await asyncio.to_thread(
-            lambda: db.table("Panen")
-            .select("*")
-            .eq("kolam_id", kolam_id)
-            .eq("user_id", user_id)
-            .eq("tanggal_panen", today)
-            .execute()
-        )
-
-        if exists_res.data:
-            logger.info(
-                f"Panen kolam id={kolam_id} hari ini sudah tercatat, skip insert"
-            )
-        else:
-            panen_payload = {
-                "user_id": user_id,
-                "kolam_id": kolam_id,
-                "nama_kolam": kolam_data.get("nama_kolam"),
-                "tanggal_panen": today,
-                "total_berat": kolam_data.get("total_berat", 0),
-                "catatan": f"Panen otomatis pada {today}",
-            }
-
-            panen_res = await asyncio.to_thread(
-                lambda: db.table("Panen").insert(panen_payload).execute()
-            )
-
-            if hasattr(panen_res, "error") and panen_res.error:
-                logger.error(
-                    f"Gagal catat panen kolam id={kolam_id}: {panen_res.error}"
-                )
-            else:
-                logger.info(
-                    f"Panen kolam id={kolam_id} tercatat di tabel Panen tanggal={today}"
-                )
-
     return update_res.data[0]
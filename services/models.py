@@ -0,0 +1,387 @@
+# services/models.py
+# Model row ringkas (__slots__) untuk hasil query services.
+# Menggantikan dict mentah PostgREST: kira-kira sepertiga memori dict per row,
+# tanggal sudah di-parse ke `date`, dan kolom uang sudah integer rupiah.
+# Biaya bangunnya setara dict + parse kolom yang sama (lihat _benchmark di bawah),
+# tapi lebih lambat dari salinan dict mentah tanpa parse.
+#
+# Model tetap mendukung akses ala dict (row["x"], row.get("x"), dict(row)) dengan
+# semantik dict: get mengembalikan nilai tersimpan (termasuk None), kolom derived
+# yang belum diisi tidak ada di keys().
+
+import logging
+from operator import itemgetter
+
+from lib.money import rupiah
+from lib.tanggal import to_date
+
+logger = logging.getLogger("service_models")
+
+
+def _build_constructor(cls):
+    """
+    Generate konstruktor khusus per model (seperti namedtuple): semua kolom
+    tabel diambil sekaligus dengan itemgetter (C) lalu di-unpack langsung ke
+    slot, tanpa panggilan get / setattr per kolom. Row yang kolomnya tidak
+    lengkap lewat jalur get biasa. Kolom derived dibiarkan kosong sampai diisi.
+    """
+    targets = ", ".join(f"obj.{name}" for name in cls._fields)
+    lines = [
+        "def from_row(cls, row):",
+        "    obj = new(cls)",
+        "    try:",
+        f"        {targets}, = ambil(row)",
+        "    except KeyError:",
+        f"        {targets}, = map(row.get, fields)",
+    ]
+    for name in cls._date_fields:
+        lines.append(f"    obj.{name} = parse_date(obj.{name})")
+    for name in cls._money_fields:
+        lines.append(f"    obj.{name} = rupiah(obj.{name})")
+    lines += [
+        "    if len(row) == n_fields and row.keys() >= field_set:",
+        "        obj._extra = None",
+        "    else:",
+        "        obj._extra = {k: v for k, v in row.items() if k not in field_set} or None",
+        "    return obj",
+    ]
+    namespace = {
+        "new": object.__new__,
+        "ambil": itemgetter(*cls._fields),
+        "fields": cls._fields,
+        "parse_date": to_date,
+        "rupiah": rupiah,
+        "field_set": frozenset(cls._fields),
+        "n_fields": len(cls._fields),
+    }
+    exec("\n".join(lines), namespace)
+    return namespace["from_row"]
+
+
+_slot = object.__getattribute__
+
+
+class Row:
+    """
+    Basis model row. Subclass cukup mengisi:
+    - `_fields`       : kolom tabel
+    - `_derived`      : kolom tambahan yang diisi route (nama_kolam, status, ...)
+    - `_date_fields`  : kolom tanggal yang di-parse ke `date`
+    - `_money_fields` : kolom uang yang dinormalisasi ke integer rupiah
+    Kolom tak dikenal (misal kolom baru di DB, relasi embed) disimpan di `_extra`.
+    """
+
+    __slots__ = ("_extra",)
+
+    _fields: tuple = ()
+    _derived: tuple = ()
+    _date_fields: tuple = ()
+    _money_fields: tuple = ()
+    _keys: tuple = ()
+    _field_set: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = cls._fields + cls._derived
+        cls._field_set = frozenset(cls._keys)
+        cls.from_row = classmethod(_build_constructor(cls))
+
+    @classmethod
+    def from_rows(cls, rows: list | None) -> list:
+        if not rows:
+            return []
+        from_row = cls.from_row
+        return [from_row(r) for r in rows]
+
+    # ------------------------------------------------------------
+    # Protokol mapping (semantik dict)
+    # ------------------------------------------------------------
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return _slot(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __getattr__(self, key):
+        # Hanya dipanggil jika slot belum diisi / atribut tidak ada:
+        # kolom model yang belum diisi dibaca None, sisanya dicari di _extra
+        if key == "_extra":
+            raise AttributeError(key)
+        if key in self._field_set:
+            return None
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key]
+        raise AttributeError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        """Sama dengan dict.get: nilai tersimpan dikembalikan apa adanya"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = self._fields + tuple(k for k in self._derived if k in self)
+        if self._extra:
+            keys += tuple(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self) -> dict:
+        return {k: self[k] for k in self.keys()}
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        for k, v in state.items():
+            self[k] = v
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)})"
+
+
+# ============================================================
+# MODEL PER TABEL
+# ============================================================
+class Kolam(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "nama_kolam",
+        "kapasitas_bibit",
+        "tanggal_mulai",
+        "catatan",
+        "status_panen",
+        "created_at",
+    )
+    _derived = ("status", "status_label", "persentase_kematian")
+    _date_fields = ("tanggal_mulai",)
+    __slots__ = _fields + _derived
+
+
+class Bibit(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "ukuran_bibit",
+        "jumlah",
+        "total_harga",
+        "total_berat",
+        "catatan",
+        "tanggal_tebar",
+        "created_at",
+    )
+    _derived = ("nama_kolam",)
+    _date_fields = ("tanggal_tebar",)
+    _money_fields = ("total_harga",)
+    __slots__ = _fields + _derived
+
+
+class Kematian(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "tanggal",
+        "jumlah",
+        "catatan",
+        "created_at",
+    )
+    _derived = ("nama_kolam",)
+    _date_fields = ("tanggal",)
+    __slots__ = _fields + _derived
+
+
+class PemberianPakan(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "tanggal",
+        "jenis_pakan",
+        "jumlah_gram",
+        "catatan",
+        "created_at",
+    )
+    _derived = ("kolam_nama",)
+    _date_fields = ("tanggal",)
+    __slots__ = _fields + _derived
+
+
+class PakanStok(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "nama_pakan",
+        "jumlah",
+        "harga",
+        "satuan",
+        "tanggal_masuk",
+        "created_at",
+    )
+    _derived = ()
+    _date_fields = ("tanggal_masuk",)
+    _money_fields = ("harga",)
+    __slots__ = _fields + _derived
+
+
+class Pengeluaran(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "nama_pengeluaran",
+        "harga",
+        "jumlah",
+        "tanggal",
+        "catatan",
+        "created_at",
+    )
+    _derived = ("nama_kolam", "total")
+    _date_fields = ("tanggal",)
+    _money_fields = ("harga",)
+    __slots__ = _fields + _derived
+
+
+class Panen(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "siklus_id",
+        "nama_kolam",
+        "tanggal_panen",
+        "total_berat",
+        "total_jual",
+        "catatan",
+        "created_at",
+    )
+    _derived = ()
+    _date_fields = ("tanggal_panen",)
+    _money_fields = ("total_jual",)
+    __slots__ = _fields + _derived
+
+
+class Siklus(Row):
+    _fields = (
+        "id",
+        "user_id",
+        "kolam_id",
+        "tanggal_mulai",
+        "tanggal_selesai",
+        "status",
+        "ringkasan",
+        "diarsipkan_pada",
+        "created_at",
+    )
+    _derived = ()
+    _date_fields = ("tanggal_mulai", "tanggal_selesai")
+    __slots__ = _fields + _derived
+
+
+# ============================================================
+# PERBANDINGAN THROUGHPUT & MEMORI vs DICT
+# python -m services.models [jumlah_row]
+# ============================================================
+def _benchmark(n: int = 100_000):
+    import gc
+    import sys
+    import time
+    import tracemalloc
+
+    rows = [
+        {
+            "id": i,
+            "user_id": 1,
+            "kolam_id": i % 20,
+            "siklus_id": 1,
+            "ukuran_bibit": "7-9 cm",
+            "jumlah": 1000,
+            "total_harga": 150000.0,
+            "total_berat": 12.5,
+            "catatan": None,
+            "tanggal_tebar": "2025-01-15",
+            "created_at": "2025-01-15T07:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+
+    def measure(label, build):
+        # Waktu: terbaik dari 3, tanpa tracemalloc & GC (keduanya memperlambat alokasi)
+        elapsed = float("inf")
+        for _ in range(3):
+            gc.collect()
+            gc.disable()
+            start = time.perf_counter()
+            build()
+            elapsed = min(elapsed, time.perf_counter() - start)
+            gc.enable()
+        tracemalloc.start()
+        data = build()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total = sum(r.get("total_harga", 0) for r in data)
+        print(
+            f"{label:<14} build={elapsed * 1000:8.1f} ms  "
+            f"peak={peak / 1024 / 1024:7.1f} MiB  "
+            f"per_row={sys.getsizeof(data[0])} B  total={int(total)}"
+        )
+
+    def dict_parse():
+        # Pembanding setara: dict biasa dengan normalisasi kolom yang sama
+        return [
+            {
+                **r,
+                "tanggal_tebar": to_date(r["tanggal_tebar"]),
+                "total_harga": rupiah(r["total_harga"]),
+            }
+            for r in rows
+        ]
+
+    print(f"Perbandingan {n} row Bibit")
+    measure("dict copy", lambda: [dict(r) for r in rows])
+    measure("dict + parse", dict_parse)
+    measure("Bibit", lambda: Bibit.from_rows(rows))
+
+
+if __name__ == "__main__":
+    import sys
+
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -2,21 +2,35 @@
 import logging
 import asyncio
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from services.models import PakanStok
+from lib.money import rupiah
+from services.siklus import pastikan_siklus_aktif
+from services.statistik import tambah_stat, sinkron_dari_rows
+from services.tulis import update_milik, delete_milik, insert_sekali
 
 logger = logging.getLogger("service_pakan_stok")
 
 
-async def get_all_pakan_stok(user_id: int, kolam_id: int = None):
+async def get_all_pakan_stok(
+    user_id: int, kolam_id: int = None, siklus_ids: list[int] = None
+):
     """
     Ambil semua stok pakan milik user
-    Bisa difilter berdasarkan kolam_id jika disediakan
+    Bisa difilter berdasarkan kolam_id / siklus_ids jika disediakan
     """
+    if siklus_ids is not None and not siklus_ids:
+        return []
+
     db = get_db()
 
     def db_call():
         query = db.table("PakanStok").select("*").eq("user_id", user_id)
         if kolam_id:
             query = query.eq("kolam_id", kolam_id)
+        if siklus_ids is not None:
+            query = query.in_("siklus_id", siklus_ids)
         return query.execute()
 
     result = await asyncio.to_thread(db_call)
@@ -27,7 +41,7 @@ async def get_all_pakan_stok(user_id: int, kolam_id: int = None):
         )
         return []
 
-    return result.data
+    return PakanStok.from_rows(result.data)
 
 
 async def add_pakan_stok(
@@ -38,11 +52,17 @@ async def add_pakan_stok(
     kolam_id: int = None,
     tanggal_masuk: str = None,
     satuan: str = "g",
+    idem_key: str = None,
 ):
     """
     Tambah stok pakan baru dengan opsional kolam_id
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat row ganda.
     """
-    db = get_db()
+    siklus_id = await pastikan_siklus_aktif(user_id, kolam_id, tanggal_masuk)
+    if kolam_id and siklus_id is None:
+        logger.error(f"[PAKANSTOK] Siklus kolam_id={kolam_id} tidak tersedia, batal tulis")
+        return None
+
     payload = {
         "user_id": user_id,
         "nama_pakan": nama_pakan,
@@ -51,22 +71,33 @@ async def add_pakan_stok(
         "kolam_id": kolam_id,
         "tanggal_masuk": tanggal_masuk,
         "satuan": satuan,
+        "siklus_id": siklus_id,
     }
 
-    result = await asyncio.to_thread(
-        lambda: db.table("PakanStok").insert(payload).execute()
-    )
-
-    if not hasattr(result, "data") or result.data is None:
+    hasil = await insert_sekali("PakanStok", payload, idem_key)
+    if not hasil.ok:
         logger.error(
-            f"[PAKANSTOK] Gagal tambah stok user_id={user_id}, kolam_id={kolam_id}: {result}"
+            f"[PAKANSTOK] Gagal tambah stok user_id={user_id}, kolam_id={kolam_id}: "
+            f"{hasil.error}"
         )
         return None
+    if not hasil.baru:
+        logger.info(f"[PAKANSTOK] idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.rows
 
+    invalidate_user(user_id)
     logger.info(
-        f"[PAKANSTOK] Stok ditambahkan user_id={user_id}, kolam_id={kolam_id}: {result.data}"
+        f"[PAKANSTOK] Stok ditambahkan user_id={user_id}, kolam_id={kolam_id}: {hasil.rows}"
     )
-    return result.data
+    await antrian.kirim(
+        tambah_stat,
+        user_id,
+        kolam_id,
+        payload["siklus_id"],
+        biaya=rupiah(harga),
+        kunci=user_id,
+    )
+    return hasil.rows
 
 
 async def edit_pakan_stok(
@@ -82,7 +113,6 @@ async def edit_pakan_stok(
     """
     Update stok pakan milik user
     """
-    db = get_db()
     payload = {
         "nama_pakan": nama_pakan,
         "jumlah": jumlah,
@@ -92,44 +122,35 @@ async def edit_pakan_stok(
         "satuan": satuan,
     }
 
-    result = await asyncio.to_thread(
-        lambda: db.table("PakanStok")
-        .update(payload)
-        .eq("id", pakan_stok_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-
-    if not hasattr(result, "data") or result.data is None:
+    hasil = await update_milik("PakanStok", pakan_stok_id, user_id, payload)
+    if not hasil.ok:
         logger.error(
-            f"[PAKANSTOK] Gagal edit id={pakan_stok_id} user_id={user_id}, kolam_id={kolam_id}: {result}"
+            f"[PAKANSTOK] Gagal edit id={pakan_stok_id} user_id={user_id}, kolam_id={kolam_id}: "
+            f"{hasil.error or 'tidak ditemukan'}"
         )
         return None
 
+    invalidate_user(user_id)
     logger.info(
         f"[PAKANSTOK] Stok {pakan_stok_id} berhasil diedit user_id={user_id}, kolam_id={kolam_id}"
     )
-    return result.data
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    return hasil.rows
 
 
 async def delete_pakan_stok(user_id: int, pakan_stok_id: int):
     """
     Hapus stok pakan milik user
     """
-    db = get_db()
-    result = await asyncio.to_thread(
-        lambda: db.table("PakanStok")
-        .delete()
-        .eq("id", pakan_stok_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-
-    if not hasattr(result, "data") or result.data is None:
+    hasil = await delete_milik("PakanStok", pakan_stok_id, user_id)
+    if not hasil.ok:
         logger.error(
-            f"[PAKANSTOK] Gagal hapus id={pakan_stok_id} user_id={user_id}: {result}"
+            f"[PAKANSTOK] Gagal hapus id={pakan_stok_id} user_id={user_id}: "
+            f"{hasil.error or 'tidak ditemukan'}"
         )
         return False
 
+    invalidate_user(user_id)
     logger.info(f"[PAKANSTOK] Stok {pakan_stok_id} berhasil dihapus user_id={user_id}")
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
     return True
@@ -2,6 +2,13 @@
 import logging
 import asyncio
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from lib.tanggal import today_wib
+from services.models import Panen
+from services.siklus import bekukan_siklus
+from services.statistik import sinkron_dari_rows
+from services.tulis import update_milik
 
 logger = logging.getLogger("service_panen")
 
@@ -28,12 +35,53 @@ async def get_all_panen(user_id: int = None, kolam_id: int = None):
         if not getattr(result, "data", None):
             logger.info(f"Tidak ada panen untuk user_id={user_id} kolam_id={kolam_id}")
             return []
-        return result.data
+        return Panen.from_rows(result.data)
     except Exception as e:
         logger.error(f"Gagal ambil panen user_id={user_id} kolam_id={kolam_id}: {e}")
         return []
 
 
+# ============================================================
+# CATAT PANEN (ATOMIK, RPC catat_panen)
+# ============================================================
+async def catat_panen(
+    user_id: int,
+    kolam_id: int,
+    tanggal_panen: str,
+    total_berat: float = 0,
+    total_jual: float = 0,
+    catatan: str = None,
+    jika_belum_panen: bool = False,
+) -> dict:
+    """
+    Satu round trip: insert panen (unik per kolam + tanggal), status_panen kolam
+    'sudah', tutup siklus aktif, dan delta StatSiklus dalam satu transaksi DB.
+    Kembalikan {"kolam": row | None, "panen": row baru | None}; error DB dilempar.
+    Ringkasan beku siklus yang ditutup dihitung lewat antrian.
+    """
+    db = get_db()
+    params = {
+        "p_user_id": user_id,
+        "p_kolam_id": kolam_id,
+        "p_tanggal_panen": tanggal_panen,
+        "p_total_berat": total_berat or 0,
+        "p_total_jual": total_jual or 0,
+        "p_catatan": catatan,
+        "p_jika_belum_panen": jika_belum_panen,
+    }
+    result = await asyncio.to_thread(lambda: db.rpc("catat_panen", params).execute())
+    hasil = getattr(result, "data", None) or {"kolam": None, "panen": None}
+
+    if hasil.get("panen"):
+        invalidate_user(user_id)
+        logger.info(f"Panen ditambahkan user_id={user_id} kolam_id={kolam_id}")
+        # Siklus sudah ditutup RPC: ringkas sekali lalu bekukan
+        siklus_id = hasil["panen"].get("siklus_id")
+        if siklus_id:
+            await antrian.kirim(bekukan_siklus, user_id, siklus_id, kunci=kolam_id)
+    return hasil
+
+
 # ============================================================
 # TAMBAH PANEN BARU
 # ============================================================
@@ -47,75 +95,31 @@ async def create_panen(
     user_id: int = None,
 ):
     """
-    Tambah panen baru. Cek dulu apakah sudah ada panen sama di kolam untuk tanggal sama.
+    Tambah panen baru. Panen yang sudah ada di kolam untuk tanggal sama ditolak
+    oleh constraint unik (kolam_id, tanggal_panen).
     """
-    db = get_db()
     if not tanggal_panen:
-        from datetime import date
-
-        tanggal_panen = date.today().isoformat()
-
-    # --- Cek duplikat ---
-    existing = await get_all_panen(user_id=user_id, kolam_id=kolam_id)
-    for p in existing:
-        if p.get("tanggal_panen") == tanggal_panen:
-            logger.warning(
-                f"Panen sudah tercatat untuk kolam {kolam_id} tanggal {tanggal_panen}"
-            )
-            return None
-
-    payload = {
-        "user_id": user_id,
-        "kolam_id": kolam_id,
-      
-        "total_berat": total_berat,
-        "total_jual": total_jual,  # <- tambahan field
-        "catatan": catatan or f"Panen otomatis pada {tanggal_panen}",
-        "tanggal_panen": tanggal_panen,
-    }
-
-    def db_call():
-        return db.table("Panen").insert(payload).execute()
+        tanggal_panen = today_wib().isoformat()
 
     try:
-        result = await asyncio.to_thread(db_call)
-        if not getattr(result, "data", None):
-            logger.error(f"Gagal input panen user_id={user_id} kolam_id={kolam_id}")
-            return None
-
-        logger.info(f"Panen ditambahkan user_id={user_id} kolam_id={kolam_id}")
-        # update status kolam
-        await update_status_kolam(kolam_id, user_id)
-        return result.data[0]
+        hasil = await catat_panen(
+            user_id, kolam_id, tanggal_panen, total_berat, total_jual, catatan
+        )
     except Exception as e:
         logger.error(f"Error create_panen user_id={user_id} kolam_id={kolam_id}: {e}")
         return None
 
-
-# ============================================================
-# UPDATE STATUS KOLAM
-# ============================================================
-async def update_status_kolam(kolam_id: int, user_id: int):
-    db = get_db()
-
-    def db_call():
-        return (
-            db.table("Kolam")
-            .update({"status_panen": "sudah"})
-            .eq("id", kolam_id)
-            .eq("user_id", user_id)
-            .execute()
+    if not hasil["kolam"]:
+        logger.error(
+            f"Gagal input panen user_id={user_id} kolam_id={kolam_id}: kolam tidak ada"
         )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-        if getattr(result, "data", None):
-            logger.info(f"Kolam {kolam_id} status_panen diupdate jadi 'sudah'")
-            return True
-        return False
-    except Exception as e:
-        logger.error(f"Error update status kolam {kolam_id}: {e}")
-        return False
+        return None
+    if not hasil["panen"]:
+        logger.warning(
+            f"Panen sudah tercatat untuk kolam {kolam_id} tanggal {tanggal_panen}"
+        )
+        return None
+    return hasil["panen"]
 
 
 # ============================================================
@@ -130,7 +134,6 @@ async def edit_panen(
     catatan: str = None,
     tanggal_panen: str = None,
 ):
-    db = get_db()
     payload = {}
     if total_berat is not None:
         payload["total_berat"] = total_berat
@@ -145,23 +148,14 @@ async def edit_panen(
         logger.warning(f"Tidak ada field untuk update panen_id={panen_id}")
         return False
 
-    def db_call():
-        return (
-            db.table("Panen")
-            .update(payload)
-            .eq("id", panen_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-        if getattr(result, "data", None):
-            logger.info(f"Panen {panen_id} berhasil diupdate")
-            return True
-        return False
-    except Exception as e:
-        logger.error(f"Error edit_panen panen_id={panen_id}: {e}")
-        return False
-
-
+    hasil = await update_milik("Panen", panen_id, user_id, payload)
+    if hasil.ok:
+        invalidate_user(user_id)
+        logger.info(f"Panen {panen_id} berhasil diupdate")
+        await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+        return True
+    if hasil.tidak_ditemukan:
+        logger.warning(f"Panen {panen_id} tidak ditemukan untuk user_id={user_id}")
+    else:
+        logger.error(f"Error edit_panen panen_id={panen_id}: {hasil.error}")
+    return False
@@ -2,22 +2,36 @@
 # Lokasi file: services/pakan.py
 
 import logging
+from collections import defaultdict
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from services.models import PemberianPakan
+from services.siklus import pastikan_siklus_aktif, siklus_aktif_per_kolam
+from services.statistik import tambah_stat, sinkron_dari_rows
+from services.proyeksi_stok import catat_pakan
+from services.tulis import update_milik, delete_milik, insert_sekali, insert_banyak
 import asyncio
 
 logger = logging.getLogger("service_pakan")
 
 
-async def get_all_pakan(user_id: int, kolam_id: int = None):
+async def get_all_pakan(user_id: int, kolam_id: int = None, siklus_ids: list[int] = None):
     """
     Ambil semua pakan milik user tertentu.
     Jika kolam_id diberikan, ambil hanya untuk kolam tersebut.
+    Jika siklus_ids diberikan, ambil hanya untuk siklus tersebut.
     """
+    if siklus_ids is not None and not siklus_ids:
+        return []
+
     db = get_db()
     query = db.table("PemberianPakan").select("*").eq("user_id", user_id)
 
     if kolam_id:
         query = query.eq("kolam_id", kolam_id)
+    if siklus_ids is not None:
+        query = query.in_("siklus_id", siklus_ids)
 
     result = await asyncio.to_thread(query.execute)
 
@@ -25,7 +39,7 @@ async def get_all_pakan(user_id: int, kolam_id: int = None):
         logger.error(f"[PAKAN] Error ambil data user_id={user_id}: {result}")
         return []
 
-    return result.data
+    return PemberianPakan.from_rows(result.data)
 
 
 async def add_pakan(
@@ -35,11 +49,16 @@ async def add_pakan(
     jenis_pakan: str,
     jumlah_gram: float,
     catatan: str = None,
+    idem_key: str = None,
 ):
     """
     Tambah pakan untuk user tertentu
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat row ganda.
     """
-    db = get_db()
+    siklus_id = await pastikan_siklus_aktif(user_id, kolam_id, tanggal)
+    if kolam_id and siklus_id is None:
+        logger.error(f"[PAKAN] Siklus kolam_id={kolam_id} tidak tersedia, batal tulis")
+        return None
 
     payload = {
         "user_id": user_id,
@@ -48,18 +67,91 @@ async def add_pakan(
         "jenis_pakan": jenis_pakan,
         "jumlah_gram": jumlah_gram,
         "catatan": catatan,
+        "siklus_id": siklus_id,
     }
 
-    result = await asyncio.to_thread(
-        lambda: db.table("PemberianPakan").insert(payload).execute()
+    hasil = await insert_sekali("PemberianPakan", payload, idem_key)
+    if not hasil.ok:
+        logger.error(f"[PAKAN] Gagal tambah pakan user_id={user_id}: {hasil.error}")
+        return None
+    if not hasil.baru:
+        logger.info(f"[PAKAN] idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.rows
+
+    invalidate_user(user_id)
+    logger.info(f"[PAKAN] PemberianPakan ditambahkan user_id={user_id}: {hasil.rows}")
+    await antrian.kirim(
+        tambah_stat,
+        user_id,
+        kolam_id,
+        payload["siklus_id"],
+        pakan_gram=jumlah_gram,
+        kunci=user_id,
+    )
+    await antrian.kirim(
+        catat_pakan, user_id, kolam_id, tanggal, jumlah_gram, kunci=kolam_id
     )
+    return hasil.rows
 
-    if not hasattr(result, "data") or result.data is None:
-        logger.error(f"[PAKAN] Gagal tambah pakan user_id={user_id}: {result}")
+
+async def add_pakan_many(user_id: int, rows: list[dict], idem_key: str = None):
+    """
+    Tambah banyak pemberian pakan sekaligus dalam satu insert (array).
+    Tiap row: kolam_id, tanggal, jenis_pakan, jumlah_gram, catatan (opsional).
+    Semua row masuk atau tidak sama sekali.
+    `idem_key`: kiriman ulang hanya memasukkan row yang belum ada (hasil: row baru).
+    """
+    if not rows:
+        return []
+
+    tanggal_kolam = {}
+    for r in rows:
+        tanggal_kolam.setdefault(r["kolam_id"], r["tanggal"])
+    siklus_kolam = await siklus_aktif_per_kolam(user_id, tanggal_kolam)
+    if siklus_kolam is None:
+        logger.error(f"[PAKAN] Siklus tidak tersedia untuk sebagian row user_id={user_id}")
         return None
 
-    logger.info(f"[PAKAN] PemberianPakan ditambahkan user_id={user_id}: {result.data}")
-    return result.data
+    payload = [
+        {
+            "user_id": user_id,
+            "kolam_id": r["kolam_id"],
+            "tanggal": r["tanggal"],
+            "jenis_pakan": r["jenis_pakan"],
+            "jumlah_gram": r["jumlah_gram"],
+            "catatan": r.get("catatan"),
+            "siklus_id": siklus_kolam.get(r["kolam_id"]),
+        }
+        for r in rows
+    ]
+
+    hasil = await insert_banyak("PemberianPakan", payload, idem_key)
+    if hasil.gagal:
+        logger.error(
+            f"[PAKAN] Gagal tambah {len(rows)} pakan user_id={user_id}: {hasil.error}"
+        )
+        return None
+    if not hasil.baru:
+        logger.info(f"[PAKAN] idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.rows
+
+    invalidate_user(user_id)
+    logger.info(f"[PAKAN] {len(hasil.rows)} PemberianPakan ditambahkan user_id={user_id}")
+
+    # Efek samping digabung per siklus & per kolam-tanggal, bukan per row
+    gram_siklus = defaultdict(float)
+    gram_harian = defaultdict(float)
+    for row in hasil.rows:
+        gram = row.get("jumlah_gram") or 0
+        gram_siklus[(row["kolam_id"], row.get("siklus_id"))] += gram
+        gram_harian[(row["kolam_id"], row.get("tanggal"))] += gram
+    for (kolam_id, siklus_id), gram in gram_siklus.items():
+        await antrian.kirim(
+            tambah_stat, user_id, kolam_id, siklus_id, pakan_gram=gram, kunci=user_id
+        )
+    for (kolam_id, tanggal), gram in gram_harian.items():
+        await antrian.kirim(catat_pakan, user_id, kolam_id, tanggal, gram, kunci=kolam_id)
+    return hasil.rows
 
 
 async def edit_pakan(
@@ -84,43 +176,73 @@ async def edit_pakan(
         "catatan": catatan,
     }
 
-    result = await asyncio.to_thread(
+    # Nilai lama dibutuhkan proyeksi stok untuk menghitung selisih konsumsi
+    # (sekaligus cek keberadaan: tidak ada row lama berarti tidak perlu update)
+    lama = await asyncio.to_thread(
         lambda: db.table("PemberianPakan")
-        .update(payload)
+        .select("kolam_id, tanggal, jumlah_gram")
         .eq("id", pakan_id)
         .eq("user_id", user_id)
         .execute()
     )
+    lama = (getattr(lama, "data", None) or [None])[0]
+    if lama is None:
+        logger.error(f"[PAKAN] Pakan id={pakan_id} tidak ditemukan untuk user_id={user_id}")
+        return None
 
-    if not hasattr(result, "data") or result.data is None:
+    hasil = await update_milik("PemberianPakan", pakan_id, user_id, payload)
+    if not hasil.ok:
         logger.error(
-            f"[PAKAN] Gagal edit pakan id={pakan_id} user_id={user_id}: {result}"
+            f"[PAKAN] Gagal edit pakan id={pakan_id} user_id={user_id}: "
+            f"{hasil.error or 'tidak ditemukan'}"
         )
         return None
 
+    invalidate_user(user_id)
     logger.info(f"[PAKAN] PemberianPakan {pakan_id} berhasil diedit user_id={user_id}")
-    return result.data
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    await antrian.kirim(
+        catat_pakan,
+        user_id,
+        lama.get("kolam_id"),
+        lama.get("tanggal"),
+        -(lama.get("jumlah_gram") or 0),
+        kunci=lama.get("kolam_id"),
+    )
+    for row in hasil.rows:
+        await antrian.kirim(
+            catat_pakan,
+            user_id,
+            row.get("kolam_id"),
+            row.get("tanggal"),
+            row.get("jumlah_gram") or 0,
+            kunci=row.get("kolam_id"),
+        )
+    return hasil.rows
 
 
 async def delete_pakan(pakan_id: int, user_id: int):
     """
     Hapus pakan milik user tertentu
     """
-    db = get_db()
-
-    result = await asyncio.to_thread(
-        lambda: db.table("PemberianPakan")
-        .delete()
-        .eq("id", pakan_id)
-        .eq("user_id", user_id)  # Menggunakan user_id dari cookies yang sudah ada
-        .execute()
-    )
-
-    if not hasattr(result, "data") or result.data is None:
+    hasil = await delete_milik("PemberianPakan", pakan_id, user_id)
+    if not hasil.ok:
         logger.error(
-            f"[PAKAN] Gagal hapus pakan id={pakan_id} user_id={user_id}: {result}"
+            f"[PAKAN] Gagal hapus pakan id={pakan_id} user_id={user_id}: "
+            f"{hasil.error or 'tidak ditemukan'}"
         )
         return False
 
+    invalidate_user(user_id)
     logger.info(f"[PAKAN] PemberianPakan {pakan_id} berhasil dihapus user_id={user_id}")
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    for row in hasil.rows:
+        await antrian.kirim(
+            catat_pakan,
+            user_id,
+            row.get("kolam_id"),
+            row.get("tanggal"),
+            -(row.get("jumlah_gram") or 0),
+            kunci=row.get("kolam_id"),
+        )
     return True
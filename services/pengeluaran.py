@@ -2,6 +2,13 @@
 import logging
 import asyncio
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from services.models import Pengeluaran
+from lib.money import rupiah
+from services.siklus import pastikan_siklus_aktif
+from services.statistik import tambah_stat, sinkron_dari_rows
+from services.tulis import update_milik, delete_milik, insert_sekali
 
 logger = logging.getLogger("service_pengeluaran")
 
@@ -9,29 +16,33 @@ logger = logging.getLogger("service_pengeluaran")
 # ============================================================
 # AMBIL SEMUA PENGELUARAN (FILTER USER)
 # ============================================================
-async def get_all_pengeluaran(user_id: int):
+async def get_all_pengeluaran(user_id: int, siklus_ids: list[int] = None):
+    if siklus_ids is not None and not siklus_ids:
+        return []
+
     db = get_db()
 
     def db_call():
         # ambil pengeluaran beserta nama kolam
-        return (
+        query = (
             db.table("Pengeluaran")
             .select("*, Kolam(nama_kolam)")
             .eq("user_id", user_id)
-            .order("tanggal", desc=True)
-            .execute()
         )
+        if siklus_ids is not None:
+            query = query.in_("siklus_id", siklus_ids)
+        return query.order("tanggal", desc=True).execute()
 
     result = await asyncio.to_thread(db_call)
     if not getattr(result, "data", None):
         return []
 
-    # gabung nama kolam ke dict pengeluaran
+    # gabung nama kolam ke row pengeluaran
     pengeluaran_list = []
     for p in result.data:
-        kolam = p.get("Kolam") or {}  # jika None, pakai dict kosong
+        kolam = p.pop("Kolam", None) or {}  # jika None, pakai dict kosong
         p["nama_kolam"] = kolam.get("nama_kolam", "-")
-        pengeluaran_list.append(p)
+        pengeluaran_list.append(Pengeluaran.from_row(p))
 
     return pengeluaran_list
 
@@ -47,11 +58,17 @@ async def create_pengeluaran(
     jumlah: int = 1,
     catatan: str = None,
     kolam_id: int = None,  # baru
+    idem_key: str = None,
 ):
     """
     Buat entry pengeluaran baru untuk user tertentu
+    `idem_key`: insert yang diulang dengan kunci sama tidak membuat row ganda.
     """
-    db = get_db()
+    siklus_id = await pastikan_siklus_aktif(user_id, kolam_id, tanggal)
+    if kolam_id and siklus_id is None:
+        logger.error(f"Siklus kolam_id={kolam_id} tidak tersedia, batal tulis")
+        return None
+
     payload = {
         "user_id": user_id,
         "nama_pengeluaran": nama_pengeluaran,
@@ -60,24 +77,28 @@ async def create_pengeluaran(
         "jumlah": jumlah,
         "catatan": catatan,
         "kolam_id": kolam_id,  # baru
+        "siklus_id": siklus_id,
     }
 
-    def db_call():
-        return db.table("Pengeluaran").insert(payload).execute()
-
-    try:
-        result = await asyncio.to_thread(db_call)
-
-        if not getattr(result, "data", None):
-            logger.error(f"Gagal buat pengeluaran user_id={user_id}: {result}")
-            return None
-
-        logger.info(f"Pengeluaran baru ditambahkan user_id={user_id}: {result.data}")
-        return result.data[0]
-
-    except Exception as e:
-        logger.error(f"Error create_pengeluaran user_id={user_id}: {e}")
+    hasil = await insert_sekali("Pengeluaran", payload, idem_key)
+    if not hasil.ok:
+        logger.error(f"Gagal buat pengeluaran user_id={user_id}: {hasil.error}")
         return None
+    if not hasil.baru:
+        logger.info(f"Pengeluaran idem_key={idem_key} sudah tercatat user_id={user_id}")
+        return hasil.row
+
+    invalidate_user(user_id)
+    logger.info(f"Pengeluaran baru ditambahkan user_id={user_id}: {hasil.rows}")
+    await antrian.kirim(
+        tambah_stat,
+        user_id,
+        kolam_id,
+        payload["siklus_id"],
+        biaya=rupiah(harga) * (jumlah or 1),
+        kunci=user_id,
+    )
+    return hasil.row
 
 
 # ============================================================
@@ -96,7 +117,6 @@ async def update_pengeluaran(
     """
     Update pengeluaran tertentu milik user
     """
-    db = get_db()
     payload = {}
     if nama_pengeluaran is not None:
         payload["nama_pengeluaran"] = nama_pengeluaran
@@ -117,31 +137,21 @@ async def update_pengeluaran(
         )
         return None
 
-    def db_call():
-        return (
-            db.table("Pengeluaran")
-            .update(payload)
-            .eq("id", pengeluaran_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-
-        if not getattr(result, "data", None):
-            logger.warning(
-                f"Gagal update pengeluaran_id={pengeluaran_id} atau tidak ditemukan"
+    hasil = await update_milik("Pengeluaran", pengeluaran_id, user_id, payload)
+    if not hasil.ok:
+        if hasil.tidak_ditemukan:
+            logger.warning(f"Pengeluaran_id={pengeluaran_id} tidak ditemukan")
+        else:
+            logger.error(
+                f"Error update_pengeluaran pengeluaran_id={pengeluaran_id}: {hasil.error}"
             )
-            return None
-
-        logger.info(f"Pengeluaran_id={pengeluaran_id} berhasil diupdate: {result.data}")
-        return result.data[0]
-
-    except Exception as e:
-        logger.error(f"Error update_pengeluaran pengeluaran_id={pengeluaran_id}: {e}")
         return None
 
+    invalidate_user(user_id)
+    logger.info(f"Pengeluaran_id={pengeluaran_id} berhasil diupdate: {hasil.rows}")
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    return hasil.row
+
 
 # ============================================================
 # HAPUS PENGELUARAN
@@ -150,29 +160,17 @@ async def delete_pengeluaran(pengeluaran_id: int, user_id: int):
     """
     Hapus pengeluaran tertentu milik user
     """
-    db = get_db()
-
-    def db_call():
-        return (
-            db.table("Pengeluaran")
-            .delete()
-            .eq("id", pengeluaran_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-
-    try:
-        result = await asyncio.to_thread(db_call)
-
-        if not getattr(result, "data", None):
-            logger.warning(
-                f"Gagal hapus pengeluaran_id={pengeluaran_id} atau tidak ditemukan"
+    hasil = await delete_milik("Pengeluaran", pengeluaran_id, user_id)
+    if not hasil.ok:
+        if hasil.tidak_ditemukan:
+            logger.warning(f"Pengeluaran_id={pengeluaran_id} tidak ditemukan")
+        else:
+            logger.error(
+                f"Error delete_pengeluaran pengeluaran_id={pengeluaran_id}: {hasil.error}"
             )
-            return False
-
-        logger.info(f"Pengeluaran_id={pengeluaran_id} berhasil dihapus")
-        return True
-
-    except Exception as e:
-        logger.error(f"Error delete_pengeluaran pengeluaran_id={pengeluaran_id}: {e}")
         return False
+
+    invalidate_user(user_id)
+    logger.info(f"Pengeluaran_id={pengeluaran_id} berhasil dihapus")
+    await antrian.kirim(sinkron_dari_rows, user_id, hasil.rows, kunci=user_id)
+    return True
@@ -5,6 +5,12 @@ import logging
 import asyncio
 from datetime import date
 from lib.supabase_client import get_db
+from lib.cache import invalidate_user
+from lib import antrian
+from lib.tanggal import to_date
+from services.siklus import pastikan_siklus_aktif, get_siklus_aktif
+from services.statistik import tambah_stat
+from services.proyeksi_stok import catat_pakan
 
 logger = logging.getLogger("service_perhitungan_pakan")
 
@@ -14,15 +20,16 @@ logger = logging.getLogger("service_perhitungan_pakan")
 # ============================================================
 async def get_kolam_data(user_id: int):
     """
-    Ambil data kolam aktif user beserta jumlah ikan hidup,
-    total berat bibit, kebutuhan pakan harian, dan stok pakan.
+    Ambil data kolam aktif user beserta jumlah tebar, ikan hidup, berat & ukuran
+    bibit, tanggal tebar, dan stok pakan. Bibit & kematian semua kolam diambil
+    dalam satu query per tabel (bukan per kolam).
     """
     db = get_db()
 
     def db_call_kolam():
         return (
             db.table("Kolam")
-            .select("*")
+            .select("id, nama_kolam")
             .eq("user_id", user_id)
             .eq("status_panen", "belum")
             .execute()
@@ -30,73 +37,90 @@ async def get_kolam_data(user_id: int):
 
     kolam_result = await asyncio.to_thread(db_call_kolam)
     kolam_list = getattr(kolam_result, "data", []) or []
+    siklus_aktif = await get_siklus_aktif(user_id)
+    siklus_ids = [
+        siklus_aktif[k["id"]].id for k in kolam_list if k["id"] in siklus_aktif
+    ]
+
+    def fetch(table: str, columns: str):
+        return lambda: (
+            db.table(table)
+            .select(columns)
+            .eq("user_id", user_id)
+            .in_("siklus_id", siklus_ids)
+            .execute()
+            .data
+            or []
+        )
 
-    result_list = []
-
-    for kolam in kolam_list:
-        kolam_id = kolam["id"]
-
-        # ambil bibit per kolam
-        def db_call_bibit():
-            return (
-                db.table("Bibit")
-                .select("*")
-                .eq("kolam_id", kolam_id)
-                .eq("user_id", user_id)
-                .execute()
-            )
-
-        bibit_result = await asyncio.to_thread(db_call_bibit)
-        bibit_list = getattr(bibit_result, "data", []) or []
-
-        total_ikan = sum(b["jumlah"] for b in bibit_list)
-        total_berat = sum(b.get("total_berat", 0) for b in bibit_list)  # kg
-
-        # ambil kematian per kolam
-        def db_call_kematian():
-            return (
-                db.table("Kematian")
-                .select("*")
-                .eq("kolam_id", kolam_id)
-                .eq("user_id", user_id)
-                .execute()
-            )
-
-        kematian_result = await asyncio.to_thread(db_call_kematian)
-        kematian_list = getattr(kematian_result, "data", []) or []
+    def db_call_stok():
+        return (
+            db.table("PakanStok")
+            .select("jumlah, satuan")
+            .eq("user_id", user_id)
+            .execute()
+        )
 
-        total_mati = sum(k["jumlah"] for k in kematian_list)
-        total_ikan_hidup = max(total_ikan - total_mati, 0)
+    if siklus_ids:
+        bibit_list, kematian_list = await asyncio.gather(
+            asyncio.to_thread(
+                fetch("Bibit", "siklus_id, jumlah, total_berat, ukuran_bibit, tanggal_tebar")
+            ),
+            asyncio.to_thread(fetch("Kematian", "siklus_id, jumlah")),
+        )
+    else:
+        bibit_list, kematian_list = [], []
 
-        # hitung kebutuhan pakan (misal 5% dari total berat)
-        kebutuhan_pakan_gram = total_berat * 1000 * 0.05  # kg -> gram
+    stok_result = await asyncio.to_thread(db_call_stok)
+    total_stok_gram = 0
+    for s in getattr(stok_result, "data", []) or []:
+        jumlah = float(s["jumlah"])
+        if (s.get("satuan") or "g") == "kg":
+            jumlah *= 1000
+        total_stok_gram += jumlah
 
-        # ambil stok pakan
-        def db_call_stok():
-            return (
-                db.table("PakanStok")
-                .select("jumlah, satuan")
-                .eq("user_id", user_id)
-                .execute()
-            )
+    # Agregasi per siklus
+    bibit_per_siklus = {}
+    for b in bibit_list:
+        t = bibit_per_siklus.setdefault(
+            b["siklus_id"], {"jumlah": 0, "berat": 0.0, "ukuran": {}, "tanggal": None}
+        )
+        t["jumlah"] += b.get("jumlah") or 0
+        t["berat"] += b.get("total_berat") or 0
+        # Ukuran dominan (terbanyak ekornya) mewakili kolam
+        ukuran = b.get("ukuran_bibit")
+        t["ukuran"][ukuran] = t["ukuran"].get(ukuran, 0) + (b.get("jumlah") or 0)
+        tanggal = to_date(b.get("tanggal_tebar"))
+        if tanggal and (t["tanggal"] is None or tanggal < t["tanggal"]):
+            t["tanggal"] = tanggal
+
+    mati_per_siklus = {}
+    for k in kematian_list:
+        mati_per_siklus[k["siklus_id"]] = (
+            mati_per_siklus.get(k["siklus_id"], 0) + (k.get("jumlah") or 0)
+        )
 
-        stok_result = await asyncio.to_thread(db_call_stok)
-        stok_list = getattr(stok_result, "data", []) or []
+    result_list = []
+    for kolam in kolam_list:
+        kolam_id = kolam["id"]
+        siklus = siklus_aktif.get(kolam_id)
+        if not siklus:
+            logger.info(f"[USER {user_id}] Kolam {kolam_id} tanpa siklus aktif, skip")
+            continue
 
-        total_stok_gram = 0
-        for s in stok_list:
-            jumlah = float(s["jumlah"])
-            if (s.get("satuan") or "g") == "kg":
-                jumlah *= 1000
-            total_stok_gram += jumlah
+        bibit = bibit_per_siklus.get(siklus.id, {})
+        total_ikan = bibit.get("jumlah", 0)
+        ukuran = bibit.get("ukuran") or {}
 
         result_list.append(
             {
                 "id": kolam_id,
                 "nama_kolam": kolam["nama_kolam"],
-                "jumlah_ikan_hidup": total_ikan_hidup,
-                "total_berat_kg": total_berat,
-                "kebutuhan_pakan_gram": kebutuhan_pakan_gram,
+                "jumlah_tebar": total_ikan,
+                "jumlah_ikan_hidup": max(total_ikan - mati_per_siklus.get(siklus.id, 0), 0),
+                "total_berat_kg": bibit.get("berat", 0.0),  # berat saat tebar
+                "ukuran_bibit": max(ukuran, key=ukuran.get) if ukuran else None,
+                "tanggal_tebar": bibit.get("tanggal") or siklus.tanggal_mulai,
                 "stok_pakan": total_stok_gram,
             }
         )
@@ -120,6 +144,11 @@ async def create_pemberian_pakan(
     Buat record PemberianPakan otomatis
     """
     db = get_db()
+    siklus_id = await pastikan_siklus_aktif(user_id, kolam_id, tanggal)
+    if kolam_id and siklus_id is None:
+        logger.error(f"[USER {user_id}] Siklus kolam {kolam_id} tidak tersedia, batal tulis")
+        return False
+
     payload = {
         "user_id": user_id,
         "kolam_id": kolam_id,
@@ -127,6 +156,7 @@ async def create_pemberian_pakan(
         "jenis_pakan": jenis_pakan,
         "jumlah_gram": jumlah_gram,
         "catatan": catatan,
+        "siklus_id": siklus_id,
     }
 
     def db_call():
@@ -135,9 +165,21 @@ async def create_pemberian_pakan(
     try:
         result = await asyncio.to_thread(db_call)
         if getattr(result, "data", None):
+            invalidate_user(user_id)
             logger.info(
                 f"[USER {user_id}] PemberianPakan kolam {kolam_id} {jumlah_gram}g berhasil dibuat"
             )
+            await antrian.kirim(
+                tambah_stat,
+                user_id,
+                kolam_id,
+                payload["siklus_id"],
+                pakan_gram=jumlah_gram,
+                kunci=user_id,
+            )
+            await antrian.kirim(
+                catat_pakan, user_id, kolam_id, tanggal, jumlah_gram, kunci=kolam_id
+            )
             return True
         else:
             logger.warning(
@@ -204,22 +246,6 @@ async def update_pakan_stok(user_id: int, jumlah_keluar: float):
 
             await asyncio.to_thread(db_delete)
 
+    invalidate_user(user_id)
     logger.info(f"[USER {user_id}] Update PakanStok, dikurangi {jumlah_keluar}g")
     return True
-
-
-def get_persen_pakan(ukuran_bibit: str) -> float:
-    """
-    Tentuin persentase pakan harian berdasarkan ukuran bibit.
-    ukuran_bibit contoh: '5-7 cm', '7-9 cm', '8-12 cm', '>13 cm'
-    """
-    if "5-7" in ukuran_bibit:
-        return 6  # 5-7% rata-rata
-    elif "7-9" in ukuran_bibit:
-        return 6  # sama kayak benih kecil
-    elif "8-12" in ukuran_bibit:
-        return 4  # 3-5% rata-rata
-    elif "13" in ukuran_bibit or ">" in ukuran_bibit:
-        return 2.5  # 2-3% rata-rata
-    else:
-        return 3  # default kalau unknown
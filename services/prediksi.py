@@ -0,0 +1,294 @@
+# services/prediksi.py
+# Prediksi panen per kolam aktif: fit kurva pertumbuhan (von Bertalanffy)
+# dari data tebar bibit, pakan kumulatif, dan kematian, lalu proyeksikan
+# tanggal panen, biomassa, dan estimasi pendapatan.
+#
+# Semua kolam di-fit sekaligus dengan NumPy (satu pass, tanpa loop per kolam),
+# hasilnya di-cache per user, versi data, & hari: in-process dan di disk
+# (DiskCache), supaya hasil batch malam terbaca semua worker.
+
+import os
+import math
+import logging
+import asyncio
+from datetime import date, timedelta
+
+import numpy as np
+
+from lib.cache import TTLCache
+from lib.cache_disk import DiskCache
+from lib.money import rupiah
+from lib.tanggal import today_wib, umur_hari, selisih_hari
+from services.kolam import get_all_kolam
+from services.bibit import get_all_bibit
+from services.kematian import get_all_kematian
+from services.pemberian_pakan import get_all_pakan
+from services.panen import get_all_panen
+from services.siklus import get_siklus_aktif
+from services.statistik import FCR_ASUMSI
+from services.user import get_versi_data
+
+logger = logging.getLogger("service_prediksi")
+
+# Parameter biologis lele (bisa di-override lewat env)
+BERAT_MAKS_GRAM = float(os.getenv("PREDIKSI_BERAT_MAKS_GRAM", "1000"))  # W-inf
+TARGET_BERAT_GRAM = float(os.getenv("PREDIKSI_TARGET_GRAM", "125"))  # 8 ekor/kg
+BERAT_BIBIT_DEFAULT_GRAM = 5.0
+HARGA_JUAL_DEFAULT = int(os.getenv("PREDIKSI_HARGA_PER_KG", "22000"))
+
+# Laju pertumbuhan default: 5 g -> 125 g dalam ~90 hari
+K_DEFAULT = math.log(
+    (1 - (BERAT_BIBIT_DEFAULT_GRAM / BERAT_MAKS_GRAM) ** (1 / 3))
+    / (1 - (TARGET_BERAT_GRAM / BERAT_MAKS_GRAM) ** (1 / 3))
+) / 90
+# Minimal titik data pakan supaya hasil fit dipakai (kalau kurang -> K_DEFAULT)
+MIN_TITIK_FIT = 3
+
+# Hasil prediksi per (user, versi data, hari); tulis data baru menaikkan versi
+_prediksi_cache = TTLCache("prediksi", ttl=6 * 3600, maxsize=512)
+_prediksi_disk = DiskCache("prediksi")
+
+
+# ============================================================
+# FIT & PROYEKSI (MURNI NUMPY, TANPA I/O)
+# ============================================================
+def _a(berat_gram: np.ndarray) -> np.ndarray:
+    """Bentuk linier von Bertalanffy: a = 1 - (w / W-inf)^(1/3)"""
+    rasio = np.clip(berat_gram / BERAT_MAKS_GRAM, 1e-6, 0.999)
+    return 1 - np.cbrt(rasio)
+
+
+def fit_pertumbuhan(
+    n0: np.ndarray,
+    berat_awal_gram: np.ndarray,
+    umur: np.ndarray,
+    mati: np.ndarray,
+    titik_kolam: np.ndarray,
+    titik_hari: np.ndarray,
+    titik_gram: np.ndarray,
+) -> dict:
+    """
+    Fit laju pertumbuhan k per kolam (K kolam sekaligus).
+
+    Per kolam : n0 (ekor tebar), berat_awal_gram, umur (hari), mati (ekor)
+    Per titik : pemberian pakan -> index kolam, hari sejak tebar, gram pakan
+
+    Berat rata-rata di tiap titik diestimasi dari biomassa awal + pakan kumulatif / FCR
+    dibagi ekor hidup, lalu k di-fit least squares pada bentuk linier
+    ln(a0 / a(t)) = k * t.
+    """
+    K = len(n0)
+    n0 = np.maximum(n0, 1.0)
+
+    # Laju kematian harian (eksponensial) dari total kematian sampai hari ini
+    hidup = np.clip(n0 - mati, 1.0, None)
+    m = np.where(umur > 0, np.log(n0 / hidup) / np.maximum(umur, 1), 0.0)
+
+    a0 = _a(berat_awal_gram)
+
+    # Pakan kumulatif per kolam (urut kolam lalu hari), tanpa loop Python
+    k_fit = np.full(K, K_DEFAULT)
+    jumlah_titik = np.zeros(K, dtype=np.int64)
+    if len(titik_kolam):
+        order = np.lexsort((titik_hari, titik_kolam))
+        idx = titik_kolam[order]
+        hari = titik_hari[order].astype(float)
+        gram = titik_gram[order].astype(float)
+
+        cs = np.cumsum(gram)
+        awal_grup = np.r_[True, idx[1:] != idx[:-1]]
+        basis = np.zeros(K)
+        basis[idx[awal_grup]] = (cs - gram)[awal_grup]
+        kumulatif = cs - basis[idx]
+
+        ekor = n0[idx] * np.exp(-m[idx] * hari)
+        berat = (n0[idx] * berat_awal_gram[idx] + kumulatif / FCR_ASUMSI) / ekor
+
+        valid = hari > 0
+        y = np.log(a0[idx] / _a(berat))
+        sxy = np.bincount(idx[valid], (hari * y)[valid], minlength=K)
+        sxx = np.bincount(idx[valid], (hari * hari)[valid], minlength=K)
+        jumlah_titik = np.bincount(idx[valid], minlength=K)
+
+        cukup = (jumlah_titik >= MIN_TITIK_FIT) & (sxx > 0)
+        k_fit = np.where(cukup, sxy / np.where(sxx > 0, sxx, 1), K_DEFAULT)
+        # Jaga dari data pakan yang ngawur (misal salah input satuan)
+        k_fit = np.clip(k_fit, K_DEFAULT / 4, K_DEFAULT * 4)
+
+    # Proyeksi
+    berat_kini = BERAT_MAKS_GRAM * (1 - a0 * np.exp(-k_fit * umur)) ** 3
+    a_target = 1 - (TARGET_BERAT_GRAM / BERAT_MAKS_GRAM) ** (1 / 3)
+    hari_panen = np.where(a0 > a_target, np.log(a0 / a_target) / k_fit, 0.0)
+    hari_panen = np.maximum(hari_panen, umur)
+    ekor_panen = n0 * np.exp(-m * hari_panen)
+
+    return {
+        "k": k_fit,
+        "laju_mati": m,
+        "jumlah_titik": jumlah_titik,
+        "ekor_hidup": hidup,
+        "berat_kini_gram": berat_kini,
+        "biomassa_kini_kg": hidup * berat_kini / 1000,
+        "hari_panen": hari_panen,
+        "ekor_panen": ekor_panen,
+        "biomassa_panen_kg": ekor_panen * TARGET_BERAT_GRAM / 1000,
+    }
+
+
+# ============================================================
+# SUSUN INPUT DARI ROW SERVICES
+# ============================================================
+def _harga_per_kg(panen_list: list) -> int:
+    """Harga jual rata-rata dari riwayat panen user, fallback ke default"""
+    total_berat = sum(p.get("total_berat", 0) for p in panen_list)
+    total_jual = sum(p.get("total_jual", 0) for p in panen_list)
+    if total_berat > 0 and total_jual > 0:
+        return rupiah(total_jual / total_berat)
+    return HARGA_JUAL_DEFAULT
+
+
+def hitung_prediksi(
+    kolam_list: list,
+    bibit_list: list,
+    kematian_list: list,
+    pakan_list: list,
+    harga_per_kg: int,
+    today: date,
+) -> dict:
+    """
+    Prediksi semua kolam aktif dari row yang sudah diambil (tanpa I/O).
+    Mengembalikan map kolam_id -> dict prediksi.
+    """
+    # Kolam aktif yang punya bibit di siklus berjalan
+    tebar = {}
+    for b in bibit_list:
+        kolam_id = b.get("kolam_id")
+        t = tebar.setdefault(kolam_id, {"jumlah": 0, "berat_kg": 0.0, "tanggal": None})
+        t["jumlah"] += b.get("jumlah", 0)
+        t["berat_kg"] += b.get("total_berat", 0)
+        tgl = b.get("tanggal_tebar")
+        if tgl and (t["tanggal"] is None or tgl < t["tanggal"]):
+            t["tanggal"] = tgl
+
+    kolam_aktif = [
+        k
+        for k in kolam_list
+        if (k.get("status_panen") or "belum") == "belum"
+        and tebar.get(k["id"], {}).get("jumlah")
+        and tebar[k["id"]]["tanggal"]
+    ]
+    if not kolam_aktif:
+        return {}
+
+    posisi = {k["id"]: i for i, k in enumerate(kolam_aktif)}
+    K = len(kolam_aktif)
+
+    n0 = np.empty(K)
+    berat_awal = np.empty(K)
+    umur = np.empty(K)
+    for k in kolam_aktif:
+        i = posisi[k["id"]]
+        t = tebar[k["id"]]
+        n0[i] = t["jumlah"]
+        berat_awal[i] = (
+            t["berat_kg"] * 1000 / t["jumlah"] if t["berat_kg"] else BERAT_BIBIT_DEFAULT_GRAM
+        )
+        umur[i] = umur_hari(t["tanggal"], today)
+
+    mati = np.zeros(K)
+    for km in kematian_list:
+        i = posisi.get(km.get("kolam_id"))
+        if i is not None:
+            mati[i] += km.get("jumlah", 0)
+
+    titik = []
+    for p in pakan_list:
+        i = posisi.get(p.get("kolam_id"))
+        if i is None or not p.get("tanggal"):
+            continue
+        hari = selisih_hari(tebar[p.get("kolam_id")]["tanggal"], p.get("tanggal"))
+        titik.append((i, hari, p.get("jumlah_gram", 0)))
+    if titik:
+        arr = np.array(titik, dtype=float)
+        titik_kolam, titik_hari, titik_gram = arr[:, 0].astype(np.int64), arr[:, 1], arr[:, 2]
+    else:
+        titik_kolam = np.empty(0, dtype=np.int64)
+        titik_hari = titik_gram = np.empty(0)
+
+    fit = fit_pertumbuhan(n0, berat_awal, umur, mati, titik_kolam, titik_hari, titik_gram)
+
+    hasil = {}
+    for k in kolam_aktif:
+        i = posisi[k["id"]]
+        tanggal_tebar = tebar[k["id"]]["tanggal"]
+        hari_panen = int(math.ceil(fit["hari_panen"][i]))
+        biomassa_panen = float(fit["biomassa_panen_kg"][i])
+        hasil[k["id"]] = {
+            "kolam_id": k["id"],
+            "nama_kolam": k.get("nama_kolam", "-"),
+            "tanggal_tebar": tanggal_tebar,
+            "umur_hari": int(umur[i]),
+            "jumlah_tebar": int(n0[i]),
+            "ekor_hidup": int(fit["ekor_hidup"][i]),
+            "berat_awal_gram": round(float(berat_awal[i]), 1),
+            "berat_kini_gram": round(float(fit["berat_kini_gram"][i]), 1),
+            "biomassa_kini_kg": round(float(fit["biomassa_kini_kg"][i]), 1),
+            "laju_k": float(fit["k"][i]),
+            "laju_mati": float(fit["laju_mati"][i]),
+            "dari_data_pakan": bool(fit["jumlah_titik"][i] >= MIN_TITIK_FIT),
+            "tanggal_panen": tanggal_tebar + timedelta(days=hari_panen),
+            "sisa_hari": max(hari_panen - int(umur[i]), 0),
+            "ekor_panen": int(fit["ekor_panen"][i]),
+            "biomassa_panen_kg": round(biomassa_panen, 1),
+            "harga_per_kg": harga_per_kg,
+            "estimasi_pendapatan": rupiah(biomassa_panen * harga_per_kg),
+        }
+    return hasil
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+async def get_prediksi(user_id: int, today: date | None = None) -> dict:
+    """
+    Prediksi panen semua kolam aktif user (map kolam_id -> prediksi).
+    Di-cache per user, versi data & tanggal (in-process, lalu disk).
+    """
+    today = today or today_wib()
+    versi = await get_versi_data(user_id)
+    key = (user_id, versi, today)
+    if versi is not None:
+        cached = _prediksi_cache.get(key)
+        if cached is None:
+            cached = _prediksi_disk.get(user_id, key)
+            if cached is not None:
+                _prediksi_cache.set(key, cached)
+        if cached is not None:
+            return cached
+
+    aktif = await get_siklus_aktif(user_id)
+    siklus_ids = [s.id for s in aktif.values()]
+
+    kolam_list, bibit_list, kematian_list, pakan_list, panen_list = await asyncio.gather(
+        get_all_kolam(user_id),
+        get_all_bibit(user_id, siklus_ids=siklus_ids),
+        get_all_kematian(user_id, siklus_ids=siklus_ids),
+        get_all_pakan(user_id, siklus_ids=siklus_ids),
+        get_all_panen(user_id),
+    )
+
+    hasil = await asyncio.to_thread(
+        hitung_prediksi,
+        kolam_list,
+        bibit_list,
+        kematian_list,
+        pakan_list,
+        _harga_per_kg(panen_list),
+        today,
+    )
+    logger.info(f"[PREDIKSI] {len(hasil)} kolam diprediksi user_id={user_id}")
+
+    if versi is not None:
+        _prediksi_cache.set(key, hasil)
+        _prediksi_disk.set(user_id, key, hasil)
+    return hasil
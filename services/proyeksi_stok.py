@@ -0,0 +1,237 @@
+# services/proyeksi_stok.py
+# Proyeksi hari-sampai-habis stok pakan, per kolam dan per lot (row PakanStok).
+#
+# Konsumsi harian per kolam disimpan di StatPakan sebagai jendela bergulir
+# {tanggal: gram} (maks. SIMPAN_HARI entri, jadi state per kolam O(1)) dan
+# diperbarui atomik di DB (RPC tambah_stat_pakan, migrations/012) setiap
+# PemberianPakan ditulis. Proyeksi hanya membaca row state itu
+# + stok saat ini, lalu di-cache per user & versi data.
+#
+# Row PakanStok tidak dipotong saat pakan diberikan (update_pakan_stok hanya
+# dipakai route perhitungan_pakan yang tidak di-mount), jadi `jumlah` adalah
+# jumlah masuk. Sisa stok dihitung di sini dari PemberianPakan sejak lot masuk.
+
+import asyncio
+import logging
+from datetime import date, timedelta
+
+from lib.supabase_client import get_db
+from lib.cache import TTLCache
+from lib.tanggal import to_date, today_wib
+from services.pakan_stok import get_all_pakan_stok
+from services.user import get_versi_data
+
+logger = logging.getLogger("service_proyeksi_stok")
+
+# Rata-rata konsumsi dihitung dari sekian hari terakhir
+RATA_HARI = 7
+# Entri harian yang disimpan per kolam (sisanya dibuang)
+SIMPAN_HARI = 14
+# Ambang peringatan di dashboard
+HARI_KRITIS = 7
+
+_proyeksi_cache = TTLCache("proyeksi_stok", ttl=600, maxsize=1024)
+
+
+# ============================================================
+# JENDELA KONSUMSI (MURNI, TANPA I/O)
+# ============================================================
+def rata_harian(harian: dict, today: date) -> float:
+    """
+    Rata-rata gram/hari dalam RATA_HARI terakhir. Hari tanpa catatan dihitung 0,
+    tapi jendela dipendekkan kalau catatan pertama lebih baru (kolam baru tebar).
+    """
+    awal = (today - timedelta(days=RATA_HARI - 1)).isoformat()
+    dalam_jendela = {k: v for k, v in harian.items() if awal <= k <= today.isoformat()}
+    if not dalam_jendela:
+        return 0.0
+    pertama = to_date(min(dalam_jendela))
+    hari = min(RATA_HARI, (today - pertama).days + 1)
+    return sum(dalam_jendela.values()) / max(hari, 1)
+
+
+def _ke_gram(stok) -> float:
+    jumlah = float(stok.get("jumlah", 0))
+    return jumlah * 1000 if (stok.get("satuan") or "g") == "kg" else jumlah
+
+
+def sisa_stok(stok_list: list, pakan_rows: list) -> dict:
+    """
+    Sisa gram per lot (id -> gram) setelah dikurangi pemberian pakan yang tercatat.
+    Tiap pemberian memotong FIFO (tanggal_masuk) lot kolamnya dulu, lalu lot
+    bersama (tanpa kolam_id), hanya dari lot yang sudah masuk pada tanggal itu.
+    Pemberian yang melebihi stok tidak membuat sisa negatif.
+    """
+    lots = sorted(stok_list, key=lambda s: str(s.get("tanggal_masuk") or ""))
+    sisa = {s["id"]: _ke_gram(s) for s in lots}
+    masuk = {s["id"]: to_date(s.get("tanggal_masuk")) or date.min for s in lots}
+    bersama = [s["id"] for s in lots if not s.get("kolam_id")]
+    urutan = {}
+    for s in lots:
+        if s.get("kolam_id"):
+            urutan.setdefault(s["kolam_id"], []).append(s["id"])
+
+    for p in sorted(pakan_rows, key=lambda p: str(p.get("tanggal") or "")):
+        gram = float(p.get("jumlah_gram") or 0)
+        tanggal = to_date(p.get("tanggal"))
+        if gram <= 0 or tanggal is None:
+            continue
+        for lot_id in urutan.get(p.get("kolam_id"), []) + bersama:
+            if masuk[lot_id] > tanggal or sisa[lot_id] <= 0:
+                continue
+            potong = min(gram, sisa[lot_id])
+            sisa[lot_id] -= potong
+            gram -= potong
+            if gram <= 0:
+                break
+    return sisa
+
+
+def hitung_proyeksi(
+    stat_rows: list, stok_list: list, today: date, pakan_rows: list = ()
+) -> dict:
+    """
+    Proyeksi dari state konsumsi + sisa stok (stok masuk dikurangi `pakan_rows`).
+    - per kolam: (stok kolam + bagian stok bersama) / rata-rata konsumsi kolam.
+                 Stok tanpa kolam_id dipakai bersama semua kolam (update_pakan_stok
+                 memotong FIFO dari seluruh stok user), dibagi sebanding konsumsi
+                 kolam, jadi stok bersama habis di hari yang sama untuk semua kolam.
+    - per lot  : FIFO tanggal_masuk (urutan yang sama dengan update_pakan_stok)
+                 terhadap total konsumsi harian semua kolam
+    """
+    konsumsi = {r["kolam_id"]: rata_harian(r.get("harian") or {}, today) for r in stat_rows}
+    total_harian = sum(konsumsi.values())
+    sisa = sisa_stok(stok_list, pakan_rows)
+
+    stok_kolam = {}
+    stok_bersama = 0.0
+    for s in stok_list:
+        if s.get("kolam_id"):
+            stok_kolam[s["kolam_id"]] = stok_kolam.get(s["kolam_id"], 0) + sisa[s["id"]]
+        else:
+            stok_bersama += sisa[s["id"]]
+
+    per_kolam = {}
+    for kolam_id in set(konsumsi) | set(stok_kolam):
+        harian = konsumsi.get(kolam_id, 0.0)
+        bagian = stok_bersama * harian / total_harian if total_harian > 0 else 0.0
+        stok = stok_kolam.get(kolam_id, 0.0) + bagian
+        hari = stok / harian if harian > 0 else None
+        per_kolam[kolam_id] = {
+            "kolam_id": kolam_id,
+            "konsumsi_harian_gram": round(harian),
+            "stok_gram": round(stok_kolam.get(kolam_id, 0.0)),
+            "stok_bersama_gram": round(bagian),
+            "hari_sampai_habis": int(hari) if hari is not None else None,
+            "tanggal_habis": today + timedelta(days=int(hari)) if hari is not None else None,
+        }
+
+    per_lot = {}
+    kumulatif = 0.0
+    for s in sorted(stok_list, key=lambda s: str(s.get("tanggal_masuk") or "")):
+        kumulatif += sisa[s["id"]]
+        if sisa[s["id"]] <= 0:
+            hari = 0  # lot sudah habis terpakai
+        else:
+            hari = kumulatif / total_harian if total_harian > 0 else None
+        per_lot[s["id"]] = {
+            "sisa_gram": round(sisa[s["id"]]),
+            "hari_sampai_habis": int(hari) if hari is not None else None,
+            "tanggal_habis": today + timedelta(days=int(hari)) if hari is not None else None,
+        }
+
+    return {
+        "per_kolam": per_kolam,
+        "per_lot": per_lot,
+        "konsumsi_harian_gram": round(total_harian),
+        "hari_sampai_habis": (
+            int(kumulatif / total_harian) if total_harian > 0 else None
+        ),
+    }
+
+
+# ============================================================
+# HOOK DARI SERVICES PEMBERIAN PAKAN
+# ============================================================
+async def catat_pakan(user_id: int, kolam_id: int | None, tanggal, delta_gram: float):
+    """
+    Perbarui jendela konsumsi kolam untuk satu perubahan PemberianPakan
+    (atomik di DB, aman dipanggil paralel dari beberapa worker).
+    Dijalankan lewat lib.antrian; error dilempar supaya dicoba ulang.
+    """
+    tanggal = to_date(tanggal)
+    if not kolam_id or tanggal is None or not delta_gram:
+        return
+
+    db = get_db()
+    params = {
+        "p_user_id": user_id,
+        "p_kolam_id": kolam_id,
+        "p_tanggal": tanggal.isoformat(),
+        "p_delta_gram": float(delta_gram),
+        "p_today": today_wib().isoformat(),
+        "p_simpan_hari": SIMPAN_HARI,
+    }
+    await asyncio.to_thread(lambda: db.rpc("tambah_stat_pakan", params).execute())
+    # Tugas antrian selesai setelah invalidate_user request; buang cache yang sempat terisi
+    _proyeksi_cache.invalidate_user(user_id)
+
+
+# ============================================================
+# AMBIL PROYEKSI
+# ============================================================
+async def _pakan_sejak(user_id: int, stok_list: list) -> list:
+    """Pemberian pakan user sejak lot stok tertua masuk (kolom minimal)"""
+    if not stok_list:
+        return []
+    tanggal_masuk = [to_date(s.get("tanggal_masuk")) for s in stok_list]
+    db = get_db()
+
+    def db_call():
+        query = (
+            db.table("PemberianPakan")
+            .select("kolam_id, tanggal, jumlah_gram")
+            .eq("user_id", user_id)
+        )
+        if None not in tanggal_masuk:
+            query = query.gte("tanggal", min(tanggal_masuk).isoformat())
+        return query.execute()
+
+    return getattr(await asyncio.to_thread(db_call), "data", None) or []
+
+
+async def get_proyeksi_stok(user_id: int, today: date | None = None) -> dict:
+    """Proyeksi stok user (cache per user, versi data & hari)"""
+    today = today or today_wib()
+    versi = await get_versi_data(user_id)
+    key = (user_id, versi, today)
+    if versi is not None:
+        cached = _proyeksi_cache.get(key)
+        if cached is not None:
+            return cached
+
+    db = get_db()
+
+    def db_call():
+        return (
+            db.table("StatPakan")
+            .select("kolam_id, harian")
+            .eq("user_id", user_id)
+            .execute()
+        )
+
+    try:
+        result, stok_list = await asyncio.gather(
+            asyncio.to_thread(db_call), get_all_pakan_stok(user_id)
+        )
+        pakan_rows = await _pakan_sejak(user_id, stok_list)
+    except Exception as e:
+        logger.error(f"[PROYEKSI] Gagal ambil data proyeksi user_id={user_id}: {e}")
+        return {"per_kolam": {}, "per_lot": {}, "konsumsi_harian_gram": 0, "hari_sampai_habis": None}
+
+    proyeksi = hitung_proyeksi(
+        getattr(result, "data", None) or [], stok_list, today, pakan_rows
+    )
+    if versi is not None:
+        _proyeksi_cache.set(key, proyeksi)
+    return proyeksi
@@ -0,0 +1,153 @@
+# services/ransum.py
+# Mesin ransum pakan harian berbasis model pertumbuhan.
+#
+# Berat rata-rata ikan diestimasi dari berat tebar + umur memakai tabel
+# pertumbuhan baku (kurva von Bertalanffy yang sama dengan services.prediksi),
+# ekor hidup dari tebar - kematian, lalu persentase pakan diambil dari tabel
+# feeding rate per kelas berat. Semua tabel dihitung sekali saat import dan
+# ransum seluruh kolam dihitung dalam satu operasi NumPy (tanpa loop per kolam).
+
+import re
+import math
+import logging
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+
+from lib.tanggal import to_date, umur_hari
+from services.prediksi import BERAT_MAKS_GRAM, BERAT_BIBIT_DEFAULT_GRAM, K_DEFAULT
+
+logger = logging.getLogger("service_ransum")
+
+# Pilihan ukuran bibit di form (dipakai juga routes/bibit.py)
+UKURAN_BIBIT = (
+    "2-3 cm",
+    "3-4 cm",
+    "3-5 cm",
+    "4-6 cm",
+    "4-7 cm",
+    "5-7 cm",
+    "6-8 cm",
+    "7-9 cm",
+    "9-12 cm",
+)
+
+# Hubungan panjang-berat lele: W (gram) = A * L (cm) ^ B
+PANJANG_BERAT_A = 0.0085
+PANJANG_BERAT_B = 3.0
+
+# Feeding rate (% biomassa per hari) per kelas berat rata-rata (gram):
+# berat < 3 g -> 8%, 3-10 g -> 6%, ..., >= 200 g -> 2%
+KELAS_BERAT_GRAM = np.array([3, 10, 25, 50, 100, 200], dtype=float)
+PERSEN_PAKAN = np.array([8.0, 6.0, 5.0, 4.0, 3.0, 2.5, 2.0])
+
+# Tabel pertumbuhan baku: berat rata-rata per hari sejak berat referensi
+BERAT_REFERENSI_GRAM = 0.5
+MAKS_HARI_TABEL = 730
+
+
+def _tabel_pertumbuhan() -> np.ndarray:
+    """Berat (gram) hari ke-0..MAKS_HARI_TABEL dari berat referensi, laju K_DEFAULT"""
+    a0 = 1 - math.pow(BERAT_REFERENSI_GRAM / BERAT_MAKS_GRAM, 1 / 3)
+    t = np.arange(MAKS_HARI_TABEL + 1, dtype=float)
+    return BERAT_MAKS_GRAM * (1 - a0 * np.exp(-K_DEFAULT * t)) ** 3
+
+
+TABEL_BERAT = _tabel_pertumbuhan()
+# Persen pakan per hari tabel, jadi ransum cukup di-index tanpa cari kelas lagi
+TABEL_PERSEN = PERSEN_PAKAN[np.searchsorted(KELAS_BERAT_GRAM, TABEL_BERAT, side="right")]
+
+
+# ============================================================
+# UKURAN BIBIT -> BERAT
+# ============================================================
+@lru_cache(maxsize=256)
+def berat_dari_ukuran(ukuran_bibit: str | None) -> float:
+    """
+    Estimasi berat rata-rata (gram) dari label ukuran, misal '7-9 cm':
+    titik tengah panjang -> rumus panjang-berat. Di-memo per label.
+    """
+    teks = (ukuran_bibit or "").replace(",", ".")
+    angka = [float(x) for x in re.findall(r"\d+(?:\.\d+)?", teks)[:2]]
+    if not angka:
+        return BERAT_BIBIT_DEFAULT_GRAM
+    panjang = sum(angka) / len(angka)
+    return PANJANG_BERAT_A * panjang**PANJANG_BERAT_B
+
+
+# Lookup untuk pilihan form (tidak perlu regex sama sekali)
+BERAT_PER_UKURAN = {u: berat_dari_ukuran(u) for u in UKURAN_BIBIT}
+
+
+def berat_tebar_gram(ukuran_bibit: str | None, jumlah: int, total_berat_kg: float) -> float:
+    """Berat tebar per ekor: dari timbangan jika ada, kalau tidak dari ukuran"""
+    if jumlah and total_berat_kg:
+        return total_berat_kg * 1000 / jumlah
+    berat = BERAT_PER_UKURAN.get(ukuran_bibit)
+    return berat if berat is not None else berat_dari_ukuran(ukuran_bibit)
+
+
+# ============================================================
+# HITUNG RANSUM (MURNI NUMPY, TANPA I/O)
+# ============================================================
+def hitung_ransum(
+    berat_tebar_gram: np.ndarray, umur: np.ndarray, ekor_hidup: np.ndarray
+) -> dict:
+    """
+    Ransum K kolam sekaligus.
+    Berat tebar dipetakan ke "umur setara" di tabel pertumbuhan, lalu digeser
+    sejauh umur kolam: berat kini = TABEL_BERAT[umur_setara + umur].
+    """
+    umur_setara = np.searchsorted(TABEL_BERAT, berat_tebar_gram)
+    idx = np.minimum(umur_setara + np.maximum(umur, 0), MAKS_HARI_TABEL)
+
+    berat_kini = np.maximum(TABEL_BERAT[idx], berat_tebar_gram)
+    persen = TABEL_PERSEN[idx]
+    biomassa_kg = ekor_hidup * berat_kini / 1000
+    ransum_gram = biomassa_kg * persen * 10  # kg x % -> gram
+
+    return {
+        "berat_kini_gram": berat_kini,
+        "biomassa_kg": biomassa_kg,
+        "persen_pakan": persen,
+        "ransum_gram": ransum_gram,
+    }
+
+
+def ransum_kolam(kolam_list: list[dict], today: date) -> list[dict]:
+    """
+    Lengkapi data kolam dari get_kolam_data dengan estimasi berat, biomassa,
+    persen pakan & ransum harian (satu batch untuk semua kolam).
+    """
+    if not kolam_list:
+        return []
+
+    berat_tebar = np.array(
+        [
+            berat_tebar_gram(
+                k.get("ukuran_bibit"), k.get("jumlah_tebar", 0), k.get("total_berat_kg", 0)
+            )
+            for k in kolam_list
+        ],
+        dtype=float,
+    )
+    umur = np.array(
+        [umur_hari(to_date(k.get("tanggal_tebar")), today) for k in kolam_list], dtype=int
+    )
+    ekor_hidup = np.array([k.get("jumlah_ikan_hidup", 0) for k in kolam_list], dtype=float)
+
+    hasil = hitung_ransum(berat_tebar, umur, ekor_hidup)
+
+    return [
+        {
+            **k,
+            "umur_hari": int(umur[i]),
+            "berat_tebar_gram": round(float(berat_tebar[i]), 1),
+            "berat_kini_gram": round(float(hasil["berat_kini_gram"][i]), 1),
+            "biomassa_kg": round(float(hasil["biomassa_kg"][i]), 2),
+            "persen_pakan_harian": float(hasil["persen_pakan"][i]),
+            "kebutuhan_pakan_gram": round(float(hasil["ransum_gram"][i])),
+        }
+        for i, k in enumerate(kolam_list)
+    ]
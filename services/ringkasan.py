@@ -0,0 +1,395 @@
+# services/ringkasan.py
+# Pipeline ringkasan: fetch -> index -> aggregate -> derive -> format
+# Agregat mentah (tanpa format) di-cache per user dan dipakai ulang oleh AI.
+# Key cache memuat versi data user (services.user.get_versi_data), jadi tulis
+# di worker mana pun langsung membuat entry lama tidak terpakai. Selain cache
+# in-process, agregat juga disimpan di DiskCache supaya hasil batch malam
+# (dihitung worker leader) terbaca semua worker.
+
+import logging
+import asyncio
+
+from lib.cache import TTLCache
+from lib.cache_disk import DiskCache
+from lib.money import fmt
+from lib.timing import stage
+from services.user import get_versi_data
+from services.kolam import get_all_kolam
+from services.kematian import get_all_kematian
+from services.bibit import get_all_bibit
+from services.pengeluaran import get_all_pengeluaran
+from services.pemberian_pakan import get_all_pakan
+from services.pakan_stok import get_all_pakan_stok
+from services.siklus import get_scope_siklus_ids, get_ringkasan_beku
+
+logger = logging.getLogger("service_ringkasan")
+
+KATEGORI = ("operasional", "bibit", "pakan")
+
+# Agregat mentah per (user, versi data). Versi berubah di setiap tulis, jadi TTL
+# hanya membatasi umur entry yang tidak pernah dibaca lagi.
+_aggregate_cache = TTLCache("ringkasan_aggregate", ttl=6 * 3600, maxsize=512)
+_aggregate_disk = DiskCache("ringkasan_aggregate")
+
+
+# ============================================================
+# STAGE 1: FETCH
+# ============================================================
+async def fetch_data(user_id: int) -> dict:
+    """
+    Ambil semua tabel yang dibutuhkan ringkasan secara paralel.
+    Row transaksi dibatasi ke siklus berjalan tiap kolam, jadi ukuran query
+    tidak ikut membesar setiap kali kolam ditebar ulang.
+    """
+    siklus_ids, ringkasan_beku = await asyncio.gather(
+        get_scope_siklus_ids(user_id), get_ringkasan_beku(user_id)
+    )
+    (
+        kolam_list,
+        kematian_list,
+        bibit_list,
+        pengeluaran_list,
+        pakan_list,
+        pakan_stok_list,
+    ) = await asyncio.gather(
+        get_all_kolam(user_id),
+        get_all_kematian(user_id, siklus_ids=siklus_ids),
+        get_all_bibit(user_id, siklus_ids=siklus_ids),
+        get_all_pengeluaran(user_id, siklus_ids=siklus_ids),
+        get_all_pakan(user_id, siklus_ids=siklus_ids),
+        get_all_pakan_stok(user_id, siklus_ids=siklus_ids),
+    )
+    return {
+        "kolam": kolam_list,
+        "kematian": kematian_list,
+        "bibit": bibit_list,
+        "pengeluaran": pengeluaran_list,
+        "pakan": pakan_list,
+        "pakan_stok": pakan_stok_list,
+        "beku": ringkasan_beku,
+    }
+
+
+# ============================================================
+# STAGE 2: INDEX
+# ============================================================
+def group_by_kolam(rows: list) -> dict:
+    """Kelompokkan row berdasarkan kolam_id dalam satu kali jalan"""
+    index = {}
+    for r in rows:
+        index.setdefault(r.get("kolam_id") or 0, []).append(r)
+    return index
+
+
+def build_index(data: dict) -> dict:
+    return {
+        "kematian": group_by_kolam(data["kematian"]),
+        "bibit": group_by_kolam(data["bibit"]),
+        "pengeluaran": group_by_kolam(data["pengeluaran"]),
+        "pakan_stok": group_by_kolam(data["pakan_stok"]),
+    }
+
+
+# ============================================================
+# STAGE 3: AGGREGATE
+# ============================================================
+def _kategori_kosong() -> dict:
+    return {"detail": [], "total_item": 0, "total_transaksi": 0, "total_harga": 0}
+
+
+def _kategori_beku(total_item: int | float, total_transaksi: int, total_harga: int) -> dict:
+    """Kategori dari ringkasan beku siklus terarsip: total saja, tanpa detail"""
+    return {
+        "detail": [],
+        "total_item": total_item,
+        "total_transaksi": total_transaksi,
+        "total_harga": total_harga,
+    }
+
+
+def _tambah(kategori: dict, detail: dict, item: int | float, total: int):
+    kategori["detail"].append(detail)
+    kategori["total_item"] += item
+    kategori["total_transaksi"] += 1
+    kategori["total_harga"] += total
+
+
+def aggregate(data: dict, index: dict) -> dict:
+    """
+    Hitung total per kolam dan global. Semua angka mentah (int rupiah),
+    belum ada format string di sini.
+    """
+    per_kolam = []
+    kolam_aktif = 0
+    kolam_nonaktif = 0
+
+    for k in data["kolam"]:
+        kolam_id = k["id"]
+
+        status_raw = (k.get("status_panen") or "").strip().lower()
+        if status_raw == "belum":
+            kolam_aktif += 1
+            status_label = "Belum Panen"
+        else:
+            kolam_nonaktif += 1
+            status_label = "Sudah Panen"
+
+        operasional = _kategori_kosong()
+        for p in index["pengeluaran"].get(kolam_id, ()):
+            jumlah = p.get("jumlah", 1)
+            total = p.get("harga", 0) * jumlah
+            _tambah(
+                operasional,
+                {
+                    "nama": p.get("nama_pengeluaran") or p.get("catatan") or "Operasional",
+                    "jumlah": jumlah,
+                    "harga": p.get("harga", 0),
+                    "total": total,
+                    "tanggal": p.get("tanggal") or "-",
+                },
+                jumlah,
+                total,
+            )
+
+        bibit = _kategori_kosong()
+        for b in index["bibit"].get(kolam_id, ()):
+            total_harga = b.get("total_harga", 0)
+            _tambah(
+                bibit,
+                {
+                    "nama": f"Bibit ({b.get('ukuran_bibit', '-')})",
+                    "jumlah": b.get("jumlah", 0),
+                    "harga": total_harga,
+                    "total": total_harga,
+                    "tanggal": b.get("tanggal_tebar") or "-",
+                },
+                b.get("jumlah", 0),
+                total_harga,
+            )
+
+        pakan = _kategori_kosong()
+        for s in index["pakan_stok"].get(kolam_id, ()):
+            harga = s.get("harga", 0)
+            _tambah(
+                pakan,
+                {
+                    "nama": f"Pakan ({s.get('nama_pakan', '-')})",
+                    "jumlah": s.get("jumlah", 0),
+                    "harga": harga,
+                    "total": harga,
+                    "tanggal": s.get("tanggal_masuk") or "-",
+                },
+                s.get("jumlah", 0),
+                harga,
+            )
+
+        total_kematian = sum(km.get("jumlah", 0) for km in index["kematian"].get(kolam_id, ()))
+
+        # Siklus berjalan sudah diarsipkan -> row live kosong, pakai ringkasan beku
+        beku = data["beku"].get(kolam_id)
+        if beku:
+            operasional = _kategori_beku(
+                beku.get("item_operasional", 0),
+                beku.get("transaksi_operasional", 0),
+                beku.get("biaya_operasional", 0),
+            )
+            bibit = _kategori_beku(
+                beku.get("total_bibit", 0),
+                beku.get("transaksi_bibit", 0),
+                beku.get("biaya_bibit", 0),
+            )
+            pakan = _kategori_beku(
+                beku.get("total_stok_pakan", 0),
+                beku.get("transaksi_pakan", 0),
+                beku.get("biaya_pakan", 0),
+            )
+            total_kematian = beku.get("total_kematian", 0)
+
+        per_kolam.append(
+            {
+                "id": kolam_id,
+                "nama_kolam": k.get("nama_kolam", "-"),
+                "diarsipkan": bool(beku),
+                "status_label": status_label,
+                "tanggal_mulai": k.get("tanggal_mulai", "-"),
+                "operasional": operasional,
+                "bibit": bibit,
+                "pakan": pakan,
+                "kematian": {"total_ekor": total_kematian},
+                "total_pengeluaran": (
+                    operasional["total_harga"] + bibit["total_harga"] + pakan["total_harga"]
+                ),
+            }
+        )
+
+    # Total semua kolam: satu kali jalan untuk tiap kategori
+    total_semua = {}
+    for cat in KATEGORI:
+        total_semua[cat] = {"total_harga": 0, "total_item": 0}
+        for k_data in per_kolam:
+            total_semua[cat]["total_harga"] += k_data[cat]["total_harga"]
+            total_semua[cat]["total_item"] += k_data[cat]["total_item"]
+    total_semua["total_pengeluaran"] = sum(total_semua[cat]["total_harga"] for cat in KATEGORI)
+
+    beku_list = data["beku"].values()
+    total_pakan_gram = sum(p.get("jumlah_gram", 0) for p in data["pakan"]) + sum(
+        b.get("total_pakan_gram", 0) for b in beku_list
+    )
+    total_stok_pakan_gram = sum(s.get("jumlah", 0) for s in data["pakan_stok"]) + sum(
+        b.get("total_stok_pakan", 0) for b in beku_list
+    )
+
+    return {
+        "pengeluaran_per_kolam": per_kolam,
+        "total_pengeluaran_semua_kolam": total_semua,
+        "total_kolam": len(data["kolam"]),
+        "kolam_aktif": kolam_aktif,
+        "kolam_nonaktif": kolam_nonaktif,
+        "total_bibit": sum(b.get("jumlah", 0) for b in data["bibit"])
+        + sum(b.get("total_bibit", 0) for b in beku_list),
+        "total_kematian": sum(k.get("jumlah", 0) for k in data["kematian"])
+        + sum(b.get("total_kematian", 0) for b in beku_list),
+        "total_pakan_semua": total_pakan_gram + total_stok_pakan_gram,
+    }
+
+
+# ============================================================
+# STAGE 4: DERIVE (PERSENTASE & PERBANDINGAN)
+# ============================================================
+def derive(agg: dict) -> dict:
+    """
+    Tambah persentase kategori, selisih & proporsi terhadap kolam
+    dengan pengeluaran terbesar. Masih angka mentah.
+    """
+    per_kolam = agg["pengeluaran_per_kolam"]
+    max_total = max((k["total_pengeluaran"] for k in per_kolam), default=1) or 1
+
+    for k_data in per_kolam:
+        total = k_data["total_pengeluaran"]
+        for cat in KATEGORI:
+            k_data[cat]["persentase_kolam"] = (
+                round(k_data[cat]["total_harga"] / total * 100, 1) if total > 0 else 0.0
+            )
+        k_data["selisih_total"] = total - max_total
+        k_data["proporsi_max"] = round(total / max_total * 100, 1)
+
+    return agg
+
+
+# ============================================================
+# STAGE 5: FORMAT (HANYA UNTUK TAMPILAN)
+# ============================================================
+def fmt_pakan(gram: int | float) -> str:
+    """Format pakan dengan satuan jelas"""
+    gram = int(gram)
+    if gram >= 1000:
+        return f"{gram // 1000} kg"
+    return f"{gram} g"
+
+
+def _fmt_selisih(selisih: int) -> str:
+    if selisih > 0:
+        return f"+Rp {fmt(selisih)}"
+    if selisih < 0:
+        return f"-Rp {fmt(abs(selisih))}"
+    return "-"
+
+
+def _fmt_kategori(kategori: dict, with_pct: bool = True) -> dict:
+    out = {
+        **kategori,
+        "total_item_fmt": fmt(kategori["total_item"]),
+        "total_harga_fmt": fmt(kategori["total_harga"]),
+    }
+    if "detail" in kategori:
+        out["detail"] = [
+            {
+                **d,
+                "jumlah": fmt(d["jumlah"]),
+                "harga": fmt(d["harga"]),
+                "total": fmt(d["total"]),
+            }
+            for d in kategori["detail"]
+        ]
+    if with_pct:
+        out["total_harga_fmt_with_pct"] = (
+            f"Rp {fmt(kategori['total_harga'])} ({kategori['persentase_kolam']}%)"
+        )
+    return out
+
+
+def format_view(agg: dict) -> dict:
+    """
+    Bangun context template dari agregat. Tidak mengubah agregat
+    (yang mungkin sedang di-cache), selalu membuat dict baru.
+    """
+    per_kolam = []
+    for k_data in agg["pengeluaran_per_kolam"]:
+        view = {
+            **k_data,
+            "kematian": {
+                "total_ekor": k_data["kematian"]["total_ekor"],
+                "total_fmt": fmt(k_data["kematian"]["total_ekor"]),
+            },
+            "total_pengeluaran_fmt": fmt(k_data["total_pengeluaran"]),
+            "total_semua": k_data["total_pengeluaran"],
+            "total_semua_fmt": fmt(k_data["total_pengeluaran"]),
+            "selisih_fmt": _fmt_selisih(k_data["selisih_total"]),
+        }
+        for cat in KATEGORI:
+            view[cat] = _fmt_kategori(k_data[cat])
+        per_kolam.append(view)
+
+    total_semua = agg["total_pengeluaran_semua_kolam"]
+    total_semua_view = {
+        cat: _fmt_kategori(total_semua[cat], with_pct=False) for cat in KATEGORI
+    }
+    total_semua_view["total_pengeluaran"] = total_semua["total_pengeluaran"]
+    total_semua_view["total_pengeluaran_fmt"] = fmt(total_semua["total_pengeluaran"])
+
+    return {
+        "total_kolam": fmt(agg["total_kolam"]),
+        "kolam_aktif": fmt(agg["kolam_aktif"]),
+        "kolam_nonaktif": fmt(agg["kolam_nonaktif"]),
+        "total_bibit": fmt(agg["total_bibit"]),
+        "total_kematian": fmt(agg["total_kematian"]),
+        "total_pakan": fmt_pakan(agg["total_pakan_semua"]),
+        "pengeluaran_per_kolam": per_kolam,
+        "total_pengeluaran_semua_kolam": total_semua_view,
+    }
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+async def get_ringkasan_aggregate(user_id: int, timings: dict | None = None) -> dict:
+    """
+    Agregat mentah ringkasan (stage 1-4), dari cache jika versi data user sama.
+    """
+    timings = {} if timings is None else timings
+
+    versi = await get_versi_data(user_id)
+    key = (user_id, versi)
+    if versi is not None:
+        cached = _aggregate_cache.get(key)
+        if cached is None:
+            cached = _aggregate_disk.get(user_id, key)
+            if cached is not None:
+                _aggregate_cache.set(key, cached)
+        if cached is not None:
+            timings["cache"] = "hit"
+            return cached
+
+    with stage("fetch", timings):
+        data = await fetch_data(user_id)
+    with stage("index", timings):
+        index = build_index(data)
+    with stage("aggregate", timings):
+        agg = aggregate(data, index)
+    with stage("derive", timings):
+        agg = derive(agg)
+
+    if versi is not None:
+        _aggregate_cache.set(key, agg)
+        _aggregate_disk.set(user_id, key, agg)
+    return agg
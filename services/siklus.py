@@ -0,0 +1,352 @@
+# services/siklus.py
+# Siklus budidaya per kolam: dibuka saat ada data pertama (tebar bibit),
+# ditutup saat panen (atomik di RPC catat_panen, migrations/007). Siklus yang
+# sudah selesai diringkas sekali lalu dibekukan di kolom `ringkasan`, jadi
+# halaman aktif cukup membaca siklus berjalan.
+#
+# Daftar siklus di-cache per worker untuk halaman baca, dengan key versi data
+# user (services.user.get_versi_data): siklus yang dibuka / ditutup di worker
+# lain langsung membuat entry lama tidak terpakai, jadi hasil hitung yang
+# di-cache per versi (ringkasan, prediksi, simulasi) tidak pernah memakai daftar
+# siklus versi sebelumnya. Semua yang menulis (stamp siklus_id, bekukan siklus)
+# tetap membaca siklus langsung dari DB.
+
+import logging
+import asyncio
+
+from lib.supabase_client import get_db
+from lib.cache import TTLCache, invalidate_user
+from lib.money import rupiah
+from lib.tanggal import selisih_hari, to_date
+from services.models import Siklus
+from services.user import get_versi_data
+
+logger = logging.getLogger("service_siklus")
+
+# Daftar siklus per (user, versi data) (kecil: satu row per siklus)
+_siklus_cache = TTLCache("siklus", ttl=300, maxsize=1024)
+
+
+# ============================================================
+# AMBIL SIKLUS
+# ============================================================
+async def get_all_siklus(user_id: int, segar: bool = False) -> list[Siklus]:
+    """
+    Ambil semua siklus milik user, terbaru dulu (cache per user & versi data).
+    `segar=True` selalu membaca DB (untuk keputusan tulis), lalu memperbarui cache.
+    Versi gagal dibaca -> selalu baca DB, tanpa cache.
+    """
+    versi = await get_versi_data(user_id)
+    key = (user_id, versi)
+    if versi is not None and not segar:
+        cached = _siklus_cache.get(key)
+        if cached is not None:
+            return cached
+
+    db = get_db()
+
+    def db_call():
+        return (
+            db.table("Siklus")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("id", desc=True)
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(db_call)
+    except Exception as e:
+        logger.error(f"[SIKLUS] Gagal ambil siklus user_id={user_id}: {e}")
+        return []
+
+    siklus_list = Siklus.from_rows(getattr(result, "data", None))
+    if versi is not None:
+        _siklus_cache.set(key, siklus_list)
+    return siklus_list
+
+
+async def get_siklus_aktif(user_id: int, segar: bool = False) -> dict:
+    """
+    Map kolam_id -> siklus aktif.
+    """
+    return {
+        s.kolam_id: s
+        for s in await get_all_siklus(user_id, segar)
+        if s.status == "aktif"
+    }
+
+
+async def get_scope_siklus(user_id: int) -> dict:
+    """
+    Siklus "berjalan" per kolam untuk halaman aktif (map kolam_id -> Siklus):
+    siklus aktif jika ada, kalau tidak siklus terakhir yang selesai
+    (supaya kolam yang baru panen tetap menampilkan siklus terakhirnya).
+    """
+    scope = {}
+    for s in await get_all_siklus(user_id):  # urut id desc
+        current = scope.get(s.kolam_id)
+        if current is None or (s.status == "aktif" and current.status != "aktif"):
+            scope[s.kolam_id] = s
+    return scope
+
+
+async def get_scope_siklus_ids(user_id: int) -> list[int]:
+    """
+    Id siklus berjalan yang row-nya masih ada di tabel live.
+    Siklus lama & siklus yang sudah diarsipkan tidak ikut di-query sama sekali.
+    """
+    return [
+        s.id for s in (await get_scope_siklus(user_id)).values() if not s.diarsipkan_pada
+    ]
+
+
+async def get_ringkasan_beku(user_id: int) -> dict:
+    """
+    Map kolam_id -> ringkasan beku, untuk kolam yang siklus berjalannya
+    sudah diarsipkan (row detailnya tidak ada lagi di tabel live).
+    """
+    return {
+        kolam_id: s.ringkasan
+        for kolam_id, s in (await get_scope_siklus(user_id)).items()
+        if s.diarsipkan_pada and s.ringkasan
+    }
+
+
+# ============================================================
+# BUKA SIKLUS
+# ============================================================
+async def pastikan_siklus_aktif(
+    user_id: int, kolam_id: int | None, tanggal_mulai: str = None
+) -> int | None:
+    """
+    Kembalikan id siklus aktif kolam. Jika belum ada (kolam baru / sudah panen),
+    buka siklus baru. Dipakai semua fungsi create untuk men-stamp siklus_id.
+    Ambil-atau-buka dijalankan atomik di DB (RPC siklus_aktif, migrations/010),
+    tidak pernah dari cache. None untuk kolam_id terisi berarti gagal (RPC error
+    / bukan milik user): caller membatalkan tulis, bukan menyimpan siklus_id NULL.
+    """
+    if not kolam_id:
+        return None
+
+    db = get_db()
+    params = {
+        "p_user_id": user_id,
+        "p_kolam_id": kolam_id,
+        "p_tanggal_mulai": tanggal_mulai or None,
+    }
+
+    try:
+        result = await asyncio.to_thread(lambda: db.rpc("siklus_aktif", params).execute())
+    except Exception as e:
+        logger.error(f"[SIKLUS] Gagal ambil siklus aktif kolam_id={kolam_id}: {e}")
+        return None
+
+    hasil = getattr(result, "data", None) or {}
+    siklus_id = hasil.get("id")
+    if siklus_id is None:
+        logger.warning(f"[SIKLUS] Kolam_id={kolam_id} bukan milik user_id={user_id}")
+        return None
+
+    if hasil.get("baru"):
+        invalidate_user(user_id)
+        logger.info(
+            f"[SIKLUS] Siklus {siklus_id} dibuka kolam_id={kolam_id} user_id={user_id}"
+        )
+    return siklus_id
+
+
+async def siklus_aktif_per_kolam(user_id: int, tanggal_kolam: dict) -> dict | None:
+    """
+    pastikan_siklus_aktif untuk insert array: satu RPC per kolam unik, paralel.
+    `tanggal_kolam`: map kolam_id -> tanggal mulai kalau siklus baru dibuka.
+    Hasil map kolam_id -> siklus_id, None kalau ada kolam yang gagal di-resolve.
+    """
+    kolam_ids = [k for k in tanggal_kolam if k]
+    siklus_ids = await asyncio.gather(
+        *(pastikan_siklus_aktif(user_id, k, tanggal_kolam[k]) for k in kolam_ids)
+    )
+    if any(s is None for s in siklus_ids):
+        return None
+    return dict(zip(kolam_ids, siklus_ids))
+
+
+# ============================================================
+# RINGKASAN & TUTUP SIKLUS
+# ============================================================
+# Kolom yang dibutuhkan ringkas_siklus per tabel anak
+KOLOM_RINGKASAN = {
+    "Bibit": "jumlah, total_berat, total_harga",
+    "Kematian": "jumlah",
+    "PemberianPakan": "jumlah_gram",
+    "PakanStok": "jumlah, harga",
+    "Pengeluaran": "harga, jumlah",
+    "Panen": "total_berat, total_jual, tanggal_panen",
+}
+
+
+async def hitung_ringkasan_siklus(siklus: Siklus) -> dict:
+    """
+    Hitung ringkasan satu siklus dari row anaknya (query per tabel paralel,
+    hanya kolom yang dibutuhkan).
+    """
+    db = get_db()
+
+    def fetch(table: str, columns: str):
+        return lambda: (
+            db.table(table).select(columns).eq("siklus_id", siklus.id).execute().data
+            or []
+        )
+
+    hasil = await asyncio.gather(
+        *(asyncio.to_thread(fetch(t, kolom)) for t, kolom in KOLOM_RINGKASAN.items())
+    )
+    return ringkas_siklus(siklus, dict(zip(KOLOM_RINGKASAN, hasil)))
+
+
+def ringkas_siklus(siklus: Siklus, rows: dict) -> dict:
+    """
+    Ringkasan dari row anak yang sudah diambil (map nama tabel -> list row,
+    minimal kolom KOLOM_RINGKASAN). Dipakai juga arsip, supaya ringkasan beku
+    dihitung dari row yang sama persis dengan yang ditulis ke file arsip.
+    """
+    bibit = rows.get("Bibit") or []
+    kematian = rows.get("Kematian") or []
+    pakan = rows.get("PemberianPakan") or []
+    stok = rows.get("PakanStok") or []
+    pengeluaran = rows.get("Pengeluaran") or []
+    panen = rows.get("Panen") or []
+
+    biaya_bibit = sum(rupiah(b.get("total_harga")) for b in bibit)
+    biaya_pakan = sum(rupiah(s.get("harga")) for s in stok)
+    biaya_operasional = sum(
+        rupiah(p.get("harga")) * (p.get("jumlah") or 1) for p in pengeluaran
+    )
+    total_pengeluaran = biaya_bibit + biaya_pakan + biaya_operasional
+    total_jual = sum(rupiah(p.get("total_jual")) for p in panen)
+
+    tanggal_selesai = siklus.tanggal_selesai or max(
+        (to_date(p.get("tanggal_panen")) for p in panen if p.get("tanggal_panen")),
+        default=None,
+    )
+
+    return {
+        "transaksi_bibit": len(bibit),
+        "transaksi_pakan": len(stok),
+        "transaksi_operasional": len(pengeluaran),
+        "item_operasional": sum(p.get("jumlah") or 1 for p in pengeluaran),
+        "total_bibit": sum(b.get("jumlah") or 0 for b in bibit),
+        "total_berat_bibit": sum(b.get("total_berat") or 0 for b in bibit),
+        "total_kematian": sum(k.get("jumlah") or 0 for k in kematian),
+        "total_pakan_gram": sum(p.get("jumlah_gram") or 0 for p in pakan),
+        "total_stok_pakan": sum(s.get("jumlah") or 0 for s in stok),
+        "biaya_bibit": biaya_bibit,
+        "biaya_pakan": biaya_pakan,
+        "biaya_operasional": biaya_operasional,
+        "total_pengeluaran": total_pengeluaran,
+        "total_berat_panen": sum(p.get("total_berat") or 0 for p in panen),
+        "total_jual": total_jual,
+        "laba": total_jual - total_pengeluaran,
+        "hari": selisih_hari(siklus.tanggal_mulai, tanggal_selesai),
+    }
+
+
+async def _bekukan(
+    user_id: int, siklus: Siklus, tanggal_selesai: str | None, ringkasan: dict = None
+) -> dict | None:
+    if ringkasan is None:
+        ringkasan = await hitung_ringkasan_siklus(siklus)
+    payload = {"status": "selesai", "ringkasan": ringkasan}
+    if tanggal_selesai:
+        payload["tanggal_selesai"] = tanggal_selesai
+
+    db = get_db()
+
+    def db_call():
+        return (
+            db.table("Siklus")
+            .update(payload)
+            .eq("id", siklus.id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(db_call)
+    except Exception as e:
+        logger.error(f"[SIKLUS] Gagal bekukan siklus {siklus.id}: {e}")
+        return None
+
+    if not getattr(result, "data", None):
+        logger.error(f"[SIKLUS] Gagal bekukan siklus {siklus.id}: {result}")
+        return None
+
+    invalidate_user(user_id)
+    logger.info(f"[SIKLUS] Siklus {siklus.id} ditutup & dibekukan user_id={user_id}")
+    return ringkasan
+
+
+async def bekukan_siklus(user_id: int, siklus_id: int) -> dict | None:
+    """
+    Ringkas & bekukan siklus yang baru ditutup RPC catat_panen (lewat antrian).
+    Siklus yang sudah punya ringkasan dilewati; kalau gagal, job
+    bekukan_tertunda mengisinya.
+    """
+    siklus = next(
+        (s for s in await get_all_siklus(user_id, segar=True) if s.id == siklus_id), None
+    )
+    if siklus is None or siklus.status != "selesai" or siklus.ringkasan:
+        return None
+    return await _bekukan(user_id, siklus, None)
+
+
+async def bekukan_ulang(
+    user_id: int, siklus: Siklus, ringkasan: dict = None
+) -> dict | None:
+    """
+    Simpan ulang ringkasan beku siklus selesai (koreksi data setelah panen).
+    `ringkasan` None -> dihitung dari row live.
+    """
+    return await _bekukan(user_id, siklus, None, ringkasan)
+
+
+async def get_riwayat_siklus(user_id: int, kolam_id: int = None) -> list[Siklus]:
+    """
+    Siklus yang sudah selesai beserta ringkasan bekunya (hanya baca).
+    Siklus hasil backfill yang belum punya ringkasan diisi job bekukan_tertunda.
+    """
+    return [
+        s
+        for s in await get_all_siklus(user_id)
+        if s.status == "selesai" and (kolam_id is None or s.kolam_id == kolam_id)
+    ]
+
+
+async def bekukan_tertunda() -> int:
+    """
+    Bekukan ringkasan siklus selesai yang belum punya ringkasan (hasil backfill
+    migrasi, atau tutup siklus yang gagal). Dipanggil penjadwal harian.
+    """
+    db = get_db()
+
+    def db_call():
+        return (
+            db.table("Siklus")
+            .select("*")
+            .eq("status", "selesai")
+            .is_("ringkasan", "null")
+            .execute()
+        )
+
+    try:
+        result = await asyncio.to_thread(db_call)
+    except Exception as e:
+        logger.error(f"[SIKLUS] Gagal ambil siklus tanpa ringkasan: {e}")
+        return 0
+
+    jumlah = 0
+    for s in Siklus.from_rows(getattr(result, "data", None)):
+        if await _bekukan(s.user_id, s, None) is not None:
+            jumlah += 1
+    logger.info(f"[SIKLUS] {jumlah} siklus tanpa ringkasan dibekukan")
+    return jumlah
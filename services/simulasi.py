@@ -0,0 +1,277 @@
+# services/simulasi.py
+# Simulasi Monte Carlo laba per kolam aktif (P10 / P50 / P90).
+# Tiap skenario memvariasikan laju kematian, FCR, dan harga jual di sekitar
+# distribusi historis user (Kematian, ringkasan siklus selesai, Panen).
+#
+# Kernel simulasi murni NumPy (matriks kolam x skenario) dan dijalankan di
+# ProcessPoolExecutor supaya tidak memblokir event loop. Hasil di-cache per
+# versi data user, in-process dan di disk (terbaca semua worker).
+
+import os
+import logging
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+
+from lib.cache import TTLCache
+from lib.cache_disk import DiskCache
+from lib.tanggal import today_wib
+from services.prediksi import get_prediksi, TARGET_BERAT_GRAM, FCR_ASUMSI
+from services.bibit import get_all_bibit
+from services.kematian import get_all_kematian
+from services.pengeluaran import get_all_pengeluaran
+from services.pakan_stok import get_all_pakan_stok
+from services.panen import get_all_panen
+from services.siklus import get_siklus_aktif, get_riwayat_siklus
+from services.user import get_versi_data
+
+logger = logging.getLogger("service_simulasi")
+
+# Batas skenario per kolam dan total sel (kolam x skenario) per simulasi
+MAKS_SKENARIO = int(os.getenv("SIMULASI_MAKS_SKENARIO", "5000"))
+MAKS_SEL = int(os.getenv("SIMULASI_MAKS_SEL", "2000000"))
+SIMULASI_WORKERS = int(os.getenv("SIMULASI_WORKERS", "2"))
+
+HARGA_PAKAN_DEFAULT_PER_KG = 12000
+# Sebaran default kalau riwayat belum cukup (koefisien variasi)
+CV_FCR_DEFAULT = 0.15
+CV_HARGA_DEFAULT = 0.10
+
+_simulasi_cache = TTLCache("simulasi_laba", ttl=6 * 3600, maxsize=256)
+_simulasi_disk = DiskCache("simulasi_laba")
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Pool proses dibuat sekali per worker, saat simulasi pertama diminta"""
+    global _executor
+    if _executor is None:
+        # forkserver: aman dipakai dari proses yang sudah punya thread (asyncio.to_thread)
+        _executor = ProcessPoolExecutor(
+            max_workers=SIMULASI_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _executor
+
+
+# ============================================================
+# KERNEL SIMULASI (DIJALANKAN DI PROSES LAIN)
+# ============================================================
+def simulasi_laba(param: dict, n_skenario: int, seed: int) -> dict:
+    """
+    Matriks (K kolam x S skenario), tanpa loop Python.
+
+    param (array per kolam):
+      ekor_hidup, sisa_hari, laju_mati, sigma_mati, biomassa_kini_kg, biaya_terpakai
+    param (skalar):
+      fcr_mean, fcr_sd, harga_mean, harga_sd, harga_pakan_per_kg
+    """
+    rng = np.random.default_rng(seed)
+    K = len(param["ekor_hidup"])
+    S = n_skenario
+
+    ekor_hidup = np.asarray(param["ekor_hidup"], dtype=float)[:, None]
+    sisa_hari = np.asarray(param["sisa_hari"], dtype=float)[:, None]
+    laju_mati = np.asarray(param["laju_mati"], dtype=float)[:, None]
+    sigma_mati = np.asarray(param["sigma_mati"], dtype=float)[:, None]
+    biomassa_kini = np.asarray(param["biomassa_kini_kg"], dtype=float)[:, None]
+    biaya_terpakai = np.asarray(param["biaya_terpakai"], dtype=float)[:, None]
+
+    # Kematian: lognormal di sekitar laju historis kolam (mean tetap = laju_mati)
+    m = laju_mati * rng.lognormal(-0.5 * sigma_mati**2, sigma_mati, size=(K, S))
+    # FCR & harga: normal terpotong supaya tetap masuk akal
+    fcr = np.clip(rng.normal(param["fcr_mean"], param["fcr_sd"], size=(K, S)), 0.5, 3.0)
+    harga = np.clip(
+        rng.normal(param["harga_mean"], param["harga_sd"], size=(K, S)),
+        param["harga_mean"] * 0.3,
+        None,
+    )
+
+    ekor_panen = ekor_hidup * np.exp(-m * sisa_hari)
+    biomassa_panen = ekor_panen * (TARGET_BERAT_GRAM / 1000)
+    pakan_tambahan_kg = np.maximum(biomassa_panen - biomassa_kini, 0) * fcr
+
+    laba = (
+        biomassa_panen * harga
+        - pakan_tambahan_kg * param["harga_pakan_per_kg"]
+        - biaya_terpakai
+    )
+
+    p10, p50, p90 = np.percentile(laba, [10, 50, 90], axis=1)
+    return {
+        "p10": np.rint(p10).astype(np.int64).tolist(),
+        "p50": np.rint(p50).astype(np.int64).tolist(),
+        "p90": np.rint(p90).astype(np.int64).tolist(),
+        "peluang_rugi": np.round((laba < 0).mean(axis=1) * 100, 1).tolist(),
+    }
+
+
+# ============================================================
+# DISTRIBUSI HISTORIS
+# ============================================================
+def _mean_sd(values: list[float], default_mean: float, default_cv: float) -> tuple:
+    """Mean & simpangan baku sampel; fallback ke default jika data < 2"""
+    if len(values) < 2:
+        mean = values[0] if values else default_mean
+        return mean, mean * default_cv
+    arr = np.asarray(values, dtype=float)
+    return float(arr.mean()), float(max(arr.std(ddof=1), arr.mean() * 0.02))
+
+
+def _distribusi_fcr(riwayat: list) -> tuple:
+    """FCR per siklus selesai = pakan (kg) / pertambahan biomassa (kg)"""
+    nilai = []
+    for s in riwayat:
+        r = s.ringkasan or {}
+        tambah = (r.get("total_berat_panen") or 0) - (r.get("total_berat_bibit") or 0)
+        pakan_kg = (r.get("total_pakan_gram") or 0) / 1000
+        if tambah > 0 and pakan_kg > 0:
+            nilai.append(pakan_kg / tambah)
+    return _mean_sd(nilai, FCR_ASUMSI, CV_FCR_DEFAULT)
+
+
+def _distribusi_harga(panen_list: list, harga_default: int) -> tuple:
+    """Harga jual per kg dari tiap panen"""
+    nilai = [
+        p.get("total_jual", 0) / p.get("total_berat")
+        for p in panen_list
+        if p.get("total_berat") and p.get("total_jual")
+    ]
+    return _mean_sd(nilai, harga_default, CV_HARGA_DEFAULT)
+
+
+def _sigma_kematian(kematian_list: list, umur: dict) -> dict:
+    """
+    Sebaran laju kematian per kolam dari kematian harian:
+    koefisien variasi jumlah mati per hari (hari tanpa kematian dihitung 0),
+    diubah ke sigma lognormal.
+    """
+    harian = {}
+    for km in kematian_list:
+        kolam_id = km.get("kolam_id")
+        harian.setdefault(kolam_id, {})
+        tgl = km.get("tanggal")
+        harian[kolam_id][tgl] = harian[kolam_id].get(tgl, 0) + km.get("jumlah", 0)
+
+    sigma = {}
+    for kolam_id, hari in umur.items():
+        per_hari = list(harian.get(kolam_id, {}).values())
+        hari = max(int(hari), len(per_hari), 1)
+        arr = np.zeros(hari)
+        arr[: len(per_hari)] = per_hari
+        mean = arr.mean()
+        cv = arr.std() / mean if mean > 0 else 1.0
+        sigma[kolam_id] = float(np.clip(np.sqrt(np.log1p(cv**2)), 0.1, 1.5))
+    return sigma
+
+
+def _harga_pakan_per_kg(stok_list: list) -> float:
+    total_harga = sum(s.get("harga", 0) for s in stok_list)
+    total_kg = sum(
+        s.get("jumlah", 0) / 1000 if (s.get("satuan") or "g") == "g" else s.get("jumlah", 0)
+        for s in stok_list
+    )
+    return total_harga / total_kg if total_harga and total_kg else HARGA_PAKAN_DEFAULT_PER_KG
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+async def get_simulasi_laba(
+    user_id: int, n_skenario: int = 2000, today: date | None = None
+) -> dict:
+    """
+    P10/P50/P90 laba per kolam aktif (map kolam_id -> hasil).
+    Jumlah skenario dibatasi MAKS_SKENARIO dan MAKS_SEL / jumlah kolam.
+    """
+    today = today or today_wib()
+    prediksi = await get_prediksi(user_id, today)
+    if not prediksi:
+        return {}
+
+    kolam_ids = list(prediksi)
+    n_skenario = max(1, min(n_skenario, MAKS_SKENARIO, MAKS_SEL // len(kolam_ids)))
+
+    versi = await get_versi_data(user_id)
+    key = (user_id, versi, today, n_skenario)
+    if versi is not None:
+        cached = _simulasi_cache.get(key)
+        if cached is None:
+            cached = _simulasi_disk.get(user_id, key)
+            if cached is not None:
+                _simulasi_cache.set(key, cached)
+        if cached is not None:
+            return cached
+
+    aktif = await get_siklus_aktif(user_id)
+    siklus_ids = [s.id for s in aktif.values()]
+    bibit, kematian, pengeluaran, stok, panen, riwayat = await asyncio.gather(
+        get_all_bibit(user_id, siklus_ids=siklus_ids),
+        get_all_kematian(user_id, siklus_ids=siklus_ids),
+        get_all_pengeluaran(user_id, siklus_ids=siklus_ids),
+        get_all_pakan_stok(user_id, siklus_ids=siklus_ids),
+        get_all_panen(user_id),
+        get_riwayat_siklus(user_id),
+    )
+
+    # Biaya yang sudah keluar di siklus berjalan
+    biaya = dict.fromkeys(kolam_ids, 0)
+    for b in bibit:
+        if b.get("kolam_id") in biaya:
+            biaya[b["kolam_id"]] += b.get("total_harga", 0)
+    for p in pengeluaran:
+        if p.get("kolam_id") in biaya:
+            biaya[p["kolam_id"]] += p.get("harga", 0) * p.get("jumlah", 1)
+    for s in stok:
+        if s.get("kolam_id") in biaya:
+            biaya[s["kolam_id"]] += s.get("harga", 0)
+
+    harga_default = next(iter(prediksi.values()))["harga_per_kg"]
+    fcr_mean, fcr_sd = _distribusi_fcr(riwayat)
+    harga_mean, harga_sd = _distribusi_harga(panen, harga_default)
+    sigma = _sigma_kematian(kematian, {k: prediksi[k]["umur_hari"] for k in kolam_ids})
+
+    param = {
+        "ekor_hidup": [prediksi[k]["ekor_hidup"] for k in kolam_ids],
+        "sisa_hari": [prediksi[k]["sisa_hari"] for k in kolam_ids],
+        "laju_mati": [prediksi[k]["laju_mati"] for k in kolam_ids],
+        "sigma_mati": [sigma[k] for k in kolam_ids],
+        "biomassa_kini_kg": [prediksi[k]["biomassa_kini_kg"] for k in kolam_ids],
+        "biaya_terpakai": [biaya[k] for k in kolam_ids],
+        "fcr_mean": fcr_mean,
+        "fcr_sd": fcr_sd,
+        "harga_mean": harga_mean,
+        "harga_sd": harga_sd,
+        "harga_pakan_per_kg": _harga_pakan_per_kg(stok),
+    }
+
+    loop = asyncio.get_running_loop()
+    seed = hash((user_id, today.toordinal())) & 0xFFFFFFFF
+    hasil = await loop.run_in_executor(
+        _get_executor(), simulasi_laba, param, n_skenario, seed
+    )
+
+    per_kolam = {
+        kolam_id: {
+            "kolam_id": kolam_id,
+            "nama_kolam": prediksi[kolam_id]["nama_kolam"],
+            "biaya_terpakai": biaya[kolam_id],
+            "p10": hasil["p10"][i],
+            "p50": hasil["p50"][i],
+            "p90": hasil["p90"][i],
+            "peluang_rugi": hasil["peluang_rugi"][i],
+            "jumlah_skenario": n_skenario,
+        }
+        for i, kolam_id in enumerate(kolam_ids)
+    }
+    logger.info(
+        f"[SIMULASI] {len(kolam_ids)} kolam x {n_skenario} skenario user_id={user_id}"
+    )
+
+    if versi is not None:
+        _simulasi_cache.set(key, per_kolam)
+        _simulasi_disk.set(user_id, key, per_kolam)
+    return per_kolam
@@ -0,0 +1,170 @@
+# services/sinkron.py
+# Delta-sync untuk perangkat lapangan: hanya row yang dibuat / diubah / dihapus
+# sejak cursor klien, dari semua tabel user dalam satu permintaan.
+#
+# Dasarnya kolom updated_at + tombstone "Terhapus" (migrations/008_sinkron.sql).
+# Tiap tabel dibaca keyset (updated_at, id) sampai `batas`, yaitu waktu sekarang
+# dikurangi SINKRON_JEDA: transaksi yang belum commit saat query bisa membawa
+# updated_at lebih kecil dari batas, jadi row yang terlalu baru ditunda ke
+# sinkron berikutnya daripada terlewat selamanya.
+#
+# Cursor (opaque, base64url) = {"b": batas, "p": {tabel: [updated_at, id]}}.
+# Tabel yang terpotong SINKRON_LIMIT punya posisi sendiri di "p" (lanjut dari row
+# terakhir, aman untuk ribuan row ber-updated_at sama dari insert massal);
+# tabel lain lanjut dari "b".
+
+import os
+import json
+import base64
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+from lib.supabase_client import get_db
+
+logger = logging.getLogger("service_sinkron")
+
+SINKRON_TABEL = (
+    "Kolam",
+    "Siklus",
+    "Bibit",
+    "Kematian",
+    "PemberianPakan",
+    "PakanStok",
+    "Pengeluaran",
+    "Panen",
+)
+# Maks row per tabel per permintaan (sisanya diambil dengan cursor berikutnya)
+SINKRON_LIMIT = int(os.getenv("SINKRON_LIMIT", "500"))
+SINKRON_JEDA = int(os.getenv("SINKRON_JEDA", "10"))
+# Tombstone disimpan sekian hari; cursor yang lebih tua dipaksa sinkron penuh
+SINKRON_SIMPAN_HARI = int(os.getenv("SINKRON_SIMPAN_HARI", "90"))
+
+# Kolom yang tidak perlu dikirim (milik user yang meminta / urusan server saja)
+_KOLOM_DIBUANG = ("user_id", "idem_key")
+
+
+# ============================================================
+# CURSOR
+# ============================================================
+def _encode_cursor(batas: str, posisi: dict) -> str:
+    data = json.dumps({"b": batas, "p": posisi}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str | None) -> tuple[str, dict] | None:
+    """(batas, posisi) atau None kalau cursor kosong / rusak / melewati masa simpan"""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        batas, posisi = data["b"], data.get("p") or {}
+        waktu = datetime.fromisoformat(batas)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"[SINKRON] Cursor tidak valid, sinkron penuh: {e}")
+        return None
+
+    if waktu < datetime.now(timezone.utc) - timedelta(days=SINKRON_SIMPAN_HARI):
+        logger.info(f"[SINKRON] Cursor {batas} lewat masa simpan tombstone, sinkron penuh")
+        return None
+    return batas, posisi
+
+
+# ============================================================
+# QUERY PER TABEL
+# ============================================================
+def _query(db, table: str, user_id: int, batas: str, posisi, limit: int):
+    """Row tabel dengan (updated_at, id) > posisi dan updated_at <= batas"""
+    query = db.table(table).select("*").eq("user_id", user_id).lte("updated_at", batas)
+    if posisi:
+        ts, last_id = posisi
+        if last_id is None:
+            query = query.gt("updated_at", ts)
+        else:
+            # Nilai berisi ':' dan '.' -> wajib dikutip di dalam or=(...)
+            query = query.or_(
+                f'updated_at.gt."{ts}",and(updated_at.eq."{ts}",id.gt.{last_id})'
+            )
+    return query.order("updated_at").order("id").limit(limit).execute()
+
+
+async def get_perubahan(
+    user_id: int, cursor: str | None = None, limit: int = SINKRON_LIMIT
+) -> dict | None:
+    """
+    Perubahan sejak `cursor` (None = sinkron penuh). Hasil ringkas:
+    {
+      "cursor": str,            # kirim balik di sinkron berikutnya
+      "lagi": bool,             # masih ada sisa (langsung minta lagi dengan cursor baru)
+      "reset": bool,            # sinkron penuh: kosongkan data lokal dulu
+      "ubah": {Tabel: {"kolom": [...], "rows": [[...], ...]}},
+      "hapus": {Tabel: [id, ...]},
+    }
+    None kalau query gagal (klien mengulang dengan cursor yang sama).
+    """
+    lama = _decode_cursor(cursor)
+    reset = lama is None
+    batas_lama, posisi_lama = lama if lama else (None, {})
+    batas = (datetime.now(timezone.utc) - timedelta(seconds=SINKRON_JEDA)).isoformat()
+
+    def posisi(table: str):
+        if table in posisi_lama:
+            return posisi_lama[table]
+        return (batas_lama, None) if batas_lama else None
+
+    # Sinkron penuh tidak perlu tombstone: klien mulai dari kosong
+    tabel = SINKRON_TABEL if reset else SINKRON_TABEL + ("Terhapus",)
+    db = get_db()
+    try:
+        hasil = await asyncio.gather(
+            *(
+                asyncio.to_thread(_query, db, t, user_id, batas, posisi(t), limit)
+                for t in tabel
+            )
+        )
+    except Exception as e:
+        logger.error(f"[SINKRON] Gagal ambil perubahan user_id={user_id}: {e}")
+        return None
+
+    ubah, hapus, posisi_baru = {}, {}, {}
+    for table, result in zip(tabel, hasil):
+        rows = getattr(result, "data", None) or []
+        if len(rows) >= limit:
+            posisi_baru[table] = [rows[-1]["updated_at"], rows[-1]["id"]]
+        if not rows:
+            continue
+        if table == "Terhapus":
+            for r in rows:
+                hapus.setdefault(r["tabel"], []).append(r["row_id"])
+            continue
+        kolom = [k for k in rows[0] if k not in _KOLOM_DIBUANG]
+        ubah[table] = {"kolom": kolom, "rows": [[r.get(k) for k in kolom] for r in rows]}
+
+    jumlah = sum(len(v["rows"]) for v in ubah.values()) + sum(map(len, hapus.values()))
+    logger.info(
+        f"[SINKRON] user_id={user_id}: {jumlah} perubahan"
+        f"{' (penuh)' if reset else ''}{' (lanjut)' if posisi_baru else ''}"
+    )
+    return {
+        "cursor": _encode_cursor(batas, posisi_baru),
+        "lagi": bool(posisi_baru),
+        "reset": reset,
+        "ubah": ubah,
+        "hapus": hapus,
+    }
+
+
+async def bersihkan_terhapus(hari: int = SINKRON_SIMPAN_HARI) -> int:
+    """Hapus tombstone lebih tua dari masa simpan (dipanggil penjadwal harian)"""
+    db = get_db()
+    batas = (datetime.now(timezone.utc) - timedelta(days=hari)).isoformat()
+    try:
+        result = await asyncio.to_thread(
+            lambda: db.table("Terhapus").delete().lt("updated_at", batas).execute()
+        )
+    except Exception as e:
+        logger.error(f"[SINKRON] Gagal bersihkan tombstone: {e}")
+        return 0
+    jumlah = len(getattr(result, "data", None) or [])
+    logger.info(f"[SINKRON] {jumlah} tombstone lebih tua dari {hari} hari dihapus")
+    return jumlah
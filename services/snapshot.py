@@ -0,0 +1,430 @@
+# services/snapshot.py
+# Snapshot kolumnar (Parquet) semua tabel untuk analisis offline.
+#
+# Tiap tabel ditulis per user per bulan (kolom tanggal tabel), layout ala Hive:
+#   {SNAPSHOT_DIR}/{Tabel}/user_id={id}/bulan={YYYY-MM}/data.parquet
+# Kolom bertipe tetap (SKEMA di bawah): int64, float64, date32, timestamp UTC,
+# uang sebagai int64 rupiah, jadi file bisa langsung di-query tanpa parsing ulang.
+# Gabungan semua folder user = snapshot lintas tenant.
+#
+# Inkremental: sidik jari (hash) isi tiap partisi disimpan di manifest per user;
+# partisi yang isinya tidak berubah tidak ditulis ulang, partisi yang kosong
+# dihapus. Row siklus terarsip (services.arsip) ikut masuk.
+#
+# Jalankan berkala (penjadwal / cron):  python -m services.snapshot [--user ID]
+
+import os
+import json
+import shutil
+import hashlib
+import asyncio
+import logging
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from lib.supabase_client import get_db
+from lib.money import rupiah
+from lib.tanggal import to_date
+from services.user import get_all_user_ids
+from services.ekspor import TABEL as TABEL_EKSPOR, halaman_ekspor
+
+logger = logging.getLogger("service_snapshot")
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshot")
+# Naikkan kalau SKEMA berubah: semua partisi ditulis ulang pada run berikutnya
+SKEMA_VERSI = 1
+# Partisi untuk row tanpa tanggal sama sekali
+BULAN_KOSONG = "tanpa-tanggal"
+
+_ID = (("id", "int"), ("user_id", "int"), ("kolam_id", "int"), ("siklus_id", "int"))
+
+# Tabel -> (kolom tanggal untuk partisi bulan, ((kolom, tipe), ...))
+SKEMA = {
+    "Kolam": (
+        "tanggal_mulai",
+        (
+            ("id", "int"),
+            ("user_id", "int"),
+            ("nama_kolam", "str"),
+            ("kapasitas_bibit", "int"),
+            ("tanggal_mulai", "date"),
+            ("status_panen", "str"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "Siklus": (
+        "tanggal_mulai",
+        (
+            ("id", "int"),
+            ("user_id", "int"),
+            ("kolam_id", "int"),
+            ("tanggal_mulai", "date"),
+            ("tanggal_selesai", "date"),
+            ("status", "str"),
+            ("ringkasan", "json"),
+            ("diarsipkan_pada", "ts"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "Bibit": (
+        "tanggal_tebar",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal_tebar", "date"),
+            ("ukuran_bibit", "str"),
+            ("jumlah", "int"),
+            ("total_harga", "rupiah"),
+            ("total_berat", "float"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "Kematian": (
+        "tanggal",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal", "date"),
+            ("jumlah", "int"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "PemberianPakan": (
+        "tanggal",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal", "date"),
+            ("jenis_pakan", "str"),
+            ("jumlah_gram", "float"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "PakanStok": (
+        "tanggal_masuk",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal_masuk", "date"),
+            ("nama_pakan", "str"),
+            ("jumlah", "float"),
+            ("satuan", "str"),
+            ("harga", "rupiah"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "Pengeluaran": (
+        "tanggal",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal", "date"),
+            ("nama_pengeluaran", "str"),
+            ("harga", "rupiah"),
+            ("jumlah", "int"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+    "Panen": (
+        "tanggal_panen",
+        _ID
+        + (
+            ("nama_kolam", "str"),
+            ("tanggal_panen", "date"),
+            ("total_berat", "float"),
+            ("total_jual", "rupiah"),
+            ("catatan", "str"),
+            ("created_at", "ts"),
+        ),
+    ),
+}
+
+# Tabel DB -> nama di services.ekspor (sumber row live + arsip, per halaman)
+_NAMA_EKSPOR = {tabel_db: nama for nama, (tabel_db, *_) in TABEL_EKSPOR.items()}
+
+
+# ============================================================
+# NORMALISASI NILAI
+# ============================================================
+def _int(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value) if isinstance(value, int) else int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _ts(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _json(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+_KONVERSI = {
+    "int": _int,
+    "float": _float,
+    "rupiah": rupiah,
+    "str": _str,
+    "date": to_date,
+    "ts": _ts,
+    "json": _json,
+}
+
+
+def _normalisasi(table: str, row: dict) -> tuple:
+    """Row mentah -> tuple nilai bertipe sesuai urutan kolom SKEMA"""
+    return tuple(_KONVERSI[tipe](row.get(kolom)) for kolom, tipe in SKEMA[table][1])
+
+
+def _bulan(row: dict, kolom_tanggal: str) -> str:
+    tanggal = to_date(row.get(kolom_tanggal)) or to_date(row.get("created_at"))
+    return tanggal.strftime("%Y-%m") if tanggal else BULAN_KOSONG
+
+
+def _sidik(rows: list[tuple]) -> str:
+    h = hashlib.blake2b(f"v{SKEMA_VERSI}".encode(), digest_size=16)
+    for row in rows:
+        h.update(json.dumps(row, default=str, ensure_ascii=False).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+# ============================================================
+# PATH & MANIFEST
+# ============================================================
+def partisi_path(table: str, user_id: int, bulan: str) -> str:
+    return os.path.join(
+        SNAPSHOT_DIR, table, f"user_id={user_id}", f"bulan={bulan}", "data.parquet"
+    )
+
+
+def _manifest_path(user_id: int) -> str:
+    return os.path.join(SNAPSHOT_DIR, "_manifest", f"{user_id}.json")
+
+
+def baca_manifest(user_id: int) -> dict:
+    """
+    {Tabel: {bulan: {"sidik", "row", "ditulis_pada"}}, "_diperbarui_pada": iso}
+    milik user
+    """
+    path = _manifest_path(user_id)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"[SNAPSHOT] Manifest user_id={user_id} rusak, tulis ulang semua: {e}")
+        return {}
+
+
+@contextmanager
+def _file_sementara(path: str):
+    """
+    Path file sementara unik (mkstemp) di folder `path`: di-rename ke `path`
+    kalau blok selesai, dihapus kalau gagal. Dua penulis file yang sama (run
+    snapshot tumpang tindih) tidak pernah berbagi file sementara.
+    """
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(
+        dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _tulis_manifest(user_id: int, manifest: dict):
+    with _file_sementara(_manifest_path(user_id)) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+# ============================================================
+# TULIS PARQUET
+# ============================================================
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError(
+            "Snapshot Parquet butuh paket pyarrow (pip install pyarrow)"
+        ) from e
+    return pa, pq
+
+
+def skema_arrow(table: str):
+    pa, _ = _pyarrow()
+    tipe_arrow = {
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "rupiah": pa.int64(),
+        "str": pa.string(),
+        "date": pa.date32(),
+        "ts": pa.timestamp("us", tz="UTC"),
+        "json": pa.string(),
+    }
+    return pa.schema([(kolom, tipe_arrow[tipe]) for kolom, tipe in SKEMA[table][1]])
+
+
+def _tulis_parquet(path: str, table: str, rows: list[tuple]):
+    """Tulis ke file sementara lalu rename, supaya pembaca tidak pernah melihat
+    file setengah jadi"""
+    pa, pq = _pyarrow()
+    skema = skema_arrow(table)
+    kolom = list(zip(*rows))
+    data = pa.Table.from_arrays(
+        [pa.array(nilai, type=field.type) for nilai, field in zip(kolom, skema)],
+        schema=skema,
+    )
+    with _file_sementara(path) as tmp:
+        pq.write_table(data, tmp, compression="zstd")
+
+
+def _hapus_partisi(path: str):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+# ============================================================
+# SNAPSHOT PER USER
+# ============================================================
+async def _halaman_tabel(user_id: int, table: str):
+    """Async generator halaman row mentah satu tabel (live + arsip)"""
+    if table in _NAMA_EKSPOR:
+        async for rows in halaman_ekspor(user_id, _NAMA_EKSPOR[table]):
+            yield rows
+        return
+
+    # Kolam & Siklus: sedikit row per user, cukup satu query
+    db = get_db()
+    result = await asyncio.to_thread(
+        lambda: db.table(table).select("*").eq("user_id", user_id).execute()
+    )
+    yield getattr(result, "data", None) or []
+
+
+async def _kumpulkan(user_id: int, table: str) -> dict[str, list[tuple]]:
+    """{bulan: [row ternormalisasi, ...]} urut id. Error query diteruskan ke pemanggil,
+    supaya partisi tidak pernah dianggap kosong karena data gagal diambil."""
+    kolom_tanggal = SKEMA[table][0]
+    partisi: dict[str, list[tuple]] = {}
+    async for rows in _halaman_tabel(user_id, table):
+        for row in rows:
+            partisi.setdefault(_bulan(row, kolom_tanggal), []).append(
+                _normalisasi(table, row)
+            )
+    for rows in partisi.values():
+        rows.sort(key=lambda r: r[0] or 0)
+    return partisi
+
+
+async def snapshot_user(user_id: int) -> dict:
+    """
+    Perbarui snapshot semua tabel milik user. Hanya partisi yang isinya berubah
+    yang ditulis ulang. Kembalikan hitungan {ditulis, sama, dihapus, row}.
+    """
+    manifest = baca_manifest(user_id)
+    hasil = {"ditulis": 0, "sama": 0, "dihapus": 0, "row": 0}
+    sekarang = datetime.now(timezone.utc).isoformat()
+
+    for table in SKEMA:
+        partisi = await _kumpulkan(user_id, table)
+        lama = manifest.get(table, {})
+        baru = {}
+
+        for bulan, rows in partisi.items():
+            hasil["row"] += len(rows)
+            path = partisi_path(table, user_id, bulan)
+            sidik = _sidik(rows)
+            if lama.get(bulan, {}).get("sidik") == sidik and os.path.exists(path):
+                baru[bulan] = lama[bulan]
+                hasil["sama"] += 1
+                continue
+            await asyncio.to_thread(_tulis_parquet, path, table, rows)
+            baru[bulan] = {"sidik": sidik, "row": len(rows), "ditulis_pada": sekarang}
+            hasil["ditulis"] += 1
+
+        for bulan in lama.keys() - partisi.keys():
+            await asyncio.to_thread(_hapus_partisi, partisi_path(table, user_id, bulan))
+            hasil["dihapus"] += 1
+
+        manifest[table] = baru
+        # Simpan per tabel: kalau tabel berikutnya gagal, progres tidak hilang
+        await asyncio.to_thread(_tulis_manifest, user_id, manifest)
+
+    manifest["_diperbarui_pada"] = sekarang
+    await asyncio.to_thread(_tulis_manifest, user_id, manifest)
+
+    logger.info(
+        f"[SNAPSHOT] user_id={user_id}: {hasil['ditulis']} partisi ditulis, "
+        f"{hasil['sama']} tetap, {hasil['dihapus']} dihapus ({hasil['row']} row)"
+    )
+    return hasil
+
+
+async def jalankan_snapshot() -> dict:
+    """Perbarui snapshot semua user (dipanggil dari penjadwal / CLI)"""
+    total = {"user": 0, "gagal": 0, "ditulis": 0, "sama": 0, "dihapus": 0, "row": 0}
+    for user_id in await get_all_user_ids():
+        try:
+            hasil = await snapshot_user(user_id)
+        except Exception as e:
+            logger.error(f"[SNAPSHOT] Gagal snapshot user_id={user_id}: {e}")
+            total["gagal"] += 1
+            continue
+        total["user"] += 1
+        for k, v in hasil.items():
+            total[k] += v
+    logger.info(f"[SNAPSHOT] Selesai: {total}")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Snapshot Parquet per user per bulan")
+    parser.add_argument("--user", type=int, help="hanya user ini (default: semua user)")
+    args = parser.parse_args()
+    if args.user:
+        asyncio.run(snapshot_user(args.user))
+    else:
+        asyncio.run(jalankan_snapshot())
@@ -0,0 +1,190 @@
+# services/statistik.py
+# Metrik performa per kolam: FCR, survival %, biaya/kg, estimasi biomassa.
+#
+# Akumulator disimpan per siklus di tabel StatSiklus dan diperbarui saat data
+# ditulis: insert menambah delta secara atomik (RPC tambah_stat_siklus),
+# edit/hapus menyinkronkan ulang hanya siklus yang berubah. Saat view, metrik
+# cukup dihitung dari satu row per kolam, tanpa membaca riwayat transaksi.
+
+import os
+import asyncio
+import logging
+
+from lib.supabase_client import get_db
+from lib.cache import TTLCache
+from lib.money import rupiah
+from services.siklus import get_all_siklus, get_scope_siklus, hitung_ringkasan_siklus
+
+logger = logging.getLogger("service_statistik")
+
+# Asumsi FCR untuk estimasi biomassa kolam yang belum panen
+FCR_ASUMSI = float(os.getenv("PREDIKSI_FCR", "1.0"))
+
+_FIELD_DELTA = {
+    "bibit": "p_bibit",
+    "berat_bibit": "p_berat_bibit",
+    "mati": "p_mati",
+    "pakan_gram": "p_pakan_gram",
+    "biaya": "p_biaya",
+    "berat_panen": "p_berat_panen",
+}
+
+# Row StatSiklus per user (invalidate_user membersihkan saat ada tulis)
+_stat_cache = TTLCache("stat_siklus", ttl=300, maxsize=1024)
+
+
+# ============================================================
+# UPDATE SAAT TULIS
+# ============================================================
+async def tambah_stat(user_id: int, kolam_id: int | None, siklus_id: int | None, **delta):
+    """
+    Tambahkan delta ke akumulator siklus (dipanggil setelah insert berhasil).
+    Kunci delta: bibit, berat_bibit, mati, pakan_gram, biaya, berat_panen.
+    Dijalankan lewat lib.antrian; error dilempar supaya dicoba ulang.
+    """
+    if not siklus_id or not kolam_id:
+        return
+
+    params = {"p_siklus_id": siklus_id, "p_user_id": user_id, "p_kolam_id": kolam_id}
+    for key, value in delta.items():
+        if value:
+            params[_FIELD_DELTA[key]] = value
+
+    db = get_db()
+    await asyncio.to_thread(lambda: db.rpc("tambah_stat_siklus", params).execute())
+    # Tugas antrian selesai setelah invalidate_user request; buang cache yang sempat terisi
+    _stat_cache.invalidate((user_id,))
+
+
+async def sinkron_stat(user_id: int, siklus_id: int | None):
+    """
+    Hitung ulang akumulator satu siklus dari row-nya (setelah edit/hapus,
+    di mana delta tidak diketahui). Hanya siklus itu yang dibaca.
+    Idempoten, jadi aman dicoba ulang oleh antrian.
+    """
+    if not siklus_id:
+        return
+
+    siklus = next((s for s in await get_all_siklus(user_id) if s.id == siklus_id), None)
+    if siklus is None:
+        return
+
+    r = await hitung_ringkasan_siklus(siklus)
+    payload = {
+        "siklus_id": siklus.id,
+        "user_id": user_id,
+        "kolam_id": siklus.kolam_id,
+        "total_bibit": r["total_bibit"],
+        "total_berat_bibit": r["total_berat_bibit"],
+        "total_mati": r["total_kematian"],
+        "total_pakan_gram": r["total_pakan_gram"],
+        "total_biaya": r["total_pengeluaran"],
+        "total_berat_panen": r["total_berat_panen"],
+    }
+    db = get_db()
+    await asyncio.to_thread(
+        lambda: db.table("StatSiklus").upsert(payload, on_conflict="siklus_id").execute()
+    )
+    _stat_cache.invalidate((user_id,))
+
+
+async def sinkron_dari_rows(user_id: int, rows: list | None):
+    """Sinkron semua siklus yang disentuh oleh row hasil update/delete"""
+    for siklus_id in {r.get("siklus_id") for r in rows or () if r.get("siklus_id")}:
+        await sinkron_stat(user_id, siklus_id)
+
+
+# ============================================================
+# METRIK (MURNI, TANPA I/O)
+# ============================================================
+def hitung_metrik(stat: dict) -> dict:
+    """
+    Turunkan metrik dari akumulator siklus.
+    FCR riil hanya ada setelah panen (berat panen tertimbang); sebelum itu
+    biomassa diestimasi dari berat tebar + pakan / FCR asumsi x survival.
+    """
+    bibit = stat.get("total_bibit") or 0
+    mati = stat.get("total_mati") or 0
+    berat_bibit = stat.get("total_berat_bibit") or 0
+    pakan_kg = (stat.get("total_pakan_gram") or 0) / 1000
+    berat_panen = stat.get("total_berat_panen") or 0
+    biaya = stat.get("total_biaya") or 0
+
+    hidup = max(bibit - mati, 0)
+    survival = hidup / bibit * 100 if bibit else None
+
+    if berat_panen > 0:
+        biomassa = berat_panen
+        sudah_panen = True
+    else:
+        biomassa = (berat_bibit + pakan_kg / FCR_ASUMSI) * (hidup / bibit if bibit else 0)
+        sudah_panen = False
+
+    pertambahan = biomassa - berat_bibit
+    fcr = pakan_kg / pertambahan if sudah_panen and pertambahan > 0 and pakan_kg else None
+
+    return {
+        "kolam_id": stat.get("kolam_id"),
+        "siklus_id": stat.get("siklus_id"),
+        "ekor_tebar": int(bibit),
+        "ekor_hidup": int(hidup),
+        "survival_persen": round(survival, 1) if survival is not None else None,
+        "pakan_kg": round(pakan_kg, 1),
+        "biomassa_kg": round(biomassa, 1),
+        "biomassa_dari_panen": sudah_panen,
+        "fcr": round(fcr, 2) if fcr is not None else None,
+        "total_biaya": int(biaya),
+        "biaya_per_kg": rupiah(biaya / biomassa) if biomassa > 0 else None,
+    }
+
+
+# ============================================================
+# AMBIL UNTUK VIEW
+# ============================================================
+async def get_stat_kolam(user_id: int) -> dict:
+    """
+    Map kolam_id -> metrik untuk siklus berjalan tiap kolam.
+    Kolam yang siklusnya sudah diarsipkan memakai ringkasan beku.
+    """
+    cached = _stat_cache.get((user_id,))
+    if cached is not None:
+        return cached
+
+    scope = await get_scope_siklus(user_id)
+    aktif_ids = [s.id for s in scope.values() if not s.diarsipkan_pada]
+
+    rows = []
+    if aktif_ids:
+        db = get_db()
+        try:
+            result = await asyncio.to_thread(
+                lambda: db.table("StatSiklus")
+                .select("*")
+                .eq("user_id", user_id)
+                .in_("siklus_id", aktif_ids)
+                .execute()
+            )
+            rows = getattr(result, "data", None) or []
+        except Exception as e:
+            logger.error(f"[STAT] Gagal ambil stat user_id={user_id}: {e}")
+
+    metrik = {r["kolam_id"]: hitung_metrik(r) for r in rows}
+
+    for kolam_id, s in scope.items():
+        if s.diarsipkan_pada and s.ringkasan and kolam_id not in metrik:
+            r = s.ringkasan
+            metrik[kolam_id] = hitung_metrik(
+                {
+                    "kolam_id": kolam_id,
+                    "siklus_id": s.id,
+                    "total_bibit": r.get("total_bibit"),
+                    "total_berat_bibit": r.get("total_berat_bibit"),
+                    "total_mati": r.get("total_kematian"),
+                    "total_pakan_gram": r.get("total_pakan_gram"),
+                    "total_biaya": r.get("total_pengeluaran"),
+                    "total_berat_panen": r.get("total_berat_panen"),
+                }
+            )
+
+    _stat_cache.set((user_id,), metrik)
+    return metrik
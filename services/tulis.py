@@ -0,0 +1,170 @@
+# services/tulis.py
+# Tulis bersyarat (update / delete) milik user dalam satu round trip, dan insert
+# idempoten (idem_key, satu row atau array) untuk tulis yang bisa diulang.
+#
+# Filter id + user_id langsung di query tulis dengan RETURNING representation,
+# jadi tidak perlu baca dulu untuk cek keberadaan. Hasilnya membedakan:
+# - ok              : row yang benar-benar berubah/terhapus ada di `rows`
+# - tidak_ditemukan : query sukses tapi tidak ada row yang cocok
+# - gagal           : query error (jaringan, constraint, ...), pesan di `error`
+
+import asyncio
+import logging
+
+from postgrest.types import ReturnMethod
+
+from lib.supabase_client import get_db
+
+logger = logging.getLogger("service_tulis")
+
+
+class HasilTulis:
+    __slots__ = ("rows", "error", "baru")
+
+    def __init__(self, rows: list | None = None, error: str | None = None):
+        self.rows = rows or []
+        self.error = error
+        # False: insert_sekali menemukan row dari percobaan sebelumnya (idem_key sama)
+        self.baru = True
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.rows)
+
+    @property
+    def tidak_ditemukan(self) -> bool:
+        return self.error is None and not self.rows
+
+    @property
+    def gagal(self) -> bool:
+        return self.error is not None
+
+    @property
+    def row(self) -> dict | None:
+        return self.rows[0] if self.rows else None
+
+
+async def _tulis(table: str, aksi: str, query) -> HasilTulis:
+    try:
+        result = await asyncio.to_thread(query)
+    except Exception as e:
+        logger.error(f"[TULIS] {aksi} {table} gagal: {e}")
+        return HasilTulis(error=str(e))
+    return HasilTulis(getattr(result, "data", None))
+
+
+async def update_milik(table: str, row_id: int, user_id: int, payload: dict) -> HasilTulis:
+    """UPDATE ... WHERE id = row_id AND user_id = user_id RETURNING *"""
+    db = get_db()
+    return await _tulis(
+        table,
+        "update",
+        lambda: db.table(table)
+        .update(payload, returning=ReturnMethod.representation)
+        .eq("id", row_id)
+        .eq("user_id", user_id)
+        .execute(),
+    )
+
+
+async def delete_milik(table: str, row_id: int, user_id: int) -> HasilTulis:
+    """DELETE ... WHERE id = row_id AND user_id = user_id RETURNING *"""
+    db = get_db()
+    return await _tulis(
+        table,
+        "delete",
+        lambda: db.table(table)
+        .delete(returning=ReturnMethod.representation)
+        .eq("id", row_id)
+        .eq("user_id", user_id)
+        .execute(),
+    )
+
+
+async def insert_sekali(
+    table: str, payload: dict, idem_key: str | None = None
+) -> HasilTulis:
+    """
+    INSERT ... RETURNING *. Dengan `idem_key` (kolom unik, migrations/009):
+    insert yang diulang tidak membuat row kedua; hasilnya row lama dengan
+    `baru` = False, supaya pemanggil melewati efek samping (delta statistik, dll).
+    """
+    db = get_db()
+    if not idem_key:
+        return await _tulis(
+            table, "insert", lambda: db.table(table).insert(payload).execute()
+        )
+
+    payload = {**payload, "idem_key": idem_key}
+    hasil = await _tulis(
+        table,
+        "insert",
+        lambda: db.table(table)
+        .upsert(
+            payload,
+            on_conflict="idem_key",
+            ignore_duplicates=True,
+            returning=ReturnMethod.representation,
+        )
+        .execute(),
+    )
+    if not hasil.tidak_ditemukan:
+        return hasil
+
+    # Bentrok idem_key: row sudah masuk di percobaan sebelumnya
+    lama = await _tulis(
+        table,
+        "select",
+        lambda: db.table(table)
+        .select("*")
+        .eq("idem_key", idem_key)
+        .eq("user_id", payload["user_id"])
+        .execute(),
+    )
+    lama.baru = False
+    return lama
+
+
+async def insert_banyak(
+    table: str, payload: list[dict], idem_key: str | None = None
+) -> HasilTulis:
+    """
+    INSERT array ... RETURNING * dalam satu statement (semua row masuk atau tidak
+    sama sekali). Dengan `idem_key`, row ke-i diberi kunci `{idem_key}-{i}`:
+    insert yang diulang hanya memasukkan row yang belum ada, dan `rows` hanya
+    berisi row baru (efek samping row lama tidak dihitung dua kali). Kalau semua
+    row sudah ada, hasilnya row lama dengan `baru` = False (seperti insert_sekali).
+    """
+    db = get_db()
+    if not idem_key:
+        return await _tulis(
+            table, "insert", lambda: db.table(table).insert(payload).execute()
+        )
+
+    payload = [{**p, "idem_key": f"{idem_key}-{i}"} for i, p in enumerate(payload)]
+    hasil = await _tulis(
+        table,
+        "insert",
+        lambda: db.table(table)
+        .upsert(
+            payload,
+            on_conflict="idem_key",
+            ignore_duplicates=True,
+            returning=ReturnMethod.representation,
+        )
+        .execute(),
+    )
+    if not hasil.tidak_ditemukan:
+        return hasil
+
+    lama = await _tulis(
+        table,
+        "select",
+        lambda: db.table(table)
+        .select("*")
+        .in_("idem_key", [p["idem_key"] for p in payload])
+        .eq("user_id", payload[0]["user_id"])
+        .execute(),
+    )
+    lama.baru = False
+    return lama
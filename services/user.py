@@ -1,5 +1,6 @@
 # services/user.py
 import logging
+import asyncio
 from lib.supabase_client import get_db
 
 logger = logging.getLogger("service_user")
@@ -21,3 +22,38 @@ async def get_user_by_id(user_id: int):
         return None
 
     return result.data
+
+
+async def get_all_user_ids() -> list[int]:
+    """
+    Ambil id semua user (urut naik), dipakai job batch lintas user
+    """
+    db = get_db()
+    try:
+        result = await asyncio.to_thread(
+            lambda: db.table("Users").select("id").order("id").execute()
+        )
+    except Exception as e:
+        logger.error(f"Gagal ambil daftar user: {e}")
+        return []
+
+    return [r["id"] for r in (getattr(result, "data", None) or [])]
+
+
+async def get_versi_data(user_id: int) -> int | None:
+    """
+    Versi data user (naik di setiap tulis, migrations/011_versi_data.sql).
+    Dipakai di key cache hasil hitung supaya tulis dari worker mana pun langsung
+    terlihat. None kalau gagal dibaca (caller hitung ulang tanpa cache).
+    """
+    db = get_db()
+    try:
+        result = await asyncio.to_thread(
+            lambda: db.table("VersiData").select("versi").eq("user_id", user_id).execute()
+        )
+    except Exception as e:
+        logger.error(f"Gagal ambil versi data user_id={user_id}: {e}")
+        return None
+
+    rows = getattr(result, "data", None) or []
+    return rows[0]["versi"] if rows else 0